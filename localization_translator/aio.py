@@ -0,0 +1,91 @@
+"""
+异步请求用的事件循环：进程内一个常驻后台线程运行 asyncio 事件循环，所有引擎的异步客户端
+（如 openai.AsyncOpenAI 内部的 httpx.AsyncClient 连接池）都绑定在这个循环上，跨文件、跨次运行复用。
+
+run_jobs 在调用线程中用 submit 把每批请求交给该循环，再用 wait 等待结果并按间隔检查取消；取消时
+cancel 在途的 future，循环中对应的任务（以及其中的 HTTP 请求）立即中止，不必等请求返回。
+
+没有原生异步实现的引擎由 run_blocking 放到线程池中执行阻塞的 translate_batch：取消时不再等待该线程，
+请求在后台结束后结果被丢弃。
+
+asyncio 导入较慢（约 70 毫秒），本模块只在第一次发送请求时才导入。
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+# 执行阻塞请求的线程数，与界面可选的最大并发数相同
+BLOCKING_WORKERS = 32
+# 等待在途请求时检查取消的间隔（秒），即取消后开始写回前的最长延迟
+CANCEL_POLL_INTERVAL = 0.05
+
+_loop = None
+_executor = None
+# 创建 _loop / _executor 的进程；fork 出的子进程（命令行的多进程模式）中没有对应的线程，需要重新创建
+_pid = None
+_lock = threading.Lock()
+
+
+def _check_fork():
+    global _loop, _executor, _pid
+    if _pid != os.getpid():
+        _loop, _executor, _pid = None, None, os.getpid()
+
+
+def get_loop():
+    """常驻事件循环（首次调用时在后台守护线程中启动）"""
+    global _loop
+    with _lock:
+        _check_fork()
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='transfuse-aio', daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        _check_fork()
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix='transfuse-blocking')
+        return _executor
+
+
+def submit(coro):
+    """在常驻事件循环中运行协程，返回 concurrent.futures.Future；对它调用 cancel() 即取消循环中的任务"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def wait(future, cancel_checker=None):
+    """等待 future 完成并返回 True；期间 cancel_checker() 为真时立即返回 False（不取消 future）"""
+    while True:
+        done, _ = wait_futures([future], timeout=CANCEL_POLL_INTERVAL)
+        if done:
+            return True
+        if cancel_checker and cancel_checker():
+            return False
+
+
+def run(coro, timeout=None):
+    """在常驻事件循环中运行协程并阻塞等待结果（不可在事件循环线程中调用）"""
+    return submit(coro).result(timeout)
+
+
+async def run_blocking(fn, *args):
+    """在线程池中调用阻塞函数 fn(*args)；任务被取消时立即返回，不等待该线程"""
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+
+
+def shutdown():
+    """停止事件循环，不等待仍在执行的阻塞请求；之后再调用 submit 会重新启动"""
+    global _loop, _executor
+    with _lock:
+        loop, _loop = _loop, None
+        executor, _executor = _executor, None
+    if loop is not None and not loop.is_closed():
+        loop.call_soon_threadsafe(loop.stop)
+    if executor is not None:
+        executor.shutdown(wait=False)
@@ -0,0 +1,322 @@
+"""
+吞吐量基准测试：用本地模拟引擎（engine='Mock'）翻译合成的本地化表格，不访问任何在线服务。
+
+    python bench.py                      # 默认矩阵
+    python bench.py --quick              # 小规模，几秒内跑完
+    python bench.py --rows 20000 --langs 15 --dup 0.5 --text-len 40 --latency 0.02 --output bench.json
+
+每个用例生成一张合成表（行数、语种数、重复源文比例、平均文本长度可调），分别走 CSV 路径（translate_csv）
+和 JSON 路径（read_json_table + translate_json + write_json），报告 cells/秒、总耗时、Python 峰值内存
+以及 parse / translate / write 各阶段耗时。随机种子固定，结果可复现。
+
+    python bench.py --startup            # 启动耗时：GUI 窗口出现、导入 translator / cli 各要多久
+
+启动基准在全新的子进程里计时（不受本进程已导入模块的影响），同时检查冷启动时是否加载了 openai、
+google-cloud-translate、pandas 等重量级依赖；有重量级依赖被提前导入或耗时超过 --startup-budget 时返回 1，
+可放进 CI 防止导入开销悄悄变回来。
+
+    python bench.py --convert --rows 100000 --langs 15   # CSV⇄JSON 导出耗时（utils.csv_to_json / json_to_csv）
+
+转换基准用已填满译文的合成表，分别测 CSV→JSON（缩进 / 紧凑）和 JSON→CSV 的耗时与输出大小。
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from engines import configure_mock_engine
+from translator import LANG_MAP, translate_csv, translate_json
+from utils import read_json_table, write_json, csv_to_json, json_to_csv
+
+# 生成文本用的字符集（常用汉字）
+_CHARS = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严'
+
+
+def make_table(rows, langs, dup_ratio, text_len, seed=0, context_ratio=0.3):
+    """
+    生成合成本地化表格。
+    rows: 数据行数；langs: 目标语言列数；dup_ratio: 源文取自小词表（即会重复）的行的比例；
+    text_len: 源文平均长度（字符）。返回 (first_row, fields, data)
+    """
+    rng = random.Random(seed)
+    lang_cols = [k for k in LANG_MAP if k != '简体中文'][:langs]
+
+    def text():
+        n = max(1, int(rng.gauss(text_len, text_len / 3)))
+        return ''.join(rng.choice(_CHARS) for _ in range(n))
+
+    pool = [text() for _ in range(max(1, rows // 50))]
+    fields = ['Key', 'SourceZH', 'Context'] + lang_cols + ['Notes']
+    data = []
+    for i in range(rows):
+        src = rng.choice(pool) if rng.random() < dup_ratio else text()
+        row = {'Key': f'key_{i}', 'SourceZH': src,
+               'Context': ('UI按钮' if rng.random() < 0.5 else '任务对白') if rng.random() < context_ratio else None}
+        for lang in lang_cols:
+            row[lang] = None
+        row['Notes'] = None
+        data.append(row)
+    first_row = ['# 合成基准表'] + [''] * (len(fields) - 1)
+    return first_row, fields, data
+
+
+def write_table_csv(path, first_row, fields, data):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(first_row)
+        writer.writerow(fields)
+        for row in data:
+            writer.writerow([row.get(k) for k in fields])
+
+
+def _measure(fn, track_memory):
+    # 返回 (fn 的返回值, 墙钟耗时, Python 峰值内存 MB 或 None)
+    if track_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = None
+        if track_memory:
+            peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run_case(workdir, path_kind, rows, langs, dup_ratio, text_len, concurrency, track_memory, seed, use_async=True):
+    """
+    跑一个用例：先不开 tracemalloc 计时，再（可选）单独跑一遍统计峰值内存，避免内存追踪拖慢计时。
+    每一遍都重新生成表格文件，因为翻译会原地写回。
+    """
+    table = make_table(rows, langs, dup_ratio, text_len, seed=seed)
+    base = os.path.join(workdir, f'bench_{path_kind}_{rows}_{langs}_{dup_ratio}_{text_len}')
+    path = base + ('.csv' if path_kind == 'csv' else '.json')
+
+    def prepare():
+        first_row, fields, data = table
+        if path_kind == 'csv':
+            write_table_csv(path, first_row, fields, data)
+        else:
+            write_json(data, path)
+        for suffix in ('.srchash.json', '.journal', '.failed.json'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        configure_mock_engine(seed=seed)
+
+    def fn():
+        if path_kind == 'csv':
+            return translate_csv(path, 'Mock', concurrency=concurrency, use_cache=False, use_async=use_async)
+        t0 = time.perf_counter()
+        loaded = read_json_table(path)
+        parse = time.perf_counter() - t0
+        stats = translate_json(loaded, 'Mock', path, concurrency=concurrency, use_cache=False, use_async=use_async)
+        stats['timings']['parse'] = parse
+        return stats
+
+    prepare()
+    stats, elapsed, _ = _measure(fn, False)
+    peak = None
+    if track_memory:
+        prepare()
+        _, _, peak = _measure(fn, True)
+    for suffix in ('', '.srchash.json', '.journal', '.failed.json'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return {
+        'path': path_kind, 'rows': rows, 'langs': langs, 'dup_ratio': dup_ratio, 'text_len': text_len,
+        'cells': stats['cells'], 'calls': stats['calls'], 'dedup_saved': stats['dedup_saved'],
+        'failed': stats['failed'], 'retries': stats['retries'], 'throttled': stats['throttled'],
+        'wall_s': round(elapsed, 3),
+        'cells_per_s': round(stats['cells'] / elapsed, 1) if elapsed > 0 else None,
+        'peak_mem_mb': round(peak, 1) if peak is not None else None,
+        'parse_s': round(stats['timings']['parse'], 3),
+        'translate_s': round(stats['timings']['translate'], 3),
+        'write_s': round(stats['timings']['write'], 3),
+    }
+
+
+# 启动基准的各项：名称 -> 在子进程里计时的代码
+STARTUP_TARGETS = {
+    'gui-window': (
+        "import os\n"
+        "os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')\n"
+        "from PyQt5.QtWidgets import QApplication\n"
+        "import gui\n"
+        "app = QApplication([])\n"
+        "window = gui.TranslatorGUI()\n"
+        "window.show()\n"
+        "app.processEvents()\n"),
+    'translator': 'import translator\n',
+    'cli': 'import cli\ncli.build_parser()\n',
+}
+# 冷启动时不应导入的重量级依赖（只在选中对应引擎、真正发请求时才加载）
+HEAVY_MODULES = ('openai', 'google.cloud.translate_v2', 'pandas')
+
+_STARTUP_SCRIPT = """\
+import json, sys, time
+t0 = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_startup(target, repeat=5):
+    """
+    在 repeat 个全新的子进程里执行 STARTUP_TARGETS[target]，返回
+    {'target', 'median_ms', 'min_ms', 'heavy': 被导入的重量级依赖, 'error': 无法运行时的错误}
+    """
+    script = _STARTUP_SCRIPT.format(body=STARTUP_TARGETS[target], heavy=HEAVY_MODULES)
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    heavy = set()
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-c', script], cwd=here, capture_output=True, text=True)
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            return {'target': target, 'median_ms': None, 'min_ms': None, 'heavy': [],
+                    'error': lines[-1] if lines else f'exit {proc.returncode}'}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        times.append(result['seconds'] * 1000.0)
+        heavy.update(result['heavy'])
+    return {'target': target, 'median_ms': round(statistics.median(times), 1), 'min_ms': round(min(times), 1),
+            'heavy': sorted(heavy), 'error': None}
+
+
+def run_startup(args):
+    print('target\tmedian_ms\tmin_ms\theavy_imports')
+    results = []
+    failed = False
+    for target in STARTUP_TARGETS:
+        result = measure_startup(target, args.startup_repeat)
+        results.append(result)
+        if result['error']:
+            # 缺少 PyQt5 等依赖时跳过该项，不算超时
+            print(f'{target}\t-\t-\t跳过：{result["error"]}')
+            continue
+        print(f'{target}\t{result["median_ms"]}\t{result["min_ms"]}\t{",".join(result["heavy"]) or "-"}')
+        if result['heavy'] or result['median_ms'] > args.startup_budget * 1000.0:
+            failed = True
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'startup': results, 'budget_s': args.startup_budget}, f, ensure_ascii=False, indent=2)
+    return 1 if failed else 0
+
+
+def run_convert(args):
+    """CSV⇄JSON 转换基准：每种行数 × 语种数生成一张已翻译的表，依次测 csv_to_json（缩进、紧凑）和 json_to_csv"""
+    columns = ['rows', 'langs', 'direction', 'seconds', 'rows_per_s', 'output_mb']
+    print('\t'.join(columns))
+    results = []
+    workdir = tempfile.mkdtemp(prefix='transfuse_bench_')
+    try:
+        for rows, langs in itertools.product(args.rows, args.langs):
+            first_row, fields, data = make_table(rows, langs, 0.5, args.text_len[0], seed=args.seed)
+            for row in data:
+                for lang in fields[3:-1]:
+                    row[lang] = f'[{lang}] {row["SourceZH"]}'
+            csv_path = os.path.join(workdir, f'convert_{rows}_{langs}.csv')
+            write_table_csv(csv_path, first_row, fields, data)
+            del data
+            json_path = os.path.join(workdir, f'convert_{rows}_{langs}.json')
+            steps = [('csv->json', lambda: csv_to_json(csv_path, json_path), json_path),
+                     ('csv->json compact', lambda: csv_to_json(csv_path, json_path + '.compact', compact=True),
+                      json_path + '.compact'),
+                     ('json->csv', lambda: json_to_csv(json_path, csv_path + '.out'), csv_path + '.out')]
+            for direction, fn, output in steps:
+                _, elapsed, _ = _measure(fn, False)
+                result = {'rows': rows, 'langs': langs, 'direction': direction, 'seconds': round(elapsed, 3),
+                          'rows_per_s': round(rows / elapsed) if elapsed else None,
+                          'output_mb': round(os.path.getsize(output) / (1024 * 1024), 1)}
+                results.append(result)
+                print('\t'.join(str(result[c]) for c in columns))
+                sys.stdout.flush()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'convert': results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+def _floats(text):
+    return [float(x) for x in text.split(',') if x]
+
+
+def _ints(text):
+    return [int(x) for x in text.split(',') if x]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='translate_json / translate_csv 吞吐量基准测试（模拟引擎）')
+    parser.add_argument('--rows', type=_ints, default=[1000, 10000], help='行数，逗号分隔多个值')
+    parser.add_argument('--langs', type=_ints, default=[5, 15], help='目标语言列数')
+    parser.add_argument('--dup', type=_floats, default=[0.0, 0.5], help='重复源文比例')
+    parser.add_argument('--text-len', type=_ints, default=[12, 80], help='平均文本长度')
+    parser.add_argument('--paths', default='csv,json', help='测试的路径：csv、json')
+    parser.add_argument('--latency', type=float, default=0.02, help='模拟引擎每次请求的延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.005, help='延迟抖动（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟请求失败率')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='模拟请求返回 429 的概率（测试限速退避）')
+    parser.add_argument('--retry-after', type=float, default=0.2, help='模拟 429 附带的 Retry-After（秒）')
+    parser.add_argument('--concurrency', type=int, default=8, help='同时在途的请求数')
+    parser.add_argument('--no-async', action='store_true', help='用线程池发送请求（对比异步路径）')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-memory', action='store_true', help='不统计峰值内存（省掉额外一遍 tracemalloc 运行）')
+    parser.add_argument('--quick', action='store_true', help='小规模快速运行')
+    parser.add_argument('--output', default=None, help='把结果写成 JSON 文件')
+    parser.add_argument('--startup', action='store_true', help='只跑启动耗时基准')
+    parser.add_argument('--startup-repeat', type=int, default=5, help='启动基准每项重复的次数（取中位数）')
+    parser.add_argument('--startup-budget', type=float, default=1.0, help='启动耗时上限（秒），超过则返回 1')
+    parser.add_argument('--convert', action='store_true', help='只跑 CSV⇄JSON 转换基准（用 --rows / --langs）')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.startup:
+        return run_startup(args)
+    if args.convert:
+        return run_convert(args)
+    if args.quick:
+        args.rows, args.langs, args.dup, args.text_len = [500], [5], [0.5], [20]
+    configure_mock_engine(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed,
+                          throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+
+    columns = ['path', 'rows', 'langs', 'dup_ratio', 'text_len', 'cells', 'calls', 'wall_s', 'cells_per_s',
+               'peak_mem_mb', 'parse_s', 'translate_s', 'write_s']
+    print('\t'.join(columns))
+    results = []
+    workdir = tempfile.mkdtemp(prefix='transfuse_bench_')
+    try:
+        paths = [p.strip() for p in args.paths.split(',') if p.strip()]
+        for rows, langs, dup, text_len, path_kind in itertools.product(args.rows, args.langs, args.dup,
+                                                                        args.text_len, paths):
+            result = run_case(workdir, path_kind, rows, langs, dup, text_len, args.concurrency,
+                              not args.no_memory, args.seed, not args.no_async)
+            results.append(result)
+            print('\t'.join(str(result[c]) for c in columns))
+            sys.stdout.flush()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': {k: v for k, v in vars(args).items() if k != 'output'}, 'results': results},
+                      f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,426 @@
+"""
+命令行入口：不启动 GUI，批量翻译多个 CSV/JSON 表格，适合构建服务器和夜间任务。
+
+    python cli.py 表格目录/*.csv other.json --engine Google --workers 4 --concurrency 8
+
+多个文件由独立的工作进程并行处理。标准输出每行一个 JSON 事件，供流水线解析：
+    {"event": "start", ...}          文件列表与参数
+    {"event": "progress", ...}       某个文件的进度（每个文件每秒最多一条）
+    {"event": "file_done", ...}      某个文件完成，附带统计信息与耗时
+    {"event": "file_error", ...}     某个文件失败
+    {"event": "summary", ...}        全部完成后的汇总：行数、请求数、翻译记忆命中数、耗时等
+--dry-run 只估算不翻译：每个文件输出一条 {"event": "plan", ...}（请求数、字符数、token 数、费用、预计耗时，
+见 planner.py），最后的 summary 汇总所选引擎的估算值。
+--suggest 只查翻译记忆中的相近译文（见 fuzzy.py）：每个文件输出一条 {"event": "suggest", ...}，
+参考译文写到表格旁的 *.suggest.json，不修改表格。
+--project 把每个输入当作一个项目（目录或项目清单，见 project.py）：所有表格跨文件去重后统一翻译，
+内容未改动的文件按哈希跳过；每个表格完成后同样输出 file_done，另有 {"event": "project_done", ...}。
+有文件失败时退出码为 1。--metrics-file 另外保存每个文件的延迟分位数、错误分类和阶段耗时（见 metrics.py）。
+"""
+import argparse
+import glob
+import json
+import os
+import queue
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import Manager
+
+# 进度事件的最小间隔（秒）
+PROGRESS_INTERVAL = 1.0
+
+# 汇总时累加的统计字段
+SUM_KEYS = ('rows', 'cells', 'changed_rows', 'pending', 'unique', 'dedup_saved', 'cache_hits', 'resumed',
+            'calls', 'retries', 'throttled', 'requeued', 'translated', 'failed', 'hedged', 'hedge_won', 'failover',
+            'segments', 'segment_hits')
+
+
+def expand_inputs(patterns):
+    """展开文件、目录（其中的 *.csv / *.json）和通配符，去重并保持顺序；附属文件（utils.SIDECAR_SUFFIXES）不算"""
+    from utils import SIDECAR_SUFFIXES
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, '*.csv')) + glob.glob(os.path.join(pattern, '*.json')))
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True)) or ([pattern] if os.path.exists(pattern) else [])
+        for path in matches:
+            if path.lower().endswith(('.csv', '.json')) and not path.endswith(SIDECAR_SUFFIXES):
+                paths.append(os.path.abspath(path))
+    return list(dict.fromkeys(paths))
+
+
+def _emit(event, **fields):
+    fields['event'] = event
+    sys.stdout.write(json.dumps(fields, ensure_ascii=False) + '\n')
+    sys.stdout.flush()
+
+
+def translate_file(path, options, events=None):
+    """
+    在工作进程中翻译一个文件，返回统计信息（附带 elapsed 秒数和该文件的指标快照 metrics）。
+    events: 进度事件队列（multiprocessing.Manager().Queue()），None 则不上报进度
+    """
+    from translator import translate_csv, translate_json
+    from metrics import get_metrics
+    from utils import read_json_table
+
+    metrics = get_metrics()
+    metrics.reset()
+    profile_path = None
+    if options.get('profile_dir'):
+        profile_path = os.path.join(options['profile_dir'], os.path.basename(path) + '.prof')
+
+    last_sent = [0.0, False]  # 上次发送时间, 是否已发送过 100%
+
+    def progress_callback(percent, info=None, row_time=None, done=None, total=None, eta=None):
+        now = time.time()
+        if events is None or last_sent[1]:
+            return
+        if percent >= 100.0:
+            last_sent[1] = True
+        elif now - last_sent[0] < PROGRESS_INTERVAL:
+            return
+        last_sent[0] = now
+        events.put({'event': 'progress', 'file': path, 'percent': round(float(percent), 2),
+                    'done': done, 'total': total, 'eta': round(eta, 1) if eta is not None else None})
+
+    if options.get('rate_limits'):
+        from engines import get_engine
+        get_engine(options['engine']).set_rate_limits(**options['rate_limits'])
+
+    start = time.time()
+    kwargs = dict(progress_callback=progress_callback, concurrency=options['concurrency'],
+                  use_cache=options['use_cache'], cache_path=options['cache_path'],
+                  incremental=options['incremental'], retry_failed=options['retry_failed'],
+                  normalize=options['normalize'], use_async=options['use_async'],
+                  secondary_engine=options['secondary_engine'], hedge_percentile=options['hedge_percentile'],
+                  segment=options['segment'])
+    if path.lower().endswith('.json'):
+        with metrics.phase('parse'):
+            data = read_json_table(path)
+        stats = translate_json(data, options['engine'], path, profile_path=profile_path, **kwargs)
+    else:
+        stats = translate_csv(path, options['engine'], chunk_rows=options['chunk_rows'], profile_path=profile_path,
+                              **kwargs)
+    stats = dict(stats)
+    stats['elapsed'] = round(time.time() - start, 3)
+    stats['metrics'] = metrics.snapshot()
+    return stats
+
+
+def build_parser():
+    from engines import available_engines
+    parser = argparse.ArgumentParser(description='本地化表格批量翻译（命令行模式）')
+    parser.add_argument('inputs', nargs='+', help='CSV/JSON 文件、目录或通配符（如 "Localization/**/*.csv"）')
+    parser.add_argument('--engine', default='Google', choices=available_engines(),
+                        help='翻译引擎（Mock 为本地模拟，默认 Google）')
+    parser.add_argument('--concurrency', type=int, default=None, help='每个文件同时在途的请求数（默认按引擎）')
+    parser.add_argument('--workers', type=int, default=None, help='并行处理文件的进程数（默认 min(文件数, CPU 数)）')
+    parser.add_argument('--output-dir', default=None, help='把结果写到该目录（保留相对输入所在目录的路径，附属文件一并复制），默认原地写回')
+    parser.add_argument('--no-cache', action='store_true', help='不使用翻译记忆')
+    parser.add_argument('--cache-path', default=None, help='翻译记忆数据库路径')
+    parser.add_argument('--incremental', action='store_true', help='源文有改动的行重新翻译')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='只重试上次运行最终失败的 cell（表格旁的 .failed.json），不扫描其他行')
+    parser.add_argument('--max-rps', type=float, default=None,
+                        help='每个工作进程每秒最多请求数（默认按引擎声明的配额）')
+    parser.add_argument('--max-units-per-minute', type=float, default=None,
+                        help='每个工作进程每分钟最多字符数（Google）或 token 数（OpenAI）')
+    parser.add_argument('--chunk-rows', type=int, default=None, help='CSV 分块行数（默认 translator.CSV_CHUNK_ROWS）')
+    parser.add_argument('--google-credentials', default=None, help='Google 服务账号 JSON 路径')
+    parser.add_argument('--quiet', action='store_true', help='不输出 progress 事件')
+    parser.add_argument('--summary-file', default=None, help='另外把汇总 JSON 写到该文件')
+    parser.add_argument('--metrics-file', default=None,
+                        help='把每个文件的指标（延迟 p50/p95/p99、请求数、字符数、错误分类、阶段耗时）写成 JSON')
+    parser.add_argument('--profile-dir', default=None, help='用 cProfile 分析翻译循环，每个文件一个 .prof 写到该目录')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='不发送请求，只估算每个文件的请求数、字符数、token 数、费用和耗时')
+    parser.add_argument('--project', action='store_true',
+                        help='每个输入是一个项目目录或项目清单：跨文件去重统一翻译，跳过内容未改动的文件')
+    parser.add_argument('--rescan', action='store_true', help='项目模式下不跳过内容未改动的文件')
+    parser.add_argument('--no-normalize', action='store_true',
+                        help='不做占位符归一化（数字、{0}/%%s、富文本标签不合并、不保护）')
+    parser.add_argument('--no-async', action='store_true',
+                        help='用线程池发送请求，不走异步路径（取消时要等在途请求返回）')
+    parser.add_argument('--no-segment', action='store_true',
+                        help='长文本不按句子/段落分段，整条翻译和缓存')
+    parser.add_argument('--secondary-engine', default=None, choices=available_engines(),
+                        help='备用引擎：主引擎连续失败熔断期间改发给它，对冲时也优先发给它（仅异步路径）')
+    parser.add_argument('--hedge', type=float, nargs='?', const=95.0, default=None, metavar='PERCENTILE',
+                        help='请求对冲：一批超过整批耗时的该百分位（默认 95）仍未返回时再发一份，先返回的为准'
+                             '（对冲批次不超过 10%%，仅异步路径）')
+    parser.add_argument('--suggest', type=float, nargs='?', const=-1.0, default=None, metavar='MIN_SIMILARITY',
+                        help='不翻译，只为待翻译的 cell 从翻译记忆中找相近译文，写到表格旁的 *.suggest.json'
+                             '（默认相似度下限见 fuzzy.FUZZY_MIN_SIMILARITY）')
+    return parser
+
+
+def _rate_limit_options(args):
+    # 命令行覆盖的配额；限速器在每个工作进程内独立，多进程时总配额约为 workers 倍
+    limits = {}
+    if args.max_rps:
+        limits['requests_per_second'] = args.max_rps
+        limits['requests_per_minute'] = None
+    if args.max_units_per_minute:
+        limits['chars_per_minute'] = args.max_units_per_minute
+        limits['tokens_per_minute'] = args.max_units_per_minute
+    return limits
+
+
+# 试运行汇总时累加的估算字段
+PLAN_SUM_KEYS = ('pending', 'cache_hits', 'requested', 'calls', 'chars', 'input_units', 'output_units', 'cost')
+
+
+def dry_run(paths, args, options):
+    """逐个文件估算工作量（不发送请求、不修改文件），输出 plan 事件和汇总"""
+    from planner import plan_file
+    if options['rate_limits']:
+        from engines import get_engine
+        get_engine(options['engine']).set_rate_limits(**options['rate_limits'])
+    start = time.time()
+    totals = dict.fromkeys(PLAN_SUM_KEYS, 0)
+    plans = {}
+    errors = {}
+    wall = 0.0
+    for path in paths:
+        try:
+            plan = plan_file(path, options['engine'], concurrency=options['concurrency'], use_cache=options['use_cache'],
+                             cache_path=options['cache_path'], incremental=options['incremental'],
+                             retry_failed=options['retry_failed'], chunk_rows=options['chunk_rows'],
+                             normalize=options['normalize'], segment=options['segment'])
+        except Exception as e:
+            errors[path] = f'{type(e).__name__}: {e}'
+            _emit('file_error', file=path, error=errors[path])
+            continue
+        plans[path] = plan
+        _emit('plan', file=path, **plan)
+        entry = plan['engines'].get(options['engine'])
+        if entry:
+            for k in PLAN_SUM_KEYS:
+                if totals[k] is not None:
+                    totals[k] = None if entry[k] is None else totals[k] + entry[k]
+            # 多个文件由 workers 个进程并行处理
+            wall += entry['wall_s']
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(paths)))
+    if totals['cost'] is not None:
+        totals['cost'] = round(totals['cost'], 4)
+    summary = dict(totals, engine=options['engine'], files=len(paths), failed_files=sorted(errors),
+                   wall_s=round(wall / workers, 1), elapsed=round(time.time() - start, 3))
+    _emit('summary', dry_run=True, **summary)
+    if args.summary_file:
+        with open(args.summary_file, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'files': plans, 'errors': errors}, f, ensure_ascii=False, indent=2)
+    return 1 if errors else 0
+
+
+def suggest(paths, args, options):
+    """逐个文件生成模糊匹配参考译文（不发送请求、不修改表格），每个文件输出一条 suggest 事件"""
+    from fuzzy import suggest_file, default_suggest_path, FUZZY_MIN_SIMILARITY
+    min_similarity = args.suggest if args.suggest >= 0 else FUZZY_MIN_SIMILARITY
+    start = time.time()
+    total = 0
+    errors = {}
+    for path in paths:
+        try:
+            suggestions = suggest_file(path, options['engine'], min_similarity, cache_path=options['cache_path'],
+                                       chunk_rows=options['chunk_rows'])
+        except Exception as e:
+            errors[path] = f'{type(e).__name__}: {e}'
+            _emit('file_error', file=path, error=errors[path])
+            continue
+        total += len(suggestions)
+        _emit('suggest', file=path, suggestions=len(suggestions),
+              output=default_suggest_path(path) if suggestions else None)
+    _emit('summary', suggest=True, engine=options['engine'], min_similarity=min_similarity, files=len(paths),
+          suggestions=total, failed_files=sorted(errors), elapsed=round(time.time() - start, 3))
+    return 1 if errors else 0
+
+
+def run_projects(projects, args, options):
+    """项目模式：在本进程内逐个翻译项目（项目内的文件读写已经并行），输出每个表格的 file_done 和项目汇总"""
+    from project import translate_project
+    from metrics import get_metrics
+    if options['rate_limits']:
+        from engines import get_engine
+        get_engine(options['engine']).set_rate_limits(**options['rate_limits'])
+    _emit('start', projects=projects, **options)
+    start = time.time()
+    totals = {k: 0 for k in SUM_KEYS}
+    totals.update(files=0, skipped=0, cross_file_saved=0)
+    per_file = {}
+    errors = {}
+    metrics = {}
+    for project_path in projects:
+        last_sent = [0.0]
+
+        def progress_callback(percent, info=None, row_time=None, done=None, total=None, eta=None):
+            now = time.time()
+            if args.quiet or (percent < 100.0 and now - last_sent[0] < PROGRESS_INTERVAL):
+                return
+            last_sent[0] = now
+            _emit('progress', project=project_path, percent=round(float(percent), 2), done=done, total=total,
+                  eta=round(eta, 1) if eta is not None else None)
+
+        get_metrics().reset()
+        project_start = time.time()
+        profile_path = None
+        if options['profile_dir']:
+            os.makedirs(options['profile_dir'], exist_ok=True)
+            profile_path = os.path.join(options['profile_dir'], os.path.basename(project_path) + '.prof')
+        try:
+            stats = translate_project(project_path, options['engine'], progress_callback=progress_callback,
+                                      concurrency=options['concurrency'], use_cache=options['use_cache'],
+                                      cache_path=options['cache_path'], incremental=options['incremental'],
+                                      retry_failed=options['retry_failed'], rescan=args.rescan,
+                                      normalize=options['normalize'], use_async=options['use_async'],
+                                      secondary_engine=options['secondary_engine'],
+                                      hedge_percentile=options['hedge_percentile'], segment=options['segment'],
+                                      profile_path=profile_path)
+        except Exception as e:
+            errors[project_path] = f'{type(e).__name__}: {e}'
+            _emit('file_error', file=project_path, error=errors[project_path])
+            continue
+        for path, file_stats in stats.pop('per_file').items():
+            per_file[path] = file_stats
+            _emit('file_done', file=path, project=project_path, **file_stats)
+        stats['elapsed'] = round(time.time() - project_start, 3)
+        metrics[project_path] = get_metrics().snapshot()
+        _emit('project_done', project=project_path, **stats)
+        for k in totals:
+            totals[k] += stats.get(k, 0) or 0
+
+    summary = dict(totals)
+    summary.update(projects=len(projects), succeeded=len(projects) - len(errors), failed_files=sorted(errors),
+                   elapsed=round(time.time() - start, 3))
+    _emit('summary', **summary)
+    if args.summary_file:
+        with open(args.summary_file, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'files': per_file, 'errors': errors}, f, ensure_ascii=False, indent=2)
+    if args.metrics_file:
+        with open(args.metrics_file, 'w', encoding='utf-8') as f:
+            json.dump({'projects': metrics}, f, ensure_ascii=False, indent=2)
+    return 1 if errors else 0
+
+
+def copy_to_output(paths, output_dir):
+    """
+    把输入表格复制到 output_dir 下（保留相对各输入所在目录的公共上级的路径，不同目录下的同名文件不会互相覆盖），
+    返回复制后的路径。表格旁的翻译日志、源文索引和失败清单在目标处还没有时一并复制，中断恢复和改动检测照常可用
+    """
+    from failures import default_failures_path
+    from journal import default_journal_path
+    from source_index import default_index_path
+    base = os.path.commonpath([os.path.dirname(path) for path in paths])
+    copied = []
+    for path in paths:
+        dest = os.path.abspath(os.path.join(output_dir, os.path.relpath(path, base)))
+        if dest != path:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.copyfile(path, dest)
+            for sidecar in (default_journal_path, default_index_path, default_failures_path):
+                if os.path.exists(sidecar(path)) and not os.path.exists(sidecar(dest)):
+                    shutil.copyfile(sidecar(path), sidecar(dest))
+        copied.append(dest)
+    return copied
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    projects = []
+    if args.project:
+        # 项目按目录或清单给出；--output-dir 不适用（哈希状态与表格同目录）
+        from project import resolve_project
+        projects = [os.path.abspath(p) for p in args.inputs if os.path.exists(p)]
+        paths = [path for p in projects for path in resolve_project(p)[1]]
+    else:
+        paths = expand_inputs(args.inputs)
+    if not paths:
+        _emit('summary', files=0, error='没有找到 CSV/JSON 文件')
+        return 1
+
+    if args.google_credentials:
+        # 工作进程继承环境变量
+        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = os.path.abspath(args.google_credentials)
+
+    if args.output_dir and not args.project:
+        paths = copy_to_output(paths, args.output_dir)
+
+    from translator import CSV_CHUNK_ROWS
+    options = {
+        'engine': args.engine,
+        'concurrency': args.concurrency,
+        'use_cache': not args.no_cache,
+        'cache_path': args.cache_path,
+        'incremental': args.incremental,
+        'retry_failed': args.retry_failed,
+        'normalize': not args.no_normalize,
+        'use_async': not args.no_async,
+        'secondary_engine': args.secondary_engine,
+        'hedge_percentile': args.hedge,
+        'segment': not args.no_segment,
+        'chunk_rows': args.chunk_rows or CSV_CHUNK_ROWS,
+        'rate_limits': _rate_limit_options(args),
+        'profile_dir': os.path.abspath(args.profile_dir) if args.profile_dir else None,
+    }
+    if args.suggest is not None:
+        return suggest(paths, args, options)
+    if args.dry_run:
+        # 项目模式的试运行按文件分别估算，不计跨文件去重
+        return dry_run(paths, args, options)
+    if args.project:
+        return run_projects(projects, args, options)
+    if args.profile_dir:
+        os.makedirs(args.profile_dir, exist_ok=True)
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(paths)))
+    _emit('start', files=paths, workers=workers, **options)
+
+    start = time.time()
+    totals = {k: 0 for k in SUM_KEYS}
+    per_file = {}
+    metrics = {}
+    errors = {}
+    with Manager() as manager, ProcessPoolExecutor(max_workers=workers) as executor:
+        events = None if args.quiet else manager.Queue()
+        futures = {executor.submit(translate_file, path, options, events): path for path in paths}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            # 转发工作进程的进度事件
+            while events is not None:
+                try:
+                    event = events.get_nowait()
+                except queue.Empty:
+                    break
+                _emit(event.pop('event'), **event)
+            for future in done:
+                path = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    errors[path] = f'{type(e).__name__}: {e}'
+                    _emit('file_error', file=path, error=errors[path])
+                    continue
+                metrics[path] = stats.pop('metrics', None)
+                per_file[path] = stats
+                for k in SUM_KEYS:
+                    totals[k] += stats.get(k, 0) or 0
+                _emit('file_done', file=path, **stats)
+
+    summary = dict(totals)
+    summary.update(files=len(paths), succeeded=len(per_file), failed_files=sorted(errors),
+                   elapsed=round(time.time() - start, 3))
+    _emit('summary', **summary)
+    if args.summary_file:
+        with open(args.summary_file, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'files': per_file, 'errors': errors}, f, ensure_ascii=False, indent=2)
+    if args.metrics_file:
+        with open(args.metrics_file, 'w', encoding='utf-8') as f:
+            json.dump({'files': metrics}, f, ensure_ascii=False, indent=2)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,672 @@
+"""
+翻译引擎注册表。
+
+每个引擎是一个长期存在的对象：持有一个复用的客户端（HTTP keep-alive 连接池，不再每个 cell 新建），
+并声明自己的能力——单批最多条数、单批最大大小（字符或估算 token）、是否使用上下文、速率限制、默认并发数。
+translate_json 只按这些声明切批、去重和并发，不再按引擎名分支。
+
+新增引擎（DeepL、本地模型、测试桩等）只需继承 Engine、实现 translate_batch，并用 register_engine 注册：
+
+    @register_engine
+    class DeepLEngine(Engine):
+        name = 'DeepL'
+        max_batch_items = 50
+        def translate_batch(self, texts, target_code, source=None, contexts=None):
+            ...
+            return results, 1
+
+各引擎的 SDK（openai、google-cloud-translate）在第一次创建客户端时才导入：只用 Google 时不会加载 openai，
+反之亦然；列出引擎、打开 GUI 都不需要任何 SDK。
+
+run_jobs 通过 translate_batch_async 在 aio.py 的常驻事件循环中发送请求，取消时在途请求立即中止。
+声明 supports_async 的引擎（OpenAI、Mock）用异步客户端实现它，其余引擎默认在线程池中调用 translate_batch。
+"""
+import json
+import os
+import random
+import threading
+import time
+
+from metrics import METRICS
+from ratelimit import RateLimiter
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：CJK 等非 ASCII 字符约 1 token/字，ASCII 约 4 字符/token"""
+    if not text:
+        return 0
+    if text.isascii():
+        return (len(text) + 3) // 4
+    # encode 丢掉非 ASCII 字符后的长度即 ASCII 字符数（C 层实现，比逐字符判断快得多）
+    ascii_count = len(text.encode('ascii', 'ignore'))
+    return len(text) - ascii_count + (ascii_count + 3) // 4
+
+
+def _parse_json_object(content):
+    # 去掉模型可能附带的 ```json 代码块标记后解析
+    content = (content or '').strip()
+    if content.startswith('```'):
+        content = content.strip('`')
+        if content.lower().startswith('json'):
+            content = content[4:]
+    start = content.find('{')
+    end = content.rfind('}')
+    if start < 0 or end < start:
+        return None
+    try:
+        obj = json.loads(content[start:end + 1])
+    except ValueError:
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+class Engine:
+    """
+    翻译引擎基类。子类覆盖下列能力声明并实现 translate_batch：
+
+    name: 注册名（界面和命令行中选择的名字，也是翻译记忆键的一部分）
+    max_batch_items: 单次请求最多包含的文本条数，1 即不打包
+    max_batch_size: 单次请求的文本总大小上限，单位见 size_unit（'chars' 字符数 / 'tokens' 估算 token 数）
+    supports_context: 是否把上下文交给引擎；False 时去重和翻译记忆都忽略上下文
+    rate_limits: 服务端配额，如 {'requests_per_minute': 3500, 'tokens_per_minute': 90000}，空 dict 为不限；
+                 据此创建的 ratelimit.RateLimiter 由所有线程共享，API 请求应通过 self.limiter().call 发出
+    default_concurrency: 未指定 concurrency 时同时在途的请求数
+    price_input / price_output: 每百万计费单位（同 size_unit）的输入 / 输出价格（美元），None 为未知；只用于估算
+    typical_latency: 一次请求的典型耗时（秒），只用于估算
+    supports_async: 是否有原生的 translate_batch_async（异步客户端，不占线程，取消时 HTTP 请求随之中止）
+    timeout: 单次请求超时（秒），超时按临时错误退避重试
+
+    同一个引擎对象会被多个工作线程同时调用，translate_batch 必须线程安全。
+    """
+    name = None
+    max_batch_items = 1
+    max_batch_size = 5000
+    size_unit = 'chars'
+    supports_context = False
+    rate_limits = {}
+    default_concurrency = 4
+    price_input = None
+    price_output = None
+    typical_latency = 0.5
+    supports_async = False
+    timeout = 60.0
+
+    def __init__(self):
+        self._limiter = None
+        self._limiter_lock = threading.Lock()
+
+    def limiter(self):
+        """该引擎共享的限速器（按 rate_limits 创建）"""
+        with self._limiter_lock:
+            if self._limiter is None:
+                self._limiter = RateLimiter.from_limits(self.rate_limits, name=self.name)
+            return self._limiter
+
+    def set_rate_limits(self, **limits):
+        """覆盖声明的配额（如账户等级更高时），值为 None 表示不限；重建限速器"""
+        rate_limits = dict(self.rate_limits)
+        rate_limits.update(limits)
+        self.rate_limits = {k: v for k, v in rate_limits.items() if v}
+        with self._limiter_lock:
+            self._limiter = None
+
+    def size_of(self, text, context=''):
+        """一条文本（及上下文）在批次中占用的大小，单位与 max_batch_size 相同"""
+        if self.size_unit == 'tokens':
+            return estimate_tokens(text) + (estimate_tokens(context) if self.supports_context else 0)
+        return len(text or '')
+
+    def capabilities(self):
+        return {'name': self.name, 'max_batch_items': self.max_batch_items, 'max_batch_size': self.max_batch_size,
+                'size_unit': self.size_unit, 'supports_context': self.supports_context,
+                'rate_limits': dict(self.rate_limits), 'default_concurrency': self.default_concurrency}
+
+    def estimate_request(self, texts, target_code, source=None, contexts=None):
+        """
+        不发送请求，估算 translate_batch 翻译这批文本的一次请求消耗的 (输入计费单位, 输出计费单位)。
+        默认按 size_of 计算输入，输出与输入相同
+        """
+        contexts = contexts or [''] * len(texts)
+        size = sum(self.size_of(t, c) for t, c in zip(texts, contexts) if t)
+        return size, size
+
+    def estimate_requests(self, calls, items, size, text_size, target_code, source=None):
+        """
+        不拼请求，按总量估算 calls 次请求（共 items 条，批次大小合计 size，其中原文占 text_size）消耗的
+        (输入计费单位, 输出计费单位)，供试运行规划使用。默认与 estimate_request 一样输入、输出都按 size 计
+        """
+        return size, size
+
+    def estimate_latency(self, input_units, output_units):
+        """估算一次请求的耗时（秒）"""
+        return self.typical_latency
+
+    def estimate_cost(self, input_units, output_units):
+        """按声明的价格估算费用（美元）；价格未知时返回 None"""
+        if self.price_input is None and self.price_output is None:
+            return None
+        return (input_units * (self.price_input or 0.0) + output_units * (self.price_output or 0.0)) / 1000000.0
+
+    def translate_batch(self, texts, target_code, source=None, contexts=None):
+        """
+        翻译一批文本。target_code 为目标语言代码（如 'ja'），contexts 与 texts 等长或为 None。
+        返回 (results, calls)：results 为与 texts 等长的 [(译文, 错误)]，顺序与输入一致；calls 为实际发出的请求数
+        """
+        raise NotImplementedError
+
+    async def translate_batch_async(self, texts, target_code, source=None, contexts=None):
+        """
+        translate_batch 的协程版本，在 aio.py 的事件循环中运行，返回值相同。
+        默认在线程池中调用 translate_batch：被取消时立即返回，请求在后台结束后结果被丢弃
+        """
+        from aio import run_blocking
+        return await run_blocking(self.translate_batch, texts, target_code, source, contexts)
+
+    def translate_text(self, text, target_code, source=None, context=None):
+        """翻译单条文本，返回 (译文, 错误)"""
+        results, _ = self.translate_batch([text], target_code, source, [context])
+        return results[0]
+
+    def close(self):
+        """释放客户端和连接池；之后再调用会重新创建"""
+
+
+class EngineError(Exception):
+    """引擎自己构造的 HTTP 类错误，带上状态码和 Retry-After 供限速器判断是否重试"""
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+_ENGINE_CLASSES = {}
+_instances = {}
+_registry_lock = threading.Lock()
+
+
+def register_engine(cls):
+    """注册引擎类（可作装饰器使用）；同名引擎会被替换"""
+    with _registry_lock:
+        _ENGINE_CLASSES[cls.name] = cls
+        old = _instances.pop(cls.name, None)
+    if old is not None:
+        old.close()
+    return cls
+
+
+def available_engines():
+    """已注册的引擎名，按注册顺序"""
+    return list(_ENGINE_CLASSES)
+
+
+def get_engine(engine):
+    """按名字取引擎的共享实例（首次使用时创建，之后一直复用）；传入 Engine 对象则原样返回"""
+    if isinstance(engine, Engine):
+        return engine
+    with _registry_lock:
+        inst = _instances.get(engine)
+        if inst is None:
+            cls = _ENGINE_CLASSES.get(engine)
+            if cls is None:
+                raise ValueError(f'未知的翻译引擎：{engine}（可用：{"、".join(_ENGINE_CLASSES)}）')
+            inst = cls()
+            _instances[engine] = inst
+    return inst
+
+
+def close_engines():
+    """关闭所有已创建的引擎实例"""
+    with _registry_lock:
+        instances = list(_instances.values())
+        _instances.clear()
+    for inst in instances:
+        inst.close()
+
+
+# Google 批量请求上限：v2 接口单次最多 128 段文本，总字符数建议不超过 5000
+GOOGLE_BATCH_MAX_STRINGS = 128
+GOOGLE_BATCH_MAX_CHARS = 5000
+
+
+@register_engine
+class GoogleEngine(Engine):
+    """
+    Google Cloud Translation v2。客户端在首次使用时创建并在线程间共享；
+    GOOGLE_APPLICATION_CREDENTIALS 变化（界面里换了 Key 文件）时重建。
+    """
+    name = 'Google'
+    max_batch_items = GOOGLE_BATCH_MAX_STRINGS
+    max_batch_size = GOOGLE_BATCH_MAX_CHARS
+    # 默认配额：每分钟 600 万字符
+    rate_limits = {'chars_per_minute': 6000000}
+    default_concurrency = 4
+    # 按发送的字符数计费：每百万字符 20 美元，译文不计费
+    price_input = 20.0
+    price_output = 0.0
+    typical_latency = 0.3
+    # 连接池大小：requests 默认每个主机只保留 10 个连接，并发高于此时会反复新建连接
+    pool_size = 32
+
+    def __init__(self):
+        super().__init__()
+        self._client = None
+        self._credentials = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        credentials = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
+        with self._lock:
+            if self._client is None or self._credentials != credentials:
+                from google.cloud import translate_v2 as google_translate
+                client = google_translate.Client()
+                try:
+                    from requests.adapters import HTTPAdapter
+                    client._http.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size))
+                except Exception:
+                    # 拿不到底层 session 时使用客户端自带的连接池
+                    pass
+                self._client, self._credentials = client, credentials
+            return self._client
+
+    def translate_batch(self, texts, target_code, source=None, contexts=None):
+        # 整批失败时每一项都带上同一错误
+        results = [('', None)] * len(texts)
+        if source and target_code and source.lower() == target_code.lower():
+            return [(t, None) for t in texts], 0
+        # 空文本不发送，直接返回 ''
+        idxs = [k for k, t in enumerate(texts) if t]
+        if not idxs:
+            return results, 0
+        client = self.client()
+        batch = [texts[k] for k in idxs]
+        try:
+            # 限流、5xx 和网络错误由限速器退避重试，重试用完后才算失败
+            resp = self.limiter().call(
+                lambda: client.translate(batch, target_language=target_code, source_language=source),
+                units=sum(len(t) for t in batch))
+        except Exception as e:
+            err = str(e)
+            for k in idxs:
+                results[k] = (None, err)
+            return results, 1
+        if isinstance(resp, dict):
+            resp = [resp]
+        for n, k in enumerate(idxs):
+            if n < len(resp) and resp[n].get('translatedText') is not None:
+                results[k] = (resp[n]['translatedText'], None)
+            else:
+                results[k] = (None, '批量翻译结果缺失')
+                METRICS.record_error(self.name, 'MissingItem')
+        return results, 1
+
+    def close(self):
+        with self._lock:
+            self._client = None
+
+
+# OpenAI 打包模式：一次请求翻译同一目标语言的多条文本（JSON 输入 / JSON 输出）
+# 每批最多 OPENAI_BATCH_MAX_ITEMS 条、估算输入 token 不超过 OPENAI_BATCH_MAX_TOKENS；
+# 把 OpenAIEngine.max_batch_items 设为 1 即关闭打包
+OPENAI_BATCH_MAX_ITEMS = 40
+OPENAI_BATCH_MAX_TOKENS = 1500
+# 打包请求的 max_tokens 上限（按输入 token 估算译文长度，不再固定预留 2048）
+OPENAI_BATCH_MAX_COMPLETION_TOKENS = 4096
+# 估算用：打包请求中每项除原文和上下文外的 JSON 开销（键名、引号等，token）
+OPENAI_ITEM_OVERHEAD_TOKENS = 5
+# 估算用：生成每个输出 token 的耗时（秒）
+OPENAI_SECONDS_PER_OUTPUT_TOKEN = 0.01
+
+
+@register_engine
+class OpenAIEngine(Engine):
+    """
+    OpenAI Chat Completions。一个 openai.OpenAI 客户端（内部是带 keep-alive 连接池的 httpx.Client）
+    供所有请求复用；OPENAI_API_KEY 变化时重建。异步路径另用一个 openai.AsyncOpenAI 客户端，
+    绑定在 aio.py 的常驻事件循环上。
+    """
+    name = 'OpenAI'
+    model = 'gpt-3.5-turbo'
+    max_batch_items = OPENAI_BATCH_MAX_ITEMS
+    max_batch_size = OPENAI_BATCH_MAX_TOKENS
+    size_unit = 'tokens'
+    supports_context = True
+    # 按低档账户的配额声明，账户等级更高时可调大
+    rate_limits = {'requests_per_minute': 3500, 'tokens_per_minute': 90000}
+    default_concurrency = 4
+    # gpt-3.5-turbo 每百万 token 价格（美元）
+    price_input = 0.5
+    price_output = 1.5
+    typical_latency = 0.8
+    supports_async = True
+    # 单次请求超时（秒）
+    timeout = 60.0
+
+    def __init__(self):
+        super().__init__()
+        self._client = None
+        self._api_key = None
+        self._async_client = None
+        self._async_api_key = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        api_key = os.getenv('OPENAI_API_KEY')
+        with self._lock:
+            if self._client is None or self._api_key != api_key:
+                import openai
+                # 重试交给限速器（所有线程共享退避状态），关闭 SDK 自带的重试
+                self._client = openai.OpenAI(api_key=api_key, timeout=self.timeout, max_retries=0)
+                self._api_key = api_key
+            return self._client
+
+    def async_client(self):
+        """异步客户端（只能在 aio.py 的事件循环中使用）"""
+        api_key = os.getenv('OPENAI_API_KEY')
+        with self._lock:
+            if self._async_client is None or self._async_api_key != api_key:
+                import openai
+                self._async_client = openai.AsyncOpenAI(api_key=api_key, timeout=self.timeout, max_retries=0)
+                self._async_api_key = api_key
+            return self._async_client
+
+    def _request_kwargs(self, prompt, max_tokens, json_mode):
+        kwargs = {'response_format': {"type": "json_object"}} if json_mode else {}
+        return dict(model=self.model, messages=[{"role": "user", "content": prompt}], temperature=0.2,
+                    max_tokens=max_tokens, **kwargs)
+
+    def _complete(self, prompt, max_tokens, json_mode=False):
+        kwargs = self._request_kwargs(prompt, max_tokens, json_mode)
+        client = self.client()
+        # token 配额按提示词加上 max_tokens 计算（与服务端的计法一致）
+        return self.limiter().call(lambda: client.chat.completions.create(**kwargs),
+                                   units=estimate_tokens(prompt) + max_tokens, chars=len(prompt))
+
+    async def _complete_async(self, prompt, max_tokens, json_mode=False):
+        kwargs = self._request_kwargs(prompt, max_tokens, json_mode)
+        client = self.async_client()
+        return await self.limiter().call_async(lambda: client.chat.completions.create(**kwargs),
+                                               units=estimate_tokens(prompt) + max_tokens, chars=len(prompt),
+                                               timeout=self.timeout)
+
+    @staticmethod
+    def _content(response):
+        # 兼容旧/new 返回结构
+        try:
+            return response.choices[0].message.content.strip()
+        except Exception:
+            # fallback if different shape
+            return str(response)
+
+    @staticmethod
+    def _text_prompt(text, target_code, source=None, context=None):
+        return (f"将以下内容从{source or '原文'}翻译为{target_code}，{{0}}、{{1}} 这样的占位符原样保留。\n"
+                f"上下文：{context or ''}\n原文：{text}\n翻译：")
+
+    @staticmethod
+    def _batch_prompt(texts, idxs, target_code, source=None, contexts=None):
+        # 返回 (提示词, 输入 JSON)；键为 texts 中的下标
+        payload = {}
+        for k in idxs:
+            item = {'text': texts[k]}
+            if contexts and contexts[k]:
+                item['context'] = contexts[k]
+            payload[str(k)] = item
+        payload_text = json.dumps(payload, ensure_ascii=False)
+        prompt = (f"将下面 JSON 中每一项的 text 从{source or '原文'}翻译为{target_code}，"
+                  f"context 是该项的上下文，仅供参考，不要翻译；{{0}}、{{1}} 这样的占位符原样保留。\n"
+                  f"只输出一个 JSON 对象：键与输入完全相同，值为对应 text 的译文字符串，不要输出其他内容。\n"
+                  f"输入：{payload_text}")
+        return prompt, payload_text
+
+    def estimate_request(self, texts, target_code, source=None, contexts=None):
+        # 输入按实际会发送的提示词估算；输出按译文与原文 token 数相当，打包时每项另加约 4 个 token 的 JSON 开销
+        contexts = contexts or [None] * len(texts)
+        idxs = [k for k, t in enumerate(texts) if t]
+        if not idxs:
+            return 0, 0
+        if len(idxs) == 1:
+            k = idxs[0]
+            return estimate_tokens(self._text_prompt(texts[k], target_code, source, contexts[k])), estimate_tokens(texts[k])
+        prompt, _ = self._batch_prompt(texts, idxs, target_code, source, contexts)
+        return estimate_tokens(prompt), sum(estimate_tokens(texts[k]) + 4 for k in idxs) + 2
+
+    def estimate_requests(self, calls, items, size, text_size, target_code, source=None):
+        # 每次请求另有固定的提示词，每项另有键名等 JSON 开销；输出与 estimate_request 相同
+        prompt, _ = self._batch_prompt([], [], target_code, source)
+        return (size + calls * estimate_tokens(prompt) + items * OPENAI_ITEM_OVERHEAD_TOKENS,
+                text_size + items * 4 + calls * 2)
+
+    def estimate_latency(self, input_units, output_units):
+        # 耗时主要取决于生成的 token 数
+        return self.typical_latency + output_units * OPENAI_SECONDS_PER_OUTPUT_TOKEN
+
+    def translate_text(self, text, target_code, source=None, context=None):
+        if not text:
+            return '', None
+        prompt = self._text_prompt(text, target_code, source, context)
+        try:
+            return self._content(self._complete(prompt, self._text_max_tokens(text))), None
+        except Exception as e:
+            return None, str(e)
+
+    async def translate_text_async(self, text, target_code, source=None, context=None):
+        if not text:
+            return '', None
+        prompt = self._text_prompt(text, target_code, source, context)
+        try:
+            return self._content(await self._complete_async(prompt, self._text_max_tokens(text))), None
+        except Exception as e:
+            return None, str(e)
+
+    @staticmethod
+    def _text_max_tokens(text):
+        # 与打包请求一样按原文估算译文长度，长文本不会被固定的上限截断
+        return min(OPENAI_BATCH_MAX_COMPLETION_TOKENS, max(2048, 2 * estimate_tokens(text) + 64))
+
+    def _batch_request(self, texts, idxs, target_code, source, contexts):
+        # 返回 (提示词, max_tokens)
+        prompt, payload_text = self._batch_prompt(texts, idxs, target_code, source, contexts)
+        return prompt, min(OPENAI_BATCH_MAX_COMPLETION_TOKENS, 2 * estimate_tokens(payload_text) + 16 * len(idxs) + 64)
+
+    def _parse_batch(self, response, idxs):
+        # 返回 {下标: 译文}，缺失或格式不对的条目不在其中；整个回复不是 JSON 对象时返回 None
+        parsed = _parse_json_object(response.choices[0].message.content)
+        if parsed is None:
+            METRICS.record_error(self.name, 'InvalidJSON')
+            return None
+        found = {}
+        for k in idxs:
+            value = parsed.get(str(k))
+            if isinstance(value, str) and value.strip():
+                found[k] = value.strip()
+            elif parsed:
+                METRICS.record_error(self.name, 'MissingItem')
+        return found
+
+    @staticmethod
+    def _failed_batch(results, idxs, err):
+        for k in idxs:
+            results[k] = (None, err)
+        return results
+
+    def translate_batch(self, texts, target_code, source=None, contexts=None):
+        """
+        把多条文本（及各自的上下文）打包成一个 JSON 提示词，一次请求翻译。
+        校验返回的 JSON 与输入的键一一对应；缺失或格式不对的条目逐条回退到 translate_text。
+        整个请求失败（限速器重试用完的 429 / 5xx / 超时、鉴权错误等）或回复不是 JSON 时不逐条重发，
+        所有条目都返回错误，由 run_jobs 的重试队列整批重试
+        """
+        contexts = contexts or [None] * len(texts)
+        results = [('', None)] * len(texts)
+        idxs = [k for k, t in enumerate(texts) if t]
+        if not idxs:
+            return results, 0
+        if len(idxs) == 1:
+            k = idxs[0]
+            results[k] = self.translate_text(texts[k], target_code, source, contexts[k])
+            return results, 1
+
+        prompt, max_tokens = self._batch_request(texts, idxs, target_code, source, contexts)
+        calls = 1
+        try:
+            found = self._parse_batch(self._complete(prompt, max_tokens, json_mode=True), idxs)
+        except Exception as e:
+            return self._failed_batch(results, idxs, str(e)), calls
+        if found is None:
+            return self._failed_batch(results, idxs, 'OpenAI: 返回的不是有效的 JSON'), calls
+
+        for k in idxs:
+            if k in found:
+                results[k] = (found[k], None)
+            else:
+                # 缺失或格式不对：单独再请求一次
+                results[k] = self.translate_text(texts[k], target_code, source, contexts[k])
+                calls += 1
+        return results, calls
+
+    async def translate_batch_async(self, texts, target_code, source=None, contexts=None):
+        """translate_batch 的异步版本；缺失的条目并发地逐条补请求（整个请求失败时同样不逐条重发）"""
+        import asyncio
+        contexts = contexts or [None] * len(texts)
+        results = [('', None)] * len(texts)
+        idxs = [k for k, t in enumerate(texts) if t]
+        if not idxs:
+            return results, 0
+        if len(idxs) == 1:
+            k = idxs[0]
+            results[k] = await self.translate_text_async(texts[k], target_code, source, contexts[k])
+            return results, 1
+
+        prompt, max_tokens = self._batch_request(texts, idxs, target_code, source, contexts)
+        try:
+            found = self._parse_batch(await self._complete_async(prompt, max_tokens, json_mode=True), idxs)
+        except Exception as e:
+            return self._failed_batch(results, idxs, str(e)), 1
+        if found is None:
+            return self._failed_batch(results, idxs, 'OpenAI: 返回的不是有效的 JSON'), 1
+        for k in idxs:
+            if k in found:
+                results[k] = (found[k], None)
+        missing = [k for k in idxs if k not in found]
+        retried = await asyncio.gather(*(self.translate_text_async(texts[k], target_code, source, contexts[k])
+                                         for k in missing))
+        for k, result in zip(missing, retried):
+            results[k] = result
+        return results, 1 + len(missing)
+
+    def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+            async_client, self._async_client = self._async_client, None
+        if client is not None:
+            try:
+                client.close()
+            except Exception:
+                pass
+        if async_client is not None:
+            try:
+                from aio import run
+                run(async_client.close(), timeout=5.0)
+            except Exception:
+                pass
+
+
+# 本地模拟引擎（engine='Mock'）：不联网，按配置的延迟、抖动和失败率返回伪译文，用于离线测试和基准测试
+# latency/jitter 单位为秒，每次调用耗时在 [latency - jitter, latency + jitter] 内均匀分布；
+# error_rate 为整批失败的概率；throttle_rate 为请求返回 429（附 Retry-After: retry_after 秒）的概率，用于测试退避；
+# seed 固定后结果可复现。也可用环境变量 TRANSFUSE_MOCK_LATENCY 等覆盖默认值
+MOCK_ENGINE = {
+    'latency': float(os.environ.get('TRANSFUSE_MOCK_LATENCY', 0.05)),
+    'jitter': float(os.environ.get('TRANSFUSE_MOCK_JITTER', 0.02)),
+    'error_rate': float(os.environ.get('TRANSFUSE_MOCK_ERROR_RATE', 0.0)),
+    'throttle_rate': float(os.environ.get('TRANSFUSE_MOCK_THROTTLE_RATE', 0.0)),
+    'retry_after': float(os.environ.get('TRANSFUSE_MOCK_RETRY_AFTER', 0.2)),
+    'seed': None,
+}
+_mock_rng = random.Random()
+_mock_lock = threading.Lock()
+
+
+def configure_mock_engine(latency=None, jitter=None, error_rate=None, seed=None, throttle_rate=None,
+                          retry_after=None):
+    """修改模拟引擎参数；传入 seed 会重置随机数序列"""
+    with _mock_lock:
+        if throttle_rate is not None:
+            MOCK_ENGINE['throttle_rate'] = float(throttle_rate)
+        if retry_after is not None:
+            MOCK_ENGINE['retry_after'] = float(retry_after)
+        if latency is not None:
+            MOCK_ENGINE['latency'] = float(latency)
+        if jitter is not None:
+            MOCK_ENGINE['jitter'] = float(jitter)
+        if error_rate is not None:
+            MOCK_ENGINE['error_rate'] = float(error_rate)
+        if seed is not None:
+            MOCK_ENGINE['seed'] = seed
+            _mock_rng.seed(seed)
+
+
+@register_engine
+class MockEngine(Engine):
+    """本地模拟引擎，批量能力与 Google 相同，参数见 MOCK_ENGINE"""
+    name = 'Mock'
+    max_batch_items = GOOGLE_BATCH_MAX_STRINGS
+    max_batch_size = GOOGLE_BATCH_MAX_CHARS
+    default_concurrency = 8
+    price_input = 0.0
+    price_output = 0.0
+    supports_async = True
+
+    def estimate_latency(self, input_units, output_units):
+        return MOCK_ENGINE['latency']
+
+    @staticmethod
+    def _draw():
+        # 抽取一次请求的 (延迟, 是否 429, 是否失败)
+        with _mock_lock:
+            latency, jitter = MOCK_ENGINE['latency'], MOCK_ENGINE['jitter']
+            delay = max(0.0, latency + _mock_rng.uniform(-jitter, jitter)) if (latency or jitter) else 0.0
+            throttled = _mock_rng.random() < MOCK_ENGINE['throttle_rate']
+            failed = _mock_rng.random() < MOCK_ENGINE['error_rate']
+        return delay, throttled, failed
+
+    @staticmethod
+    def _outcome(throttled, failed):
+        if throttled:
+            raise EngineError('Mock: 429 Too Many Requests', status_code=429, retry_after=MOCK_ENGINE['retry_after'])
+        return failed
+
+    def _request(self):
+        # 模拟一次请求：先等待延迟，再按 throttle_rate 返回 429，返回值表示是否按 error_rate 失败
+        delay, throttled, failed = self._draw()
+        if delay:
+            time.sleep(delay)
+        return self._outcome(throttled, failed)
+
+    async def _request_async(self):
+        import asyncio
+        delay, throttled, failed = self._draw()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._outcome(throttled, failed)
+
+    def _results(self, texts, target_code, failed):
+        if failed:
+            METRICS.record_error(self.name, 'MockError')
+            return [(None, 'Mock: 模拟请求失败')] * len(texts), 1
+        return [(f'[{target_code}] {t}' if t else '', None) for t in texts], 1
+
+    def translate_batch(self, texts, target_code, source=None, contexts=None):
+        try:
+            failed = self.limiter().call(self._request, units=sum(len(t or '') for t in texts))
+        except Exception as e:
+            return [(None, str(e))] * len(texts), 1
+        return self._results(texts, target_code, failed)
+
+    async def translate_batch_async(self, texts, target_code, source=None, contexts=None):
+        try:
+            failed = await self.limiter().call_async(self._request_async, units=sum(len(t or '') for t in texts),
+                                                     timeout=self.timeout)
+        except Exception as e:
+            return [(None, str(e))] * len(texts), 1
+        return self._results(texts, target_code, failed)
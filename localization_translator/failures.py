@@ -0,0 +1,70 @@
+"""
+失败清单：记录最终（重试用完后）仍翻译失败的 cell，保存在表格旁的 filepath + '.failed.json'。
+
+translate_json 的“只重试失败项”模式读取这份清单，只重新请求其中的 cell，不再扫描整张表。
+cell 翻译成功或已被手工填上后从清单中移除；清单为空时删除文件。
+"""
+import json
+import os
+
+from journal import source_hash
+from utils import open_atomic
+
+
+def default_failures_path(filepath):
+    return filepath + '.failed.json'
+
+
+class FailureLog:
+    """
+    path: 清单文件路径；文件不存在时为空清单
+    每项以 (行号, 语言列) 为键，保存 {"i": 行号, "l": 语言列, "s": 源文哈希, "e": 错误}
+    """
+    def __init__(self, path):
+        self.path = path
+        self.cells = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for entry in json.load(f).get('cells', []):
+                        self.cells[(entry['i'], entry['l'])] = entry
+            except (ValueError, OSError, AttributeError, KeyError, TypeError):
+                self.cells = {}
+        self._dirty = False
+
+    def __len__(self):
+        return len(self.cells)
+
+    def rows(self, start, end, src_of):
+        """
+        行号在 [start, end) 内、且源文未改动的失败项，返回 {行号 - start: 语言列集合}。
+        src_of(相对行号) 返回该行当前源文
+        """
+        found = {}
+        for (i, lang), entry in self.cells.items():
+            if start <= i < end and entry.get('s') == source_hash(src_of(i - start)):
+                found.setdefault(i - start, set()).add(lang)
+        return found
+
+    def entries(self, start, end):
+        """行号在 [start, end) 内的失败项"""
+        return [e for (i, _), e in list(self.cells.items()) if start <= i < end]
+
+    def add(self, i, lang, src_text, err):
+        self.cells[(i, lang)] = {'i': i, 'l': lang, 's': source_hash(src_text), 'e': str(err)}
+        self._dirty = True
+
+    def discard(self, i, lang):
+        if self.cells.pop((i, lang), None) is not None:
+            self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        if self.cells:
+            entries = sorted(self.cells.values(), key=lambda e: (e['i'], e['l']))
+            with open_atomic(self.path, encoding='utf-8') as f:
+                json.dump({'version': 1, 'cells': entries}, f, ensure_ascii=False)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+        self._dirty = False
@@ -0,0 +1,178 @@
+"""
+模糊匹配：在翻译记忆中为还没有译文的 cell 找相近的已翻译文本，作为参考译文提供给译者，不自动写入表格。
+
+FuzzyIndex 是字符二元组（中文按字切分时二元组比三元组召回更好）的倒排索引：查询时先按共有二元组数
+筛出候选，再用编辑距离算相似度 1 - 距离 / 较长文本长度。文本都先经过 normalize.mask，
+只差数字、占位符或标签的文本相似度为 1，这类完全匹配在翻译时已经由翻译记忆直接复用。
+
+    index = FuzzyIndex()
+    index.add('获得{0}金币', 'Got {0} gold')
+    index.search('获得{0}银币', 0.7)      # [(0.857..., '获得{0}金币', 'Got {0} gold')]
+"""
+import json
+import os
+
+from normalize import mask, unmask
+from utils import open_atomic
+
+# 默认最低相似度
+FUZZY_MIN_SIMILARITY = 0.75
+# 倒排表长度超过该值的二元组（如“的”“{0}”附近的常见组合）不参与候选召回，避免一次查询扫描大半个索引
+FUZZY_MAX_POSTING = 5000
+# 每次查询最多计算编辑距离的候选数
+FUZZY_MAX_CANDIDATES = 50
+
+
+def default_suggest_path(filepath):
+    return filepath + '.suggest.json'
+
+
+def _grams(text):
+    padded = f'\x02{text}\x03'
+    return {padded[k:k + 2] for k in range(len(padded) - 1)}
+
+
+def edit_distance(a, b, limit=None):
+    """Levenshtein 距离；limit 不为空时超过 limit 即提前返回 limit + 1"""
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def similarity(a, b):
+    longest = max(len(a), len(b))
+    return 1.0 - edit_distance(a, b) / longest if longest else 1.0
+
+
+class FuzzyIndex:
+    def __init__(self):
+        self._texts = []
+        self._payloads = []
+        self._postings = {}
+        self._seen = {}
+
+    def __len__(self):
+        return len(self._texts)
+
+    def add(self, text, payload=None):
+        """加入一条文本（重复的文本只保留第一条）"""
+        if not text or text in self._seen:
+            return
+        idx = len(self._texts)
+        self._seen[text] = idx
+        self._texts.append(text)
+        self._payloads.append(payload)
+        for gram in _grams(text):
+            self._postings.setdefault(gram, []).append(idx)
+
+    def search(self, text, min_similarity=FUZZY_MIN_SIMILARITY, limit=1):
+        """返回相似度不低于 min_similarity 的 [(相似度, 文本, payload)]，按相似度从高到低，最多 limit 条"""
+        if not text or not self._texts:
+            return []
+        exact = self._seen.get(text)
+        if exact is not None:
+            return [(1.0, text, self._payloads[exact])]
+        grams = _grams(text)
+        counts = {}
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None or len(posting) > FUZZY_MAX_POSTING:
+                continue
+            for idx in posting:
+                counts[idx] = counts.get(idx, 0) + 1
+        if not counts:
+            return []
+        # 一次编辑最多破坏两个二元组，共有二元组太少的不可能达到相似度要求；按共有数取前若干个候选算编辑距离
+        max_edits = int(len(text) * (1.0 - min_similarity) / max(min_similarity, 0.01)) + 1
+        need = max(1, len(grams) - 2 * max_edits)
+        candidates = sorted((c for c in counts.items() if c[1] >= need), key=lambda c: -c[1])
+        results = []
+        for idx, _ in candidates[:FUZZY_MAX_CANDIDATES]:
+            other = self._texts[idx]
+            longest = max(len(text), len(other))
+            max_distance = int(longest * (1.0 - min_similarity))
+            distance = edit_distance(text, other, max_distance)
+            if distance <= max_distance:
+                results.append((1.0 - distance / longest, other, self._payloads[idx]))
+        results.sort(key=lambda r: -r[0])
+        return results[:limit]
+
+
+def memory_index(tm, engine, target_code):
+    """由翻译记忆中某引擎、某目标语言的全部条目建索引（payload 为译文）"""
+    index = FuzzyIndex()
+    for source_text, translation in tm.entries(engine, target_code):
+        index.add(source_text, translation)
+    return index
+
+
+def suggest_table(data, engine, tm, min_similarity=FUZZY_MIN_SIMILARITY, row_offset=0, indexes=None):
+    """
+    为 data 中仍待翻译的 cell 找翻译记忆中的相近译文。返回
+    [{'i': 行号, 'l': 语言列, 'source': 原文, 'match': 记忆中的原文, 'translation': 参考译文, 'score': 相似度}]；
+    参考译文中的占位符已按该 cell 的原文还原
+    indexes: {目标语言代码: FuzzyIndex}，分块处理时各块共用
+    """
+    from engines import get_engine
+    from translator import TableScan
+    engine = get_engine(engine)
+    indexes = {} if indexes is None else indexes
+    scan = TableScan(data, engine)
+    suggestions = []
+    for target_code, target_jobs in scan.jobs.items():
+        if not target_jobs:
+            continue
+        index = indexes.get(target_code)
+        if index is None:
+            index = indexes[target_code] = memory_index(tm, engine.name, target_code)
+        for job in target_jobs:
+            found = index.search(job[0], min_similarity)
+            if not found:
+                continue
+            score, match, translation = found[0]
+            for i, lang in job[2]:
+                source = scan.source_text(i)
+                suggestions.append({'i': row_offset + i, 'l': lang, 'source': source, 'match': match,
+                                    'translation': unmask(translation, mask(source)[1]), 'score': round(score, 3)})
+    return suggestions
+
+
+def suggest_file(filepath, engine, min_similarity=FUZZY_MIN_SIMILARITY, cache_path=None, chunk_rows=None):
+    """
+    为 filepath（CSV 或 JSON）中仍待翻译的 cell 生成模糊匹配参考译文，写到表格旁的 *.suggest.json
+    （没有建议时删除旧文件），不修改表格本身。返回建议列表
+    """
+    from translation_memory import TranslationMemory
+    from translator import CSV_CHUNK_ROWS
+    from utils import read_json_table, LocalizationCsvReader
+    tm = TranslationMemory(cache_path)
+    suggestions = []
+    indexes = {}
+    try:
+        if filepath.lower().endswith('.json'):
+            suggestions = suggest_table(read_json_table(filepath), engine, tm, min_similarity, indexes=indexes)
+        else:
+            with LocalizationCsvReader(filepath) as reader:
+                row_offset = 0
+                for chunk in reader.iter_tables(chunk_rows or CSV_CHUNK_ROWS):
+                    suggestions.extend(suggest_table(chunk, engine, tm, min_similarity, row_offset, indexes))
+                    row_offset += len(chunk)
+    finally:
+        tm.close()
+    path = default_suggest_path(filepath)
+    if suggestions:
+        with open_atomic(path, encoding='utf-8') as f:
+            json.dump(suggestions, f, ensure_ascii=False, indent=2)
+    elif os.path.exists(path):
+        os.remove(path)
+    return suggestions
@@ -2,13 +2,16 @@ import sys
 import time
 import os
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QFileDialog, QComboBox, QMessageBox, QProgressBar
+    QApplication, QWidget, QVBoxLayout, QPushButton, QLabel, QFileDialog, QComboBox, QMessageBox, QProgressBar,
+    QDialog, QPlainTextEdit
 )
-from PyQt5.QtCore import Qt, QRunnable, QThreadPool, QObject, pyqtSignal
+from PyQt5.QtCore import Qt, QRunnable, QThreadPool, QObject, pyqtSignal, QTimer
+
+from results_model import ResultsModel, FILTER_ALL, FILTER_FAILED, FILTER_PENDING
 
 # WorkerSignals: signals emitted by the worker to the GUI
 class WorkerSignals(QObject):
-    # percent, info_text, row_time, done, total
+    # percent, info_text, eta（预计剩余秒数，未知为 -1）, done, total
     progress = pyqtSignal(float, str, float, int, int)
     finished = pyqtSignal(str, str)  # (type, message)
 
@@ -19,11 +22,28 @@ class TranslateWorker(QRunnable):
     It wraps the translator's progress_callback so we can convert it into Qt signals,
     and supports cooperative cancellation via the `is_cancelled` attribute.
     """
-    def __init__(self, csv_path, engine, is_json=False):
+    def __init__(self, csv_path, engine, is_json=False, concurrency=None, use_cache=True, incremental=False,
+                 retry_failed=False, is_project=False, result_callback=None, secondary_engine=None,
+                 hedge_percentile=None):
         super().__init__()
         self.csv_path = csv_path
         self.engine = engine
         self.is_json = is_json
+        # 项目模式：csv_path 为项目目录或项目清单，所有表格跨文件去重后统一翻译（见 project.py）
+        self.is_project = is_project
+        # 同时在途的翻译请求数；None 表示使用该引擎声明的 default_concurrency
+        self.concurrency = concurrency
+        # 是否使用翻译记忆（跨运行共享的本地缓存）
+        self.use_cache = use_cache
+        # 增量模式：源文有改动的行即使已有译文也重译
+        self.incremental = incremental
+        # 只重试上次失败的 cell（表格旁的 .failed.json）
+        self.retry_failed = retry_failed
+        # 结果表的 ResultsModel.feed：翻译线程中登记写回的 cell（项目模式不使用）
+        self.result_callback = result_callback
+        # 备用引擎（主引擎熔断时改发给它）和对冲阈值百分位，None 为不使用（见 health.py）
+        self.secondary_engine = secondary_engine
+        self.hedge_percentile = hedge_percentile
         self.signals = WorkerSignals()
         self.is_cancelled = False
 
@@ -34,19 +54,20 @@ class TranslateWorker(QRunnable):
         # Import translator inside worker to avoid importing heavy libs in GUI thread
         try:
             # The translator functions are expected to accept a progress_callback with the signature:
-            #   progress_callback(percent: float, info: Optional[str]=None, row_time: Optional[float]=None, done: Optional[int]=None, total: Optional[int]=None)
-            # The worker wraps that so it first checks for cancellation and converts parameters into Qt signals.
+            #   progress_callback(percent: float, info: Optional[str]=None, row_time: Optional[float]=None, done: Optional[int]=None, total: Optional[int]=None, eta: Optional[float]=None)
+            # Calls are already coalesced by progress.ProgressAggregator (about 10 per second), so each one becomes one Qt signal.
             from translator import translate_csv, translate_json
+            from utils import read_json_table
         except Exception as e:
             self.signals.finished.emit('error', f'无法导入 translator: {e}')
             return
 
-        def wrapped_callback(percent, info=None, row_time=None, done=None, total=None):
+        def wrapped_callback(percent, info=None, row_time=None, done=None, total=None, eta=None):
             # If cancellation requested, try to notify translator (cooperative)
             if self.is_cancelled:
                 # translator should check for cancellation (see guidance) and stop; we just notify GUI
                 # Emit a final progress so UI can update
-                self.signals.progress.emit(min(max(float(percent or 0.0), 0.0), 100.0), info or '', float(row_time or 0.0), int(done or 0), int(total or 0))
+                self.signals.progress.emit(min(max(float(percent or 0.0), 0.0), 100.0), info or '', -1.0, int(done or 0), int(total or 0))
                 return
             try:
                 p = float(percent)
@@ -55,49 +76,176 @@ class TranslateWorker(QRunnable):
                     p = float(0)
                 except Exception:
                     p = 0.0
-            self.signals.progress.emit(min(max(p, 0.0), 100.0), str(info or ''), float(row_time or 0.0), int(done or 0), int(total or 0))
+            self.signals.progress.emit(min(max(p, 0.0), 100.0), str(info or ''), float(eta) if eta is not None else -1.0, int(done or 0), int(total or 0))
 
         try:
-            if self.is_json:
-                translate_json(self.csv_path, self.engine, wrapped_callback, cancel_checker=lambda: self.is_cancelled)
+            if self.is_project:
+                from project import translate_project
+                stats = translate_project(self.csv_path, self.engine, wrapped_callback,
+                                          cancel_checker=lambda: self.is_cancelled, concurrency=self.concurrency,
+                                          use_cache=self.use_cache, incremental=self.incremental,
+                                          retry_failed=self.retry_failed, secondary_engine=self.secondary_engine,
+                                          hedge_percentile=self.hedge_percentile)
+                if not self.is_cancelled:
+                    self.signals.finished.emit('info', f'项目翻译完成：{stats["files"]}个表格，'
+                                                       f'跳过未改动的{stats["skipped"]}个，'
+                                                       f'跨文件去重节省{stats["cross_file_saved"]}次请求')
+                    return
+            elif self.is_json:
+                data = read_json_table(self.csv_path)
+                translate_json(data, self.engine, self.csv_path, wrapped_callback,
+                               cancel_checker=lambda: self.is_cancelled, concurrency=self.concurrency,
+                               use_cache=self.use_cache, incremental=self.incremental,
+                               retry_failed=self.retry_failed, result_callback=self.result_callback,
+                               secondary_engine=self.secondary_engine, hedge_percentile=self.hedge_percentile)
             else:
-                translate_csv(self.csv_path, self.engine, wrapped_callback, cancel_checker=lambda: self.is_cancelled)
+                translate_csv(self.csv_path, self.engine, wrapped_callback,
+                              cancel_checker=lambda: self.is_cancelled, concurrency=self.concurrency,
+                              use_cache=self.use_cache, incremental=self.incremental,
+                              retry_failed=self.retry_failed, result_callback=self.result_callback,
+                              secondary_engine=self.secondary_engine, hedge_percentile=self.hedge_percentile)
             # If cancelled, we still reach here if translator exits cooperatively
             if self.is_cancelled:
-                self.signals.finished.emit('info', '翻译已取消')
+                self.signals.finished.emit('info', '翻译已取消，已完成的译文已保存')
             else:
                 self.signals.finished.emit('info', '翻译完成')
         except Exception as e:
             self.signals.finished.emit('error', f'翻译过程出错：{e}')
 
 
+class ConvertWorker(QRunnable):
+    """后台 CSV/JSON 互转（utils.csv_to_json / json_to_csv），大表转换时界面不卡住"""
+    def __init__(self, src_path, dest_path, to_json, compact=False):
+        super().__init__()
+        self.src_path = src_path
+        self.dest_path = dest_path
+        self.to_json = to_json
+        # 只对导出 JSON 有效：不缩进，文件更小
+        self.compact = compact
+        self.signals = WorkerSignals()
+
+    def run(self):
+        try:
+            from utils import csv_to_json, json_to_csv
+            start = time.time()
+            if self.to_json:
+                rows = csv_to_json(self.src_path, self.dest_path, compact=self.compact)
+            else:
+                rows = json_to_csv(self.src_path, self.dest_path)
+                if not rows:
+                    self.signals.finished.emit('warning', 'JSON文件无数据')
+                    return
+        except Exception as e:
+            self.signals.finished.emit('error', f'导出{"JSON" if self.to_json else "CSV"}失败：{e}')
+            return
+        self.signals.finished.emit('info', f'已保存为：{self.dest_path}（{rows}行，用时{time.time() - start:.1f}秒）')
+
+
+class PlanSignals(QObject):
+    # (规划序号, planner.plan_file 的结果；失败时为错误信息字符串)
+    finished = pyqtSignal(int, object)
+
+
+class PlanWorker(QRunnable):
+    """后台试运行规划：选择文件或修改选项后自动估算请求数、字符数、费用和耗时，不发送请求、不阻塞界面"""
+    def __init__(self, generation, path, engine, use_cache=True, incremental=False, retry_failed=False):
+        super().__init__()
+        # 规划序号：换文件或改选项后旧的结果按序号丢弃
+        self.generation = generation
+        self.path = path
+        self.engine = engine
+        self.use_cache = use_cache
+        self.incremental = incremental
+        self.retry_failed = retry_failed
+        self.signals = PlanSignals()
+
+    def run(self):
+        try:
+            from planner import plan_file
+            plan = plan_file(self.path, self.engine, use_cache=self.use_cache, incremental=self.incremental,
+                             retry_failed=self.retry_failed)
+        except Exception as e:
+            self.signals.finished.emit(self.generation, f'预估工作量失败：{e}')
+            return
+        self.signals.finished.emit(self.generation, plan)
+
+
+class MetricsDialog(QDialog):
+    """运行指标窗口：每秒刷新一次 metrics.METRICS 的快照，可导出为 JSON"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        from PyQt5.QtWidgets import QHBoxLayout
+        self.setWindowTitle('运行指标')
+        self.resize(560, 320)
+        layout = QVBoxLayout()
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        layout.addWidget(self.text)
+        buttons = QHBoxLayout()
+        btn_export = QPushButton('导出JSON')
+        btn_export.clicked.connect(self.export_json)
+        buttons.addWidget(btn_export)
+        buttons.addStretch(1)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+        self.refresh()
+
+    def refresh(self):
+        from metrics import get_metrics, format_metrics
+        self.text.setPlainText(format_metrics(get_metrics().snapshot()))
+
+    def export_json(self):
+        from metrics import get_metrics
+        file_path, _ = QFileDialog.getSaveFileName(self, '导出指标', 'metrics.json', 'JSON Files (*.json)')
+        if not file_path:
+            return
+        try:
+            get_metrics().dump(file_path)
+        except Exception as e:
+            QMessageBox.critical(self, '错误', f'导出失败：{e}')
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        super().closeEvent(event)
+
+
 class TranslatorGUI(QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle('本地化翻译工具')
-        self.setGeometry(300, 200, 520, 260)
+        self.setGeometry(300, 200, 760, 560)
         self.csv_path = ''
         self.is_json = False
 
-        # Progress statistics for ETA
-        self._progress_samples = []
-        self._progress_samples_max = 20
-        self._progress_time_sum = 0.0
-        self._progress_done_total = 0
-        self._progress_total_tasks = None
+        # 本次翻译的开始时间（完成时显示总用时；剩余时间由 translator 的进度汇总器估算）
+        self._progress_start = None
 
         self.threadpool = QThreadPool()
         self.current_worker = None
+        # 当前文件用所选引擎的试运行规划结果（planner.plan_file），切换引擎时重新规划，改并发数时只重新格式化
+        self._plan = None
+        self._plan_generation = 0
+        # 本次翻译的结果表模型（每次开始翻译时新建）
+        self.results_model = None
 
         self.init_ui()
 
     def init_ui(self):
-        from PyQt5.QtWidgets import QHBoxLayout, QLineEdit
+        from PyQt5.QtWidgets import QHBoxLayout, QLineEdit, QSpinBox, QCheckBox, QTableView, QHeaderView
+        from engines import available_engines
         layout = QVBoxLayout()
 
         self.label = QLabel('请选择文件（CSV或JSON）：')
         layout.addWidget(self.label)
 
+        # 试运行规划：选择文件后自动估算的工作量
+        self.plan_label = QLabel('')
+        self.plan_label.setWordWrap(True)
+        layout.addWidget(self.plan_label)
+
         # File controls
         h_btns = QHBoxLayout()
         self.btn_select = QPushButton('选择文件')
@@ -113,17 +261,69 @@ class TranslatorGUI(QWidget):
         self.btn_export_csv.setVisible(False)
         h_btns.addWidget(self.btn_export_csv)
 
+        self.compact_json_check = QCheckBox('紧凑JSON')
+        self.compact_json_check.setToolTip('导出JSON时不缩进，每行数据占一行，文件更小、写得更快')
+        h_btns.addWidget(self.compact_json_check)
+
+        self.btn_select_project = QPushButton('选择项目目录')
+        self.btn_select_project.setToolTip('翻译目录中的所有 CSV/JSON 表格：跨文件去重，跳过内容未改动的表格')
+        self.btn_select_project.clicked.connect(self.select_project)
+        h_btns.addWidget(self.btn_select_project)
+
         layout.addLayout(h_btns)
 
+        self.is_project = False
         default_path = r'D:\RgClient\Assets\Shared\GameRes\Localization\多语言表.csv'
         self.csv_path = default_path
         self.label.setText(f'默认：{default_path}')
 
         self.engine_combo = QComboBox()
-        self.engine_combo.addItems(['Google', 'OpenAI'])
+        # 列出 engines.py 中注册的所有引擎（Mock 为本地模拟引擎，不联网，用于离线测试）
+        self.engine_combo.addItems(available_engines())
         self.engine_combo.currentTextChanged.connect(self.on_engine_changed)
+        self.engine_combo.currentTextChanged.connect(self.plan_current_file)
         layout.addWidget(self.engine_combo)
 
+        # 备用引擎与请求对冲（见 health.py）
+        h_backup = QHBoxLayout()
+        h_backup.addWidget(QLabel('备用引擎:'))
+        self.secondary_combo = QComboBox()
+        self.secondary_combo.addItem('无')
+        self.secondary_combo.addItems(available_engines())
+        self.secondary_combo.setToolTip('主引擎连续失败时暂停它，期间改用备用引擎翻译')
+        h_backup.addWidget(self.secondary_combo)
+        self.hedge_check = QCheckBox('对冲慢请求')
+        self.hedge_check.setToolTip('一批请求比以往 95% 的批次都慢时再发一份（优先发给备用引擎），先返回的为准；'
+                                    '额外请求不超过 10%')
+        h_backup.addWidget(self.hedge_check)
+        h_backup.addStretch(1)
+        layout.addLayout(h_backup)
+
+        # 并发数（同时在途的翻译请求数）
+        h_conc = QHBoxLayout()
+        h_conc.addWidget(QLabel('并发数:'))
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 32)
+        self.concurrency_spin.setValue(4)
+        self.concurrency_spin.setToolTip('同时发送的翻译请求数，1 为逐个顺序翻译')
+        self.concurrency_spin.valueChanged.connect(self.update_plan_label)
+        h_conc.addWidget(self.concurrency_spin)
+        self.use_cache_check = QCheckBox('使用翻译记忆')
+        self.use_cache_check.setChecked(True)
+        self.use_cache_check.setToolTip('优先复用以往运行中翻译过的相同文本，取消勾选则全部重新请求')
+        h_conc.addWidget(self.use_cache_check)
+        self.incremental_check = QCheckBox('仅重译改动行')
+        self.incremental_check.setToolTip('源文或上下文自上次翻译后有改动的行，即使已有译文也重新翻译')
+        h_conc.addWidget(self.incremental_check)
+        self.retry_failed_check = QCheckBox('仅重试失败项')
+        self.retry_failed_check.setToolTip('只重新翻译上次运行最终失败的 cell，不扫描其他行')
+        h_conc.addWidget(self.retry_failed_check)
+        # 这些选项影响哪些 cell 需要请求，修改后重新规划
+        for check in (self.use_cache_check, self.incremental_check, self.retry_failed_check):
+            check.toggled.connect(self.plan_current_file)
+        h_conc.addStretch(1)
+        layout.addLayout(h_conc)
+
         # Google API Key 区域
         self.api_key_layout = QHBoxLayout()
         self.api_key_label = QLabel('Google API Key JSON:')
@@ -157,6 +357,10 @@ class TranslatorGUI(QWidget):
         self.btn_cancel.clicked.connect(self.request_cancel)
         h2.addWidget(self.btn_cancel)
 
+        self.btn_metrics = QPushButton('运行指标')
+        self.btn_metrics.clicked.connect(self.show_metrics)
+        h2.addWidget(self.btn_metrics)
+
         layout.addLayout(h2)
 
         # Progress area
@@ -171,6 +375,28 @@ class TranslatorGUI(QWidget):
         self.progress_extra = QLabel('')
         layout.addWidget(self.progress_extra)
 
+        # 结果表：翻译过程中实时显示写回的译文，失败的 cell 标红、待翻译的标黄
+        h_results = QHBoxLayout()
+        h_results.addWidget(QLabel('结果:'))
+        self.results_filter = QComboBox()
+        for text, mode in (('全部', FILTER_ALL), ('仅失败', FILTER_FAILED), ('仅待翻译', FILTER_PENDING)):
+            self.results_filter.addItem(text, mode)
+        self.results_filter.currentIndexChanged.connect(self.on_results_filter_changed)
+        h_results.addWidget(self.results_filter)
+        self.results_counts = QLabel('')
+        h_results.addWidget(self.results_counts)
+        h_results.addStretch(1)
+        layout.addLayout(h_results)
+
+        self.results_view = QTableView()
+        # 固定行高、不按内容计算列宽：10 万行的表格也只为可见的行取数据
+        self.results_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.results_view.verticalHeader().setDefaultSectionSize(self.results_view.fontMetrics().height() + 6)
+        self.results_view.horizontalHeader().setDefaultSectionSize(160)
+        self.results_view.setWordWrap(False)
+        self.results_view.setEditTriggers(QTableView.NoEditTriggers)
+        layout.addWidget(self.results_view, 1)
+
         self.setLayout(layout)
 
     def eventFilter(self, obj, event):
@@ -205,78 +431,42 @@ class TranslatorGUI(QWidget):
     # In practice paste your earlier implementations here (they are unchanged). 
     
     def export_json(self):
-        import pandas as pd
-        import json
-        import os
         from PyQt5.QtWidgets import QMessageBox
         if not self.csv_path:
             QMessageBox.warning(self, '提示', '请先选择CSV文件')
             return
-        try:
-            # 尝试按常见编码读取（优先 utf-8）
-            try:
-                df = pd.read_csv(self.csv_path, header=None, encoding='utf-8')
-            except Exception:
-                df = pd.read_csv(self.csv_path, header=None, encoding='utf-8-sig')
-
-            # 第二行（索引=1）为字段名
-            raw_fields = list(df.iloc[1])
-            field_names = []
-            for idx, name in enumerate(raw_fields):
-                name = str(name).strip()
-                if name and name.lower() != 'nan' and not name.startswith('Unnamed'):
-                    field_names.append((idx, name))
-
-            data = []
-            for i in range(2, len(df)):
-                row = df.iloc[i]
-                item = {}
-                for idx, name in field_names:
-                    value = row[idx]
-                    if pd.isna(value):
-                        item[name] = None
-                    else:
-                        item[name] = str(value).strip()
-                if any(v not in [None, ""] for v in item.values()):
-                    data.append(item)
-
-            json_path = os.path.splitext(self.csv_path)[0] + '.json'
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-
-            QMessageBox.information(self, '导出成功', f'已保存为：{json_path}')
-        except Exception as e:
-            QMessageBox.critical(self, '错误', f'导出JSON失败：{e}')
-
+        # 第一行为说明行，第二行为字段名；数据行按块按列处理后写入 JSON，不整表载入内存
+        json_path = os.path.splitext(self.csv_path)[0] + '.json'
+        self.start_convert(ConvertWorker(self.csv_path, json_path, to_json=True,
+                                         compact=self.compact_json_check.isChecked()))
 
     def export_csv(self):
-        import pandas as pd
-        import os
-        from utils import read_json
         from PyQt5.QtWidgets import QMessageBox
         if not self.csv_path or not self.is_json:
             QMessageBox.warning(self, '提示', '请先选择JSON文件')
             return
-        try:
-            data = read_json(self.csv_path)
-            if not data:
-                QMessageBox.warning(self, '提示', 'JSON文件无数据')
-                return
-            df = pd.DataFrame(data)
-            columns = list(df.columns)
-            field_row = columns
-            data_rows = df.values.tolist()
-            # 只写字段名和数据行，不写原csv第一行
-            all_rows = [field_row] + data_rows
-            csv_path = os.path.splitext(self.csv_path)[0] + '.csv'
-            import csv
-            with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
-                writer = csv.writer(f)
-                for row in all_rows:
-                    writer.writerow(row)
-            QMessageBox.information(self, '导出成功', f'已保存为：{csv_path}')
-        except Exception as e:
-            QMessageBox.critical(self, '错误', f'导出CSV失败：{e}')
+        # 只写字段名和数据行，不写原csv第一行；字段名按各行的键首次出现的顺序合并
+        csv_path = os.path.splitext(self.csv_path)[0] + '.csv'
+        self.start_convert(ConvertWorker(self.csv_path, csv_path, to_json=False))
+
+    def start_convert(self, worker):
+        # 转换在线程池中进行，完成前禁用导出按钮，避免重复点击
+        self.btn_export_json.setEnabled(False)
+        self.btn_export_csv.setEnabled(False)
+        self.progress_info.setText('正在导出...')
+        worker.signals.finished.connect(self.handle_convert_finished)
+        self.threadpool.start(worker)
+
+    def handle_convert_finished(self, level, message):
+        self.btn_export_json.setEnabled(True)
+        self.btn_export_csv.setEnabled(True)
+        self.progress_info.setText('')
+        if level == 'info':
+            QMessageBox.information(self, '导出成功', message)
+        elif level == 'warning':
+            QMessageBox.warning(self, '提示', message)
+        else:
+            QMessageBox.critical(self, '错误', message)
 
 
     def select_file(self):
@@ -286,9 +476,63 @@ class TranslatorGUI(QWidget):
         if file_path:
             self.csv_path = file_path
             self.is_json = file_path.lower().endswith('.json')
+            self.is_project = False
             self.label.setText(f'已选择：{file_path}')
             self.btn_export_json.setVisible(not self.is_json)
             self.btn_export_csv.setVisible(self.is_json)
+            self.compact_json_check.setVisible(not self.is_json)
+            self.plan_current_file()
+
+    def select_project(self):
+        from PyQt5.QtWidgets import QFileDialog
+        start_dir = os.path.dirname(self.csv_path) if self.csv_path and os.path.exists(os.path.dirname(self.csv_path)) else ''
+        dir_path = QFileDialog.getExistingDirectory(self, '选择项目目录', start_dir)
+        if dir_path:
+            self.csv_path = dir_path
+            self.is_json = False
+            self.is_project = True
+            self.btn_export_json.setVisible(False)
+            self.btn_export_csv.setVisible(False)
+            self.compact_json_check.setVisible(False)
+            try:
+                from project import resolve_project
+                count = len(resolve_project(dir_path)[1])
+            except Exception as e:
+                count = 0
+                QMessageBox.critical(self, '错误', f'读取项目失败：{e}')
+            self.label.setText(f'已选择项目：{dir_path}（{count}个表格）')
+            self.plan_current_file()
+
+    def plan_current_file(self):
+        # 在后台估算当前文件的工作量；结果回来时若已换了文件或改了选项则丢弃
+        self._plan = None
+        self._plan_generation += 1
+        if not self.csv_path or not os.path.exists(self.csv_path) or self.is_project:
+            # 项目模式的预估见命令行 --project --dry-run
+            self.plan_label.setText('')
+            return
+        self.plan_label.setText('正在预估工作量...')
+        worker = PlanWorker(self._plan_generation, self.csv_path, self.engine_combo.currentText(),
+                            use_cache=self.use_cache_check.isChecked(), incremental=self.incremental_check.isChecked(),
+                            retry_failed=self.retry_failed_check.isChecked())
+        worker.signals.finished.connect(self.handle_plan_finished)
+        self.threadpool.start(worker)
+
+    def handle_plan_finished(self, generation, result):
+        if generation != self._plan_generation:
+            return
+        if isinstance(result, str):
+            self.plan_label.setText(result)
+            return
+        self._plan = result
+        self.update_plan_label()
+
+    def update_plan_label(self, *args):
+        if self._plan is None:
+            return
+        from planner import format_plan
+        self.plan_label.setText(format_plan(self._plan, self.engine_combo.currentText(),
+                                            self.concurrency_spin.value()))
 
     def start_translate(self):
         if not self.csv_path:
@@ -304,76 +548,112 @@ class TranslatorGUI(QWidget):
             # 检查环境变量
             if not os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'):
                 os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = api_path
+        incremental = self.incremental_check.isChecked()
+        if incremental and not self.is_project:
+            # 发送任何请求之前先给出差异报告，确认后再开始
+            try:
+                from translator import preview_source_changes
+                from source_index import format_changes
+                changed = preview_source_changes(self.csv_path)
+            except Exception as e:
+                QMessageBox.critical(self, '错误', f'检查源文改动失败：{e}')
+                return
+            if changed:
+                reply = QMessageBox.question(self, '源文改动', format_changes(changed) + '\n\n是否开始翻译？',
+                                             QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+                if reply != QMessageBox.Yes:
+                    return
         self.btn_translate.setEnabled(False)
         self.btn_cancel.setEnabled(True)
 
-        # reset ETA stats
-        self._progress_samples = []
-        self._progress_time_sum = 0.0
-        self._progress_done_total = 0
-        self._progress_total_tasks = None
-
-        worker = TranslateWorker(self.csv_path, engine, is_json=self.is_json)
+        self._progress_start = time.time()
+        from metrics import get_metrics
+        get_metrics().reset()
+
+        # 项目模式下各表格的列不同，不显示结果表
+        old_model = self.results_model
+        # JSON 整表一块翻译，不会超出窗口，不需要从文件重新读入
+        reload_path = None if self.is_json else self.csv_path
+        self.results_model = None if self.is_project else ResultsModel(self, path=reload_path)
+        self.results_view.setModel(self.results_model)
+        if old_model is not None:
+            old_model.deleteLater()
+        if self.results_model is not None:
+            self.results_model.set_filter(self.results_filter.currentData())
+        self.results_counts.setText('')
+
+        secondary = self.secondary_combo.currentText()
+        worker = TranslateWorker(self.csv_path, engine, is_json=self.is_json,
+                                 concurrency=self.concurrency_spin.value(),
+                                 use_cache=self.use_cache_check.isChecked(),
+                                 incremental=incremental,
+                                 retry_failed=self.retry_failed_check.isChecked(),
+                                 is_project=self.is_project,
+                                 secondary_engine=secondary if secondary != '无' else None,
+                                 hedge_percentile=95.0 if self.hedge_check.isChecked() else None,
+                                 result_callback=self.results_model.feed if self.results_model else None)
         worker.signals.progress.connect(self.handle_progress_signal)
         worker.signals.finished.connect(self.handle_finished_signal)
         self.current_worker = worker
         self.threadpool.start(worker)
 
+    def show_metrics(self):
+        # 非模态窗口，翻译过程中实时刷新
+        if getattr(self, '_metrics_dialog', None) is None:
+            self._metrics_dialog = MetricsDialog(self)
+        self._metrics_dialog.timer.start(1000)
+        self._metrics_dialog.show()
+        self._metrics_dialog.raise_()
+
     def request_cancel(self):
         if self.current_worker:
             self.current_worker.cancel()
-            self.progress_info.setText('已请求取消，等待停止...')
+            # 异步路径下在途请求立即中止，已完成的译文随即写回
+            self.progress_info.setText('已取消，正在保存已完成的译文...')
             self.btn_cancel.setEnabled(False)
 
-    def handle_progress_signal(self, percent, info_text, row_time, done, total):
-        # Update info text
+    def on_results_filter_changed(self, index):
+        if self.results_model is not None:
+            self.results_model.set_filter(self.results_filter.itemData(index))
+
+    def update_results_counts(self):
+        if self.results_model is None:
+            return
+        failed, pending = self.results_model.counts()
+        self.results_counts.setText(f'失败{failed}行，待翻译{pending}行')
+
+    def handle_progress_signal(self, percent, info_text, eta, done, total):
+        # 信号已由进度汇总器限频，这里只更新控件
         if info_text:
             self.progress_info.setText(info_text)
+        self.update_results_counts()
 
-        # Record sample
-        if row_time and row_time > 0:
-            self._progress_samples.append(row_time)
-            if len(self._progress_samples) > self._progress_samples_max:
-                self._progress_samples = self._progress_samples[-self._progress_samples_max:]
-            self._progress_time_sum += row_time
-            self._progress_done_total = max(self._progress_done_total, done)
-
-        # If translator supplied total, use it
-        if total and total > 0:
-            self._progress_total_tasks = total
-
-        # decide avg
-        avg_all = None
-        if self._progress_done_total > 0:
-            avg_all = self._progress_time_sum / max(1, self._progress_done_total)
-        avg_recent = None
-        if len(self._progress_samples) > 0:
-            avg_recent = sum(self._progress_samples) / len(self._progress_samples)
-        chosen_avg = avg_all if (avg_all is not None and self._progress_done_total >= 3) else avg_recent
-
-        # ETA calculation
         if percent >= 100:
-            total_time = self._progress_time_sum
+            total_time = int(time.time() - self._progress_start) if self._progress_start else 0
             if total_time < 60:
-                eta_text = f'已完成，用时{int(total_time)}秒'
+                eta_text = f'已完成，用时{total_time}秒'
             else:
-                eta_text = f'已完成，用时{int(total_time)//60}分{int(total_time)%60}秒'
+                eta_text = f'已完成，用时{total_time//60}分{total_time%60}秒'
+        elif eta < 0:
+            eta_text = '正在预估完成时间...'
         else:
-            if chosen_avg is None or self._progress_total_tasks is None:
-                eta_text = '正在预估完成时间...'
+            eta_sec = int(eta)
+            if eta_sec < 60:
+                eta_text = f'预计剩余{eta_sec}秒'
             else:
-                remain = max(0, int(self._progress_total_tasks) - int(self._progress_done_total))
-                eta_sec = int(chosen_avg * remain)
-                if eta_sec < 60:
-                    eta_text = f'预计剩余{eta_sec}秒'
-                else:
-                    eta_text = f'预计剩余{eta_sec//60}分{eta_sec%60}秒'
+                eta_text = f'预计剩余{eta_sec//60}分{eta_sec%60}秒'
 
         text = f'{percent:.1f}%  {eta_text}'
+        if total:
+            text += f'  ({done}/{total})'
         self.progress_extra.setText(text)
         self.progress.setValue(int(round(percent)))
 
     def handle_finished_signal(self, msg_type, msg):
+        # 先把最后一批改动刷到结果表，再弹出提示
+        if self.results_model is not None:
+            self.results_model.finish()
+            self.update_results_counts()
         if msg_type == 'info':
             QMessageBox.information(self, '完成', msg)
         elif msg_type == 'error':
@@ -381,6 +661,8 @@ class TranslatorGUI(QWidget):
         self.btn_translate.setEnabled(True)
         self.btn_cancel.setEnabled(False)
         self.current_worker = None
+        # 剩余工作量已变化，重新规划
+        self.plan_current_file()
 
 
 def run_app():
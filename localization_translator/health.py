@@ -0,0 +1,248 @@
+"""
+引擎健康状况、故障转移与请求对冲（用于 run_jobs 的异步路径）。
+
+每个引擎一个 EngineHealth（进程内共享，跨文件保留），记录每批请求从发出到返回的耗时和成败：
+- 熔断：最近 HEALTH_WINDOW 批中至少有 HEALTH_MIN_SAMPLES 批、且失败比例不低于 HEALTH_FAILURE_RATIO 时，
+  该引擎暂停 HEALTH_COOLDOWN 秒（连续熔断时加倍，最多 HEALTH_MAX_COOLDOWN）。配置了备用引擎时，暂停期间的批次
+  改发给备用引擎；没有可用的备用引擎时批次原地等待，不发出去白白失败。冷却结束后先放行一批试探，成功即恢复，
+  失败则再次暂停。连续熔断 HEALTH_HOLD_MAX_TRIPS 次仍未恢复时视为引擎不可用，不再等待，批次照常发送并记为失败。
+- 对冲：一批请求超过该引擎整批耗时的第 hedge_percentile 百分位仍未返回时，再发一份给备用引擎（没有则同一引擎
+  再发一次），先返回可用结果的一方获胜，另一方立即取消。整批耗时的样本不足 HEDGE_MIN_SAMPLES 时按引擎估算的
+  耗时的 HEDGE_ESTIMATE_FACTOR 倍；每次运行对冲的批次不超过已发送批次的 HEDGE_MAX_RATIO。
+
+每一项都失败的批次记为失败，部分条目失败不影响健康状况。
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+
+from metrics import METRICS, LatencyHistogram
+
+# 熔断判断的窗口（最近的批次数）、最少样本数和失败比例
+HEALTH_WINDOW = 20
+HEALTH_MIN_SAMPLES = 5
+HEALTH_FAILURE_RATIO = 0.5
+# 熔断后暂停的秒数，连续熔断时加倍
+HEALTH_COOLDOWN = 10.0
+HEALTH_MAX_COOLDOWN = 120.0
+# 没有备用引擎时批次等待熔断结束，最多等过这么多次连续熔断（按上面的冷却时间约 2.5 分钟）
+HEALTH_HOLD_MAX_TRIPS = 4
+# 等待期间检查熔断状态的间隔（秒）
+HEALTH_HOLD_POLL = 0.2
+# 按百分位对冲所需的最少整批耗时样本数，样本不足时对冲延迟 = 估算耗时 × HEDGE_ESTIMATE_FACTOR
+HEDGE_MIN_SAMPLES = 20
+HEDGE_ESTIMATE_FACTOR = 3.0
+# 对冲批次占已发送批次的上限
+HEDGE_MAX_RATIO = 0.1
+
+
+def batch_ok(results):
+    """批次是否可用：至少一项有译文，或全部是空文本"""
+    return any(trans for trans, _ in results) or all(err is None for _, err in results)
+
+
+# 熔断未打开时发出的请求的凭据；试探请求的凭据是各自新建的对象，只有持有者能结束这次试探
+PASS = 'pass'
+
+
+class EngineHealth:
+    def __init__(self, name):
+        self.name = name
+        # 成功批次的整批耗时
+        self.latency = LatencyHistogram()
+        self._outcomes = deque(maxlen=HEALTH_WINDOW)
+        self._lock = threading.Lock()
+        self._open_until = 0.0
+        self._cooldown = HEALTH_COOLDOWN
+        # 当前试探请求的凭据，没有在途的试探时为 None
+        self._probe = None
+        # 自上次成功以来连续熔断的次数
+        self._streak = 0
+        self.trips = 0
+
+    def acquire(self):
+        """
+        发送前调用：熔断中（或已有在途的试探）返回 None，否则返回凭据，请求结束后交给 record / abandon。
+        冷却结束后第一个调用者拿到试探凭据，它的成败决定恢复还是再次熔断
+        """
+        with self._lock:
+            if not self._open_until:
+                return PASS
+            if self._probe is not None or time.monotonic() < self._open_until:
+                return None
+            self._probe = object()
+            return self._probe
+
+    def record(self, token, seconds, ok):
+        """记录一批的耗时和成败；token 为 acquire 的返回值（放弃等待、强行发送的批次为 None）"""
+        with self._lock:
+            self._outcomes.append(ok)
+            if ok:
+                self.latency.add(seconds)
+                self._open_until = 0.0
+                self._cooldown = HEALTH_COOLDOWN
+                self._probe = None
+                self._streak = 0
+                return
+            if token is not None and token is self._probe:
+                self._trip()
+            elif not self._open_until and len(self._outcomes) >= HEALTH_MIN_SAMPLES \
+                    and self._outcomes.count(False) >= HEALTH_FAILURE_RATIO * len(self._outcomes):
+                self._trip()
+
+    def abandon(self, token):
+        """请求被取消（未得出成败）：是试探请求时放弃这次试探，由下一个请求重新试探"""
+        with self._lock:
+            if token is not None and token is self._probe:
+                self._probe = None
+
+    def _trip(self):
+        self.trips += 1
+        self._streak += 1
+        self._open_until = time.monotonic() + self._cooldown
+        self._cooldown = min(HEALTH_MAX_COOLDOWN, self._cooldown * 2)
+        self._outcomes.clear()
+        self._probe = None
+        METRICS.record_error(self.name, 'CircuitOpen')
+
+    def gave_up(self):
+        """连续熔断 HEALTH_HOLD_MAX_TRIPS 次仍未恢复：不再让批次等待"""
+        with self._lock:
+            return self._streak >= HEALTH_HOLD_MAX_TRIPS
+
+    def state(self):
+        with self._lock:
+            if not self._open_until:
+                return 'ok'
+            return 'probing' if self._probe is not None else 'open'
+
+    def hedge_delay(self, percentile):
+        """整批耗时的第 percentile 百分位（秒），样本不足时为 None"""
+        with self._lock:
+            if self.latency.count < HEDGE_MIN_SAMPLES:
+                return None
+            return self.latency.percentile(percentile)
+
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def get_health(name):
+    """引擎 name 的健康状况（进程内共享）"""
+    with _health_lock:
+        health = _health.get(name)
+        if health is None:
+            health = _health[name] = EngineHealth(name)
+        return health
+
+
+def reset_health():
+    with _health_lock:
+        _health.clear()
+
+
+class HedgeBudget:
+    """一次运行的对冲额度：对冲批次不超过已发送批次的 HEDGE_MAX_RATIO（至少允许 1 批）；只在事件循环线程中使用"""
+    def __init__(self):
+        self.sent = 0
+        self.hedged = 0
+
+    def allow(self):
+        if self.hedged < HEDGE_MAX_RATIO * self.sent + 1:
+            self.hedged += 1
+            return True
+        return False
+
+
+async def _attempt(send, engine, token):
+    health = get_health(engine.name)
+    start = time.perf_counter()
+    try:
+        results, calls = await send(engine)
+    except BaseException:
+        health.abandon(token)
+        raise
+    health.record(token, time.perf_counter() - start, batch_ok(results))
+    return results, calls
+
+
+async def _choose(engine, secondary, route):
+    # 返回 (发送的引擎, 凭据, 对冲可用的备用引擎)。主引擎熔断时改发给可用的备用引擎，都不可用时等待
+    health = get_health(engine.name)
+    while True:
+        token = health.acquire()
+        if token is not None:
+            return engine, token, secondary
+        if secondary is not None:
+            token = get_health(secondary.name).acquire()
+            if token is not None:
+                route.update(engine=secondary, failover=True)
+                return secondary, token, None
+        if health.gave_up():
+            return engine, None, secondary
+        await asyncio.sleep(HEALTH_HOLD_POLL)
+
+
+async def send_batch(send, engine, secondary=None, hedge_percentile=None, budget=None, estimate=None):
+    """
+    按健康状况选择引擎并发送一批，需要时对冲。
+    send(engine): 返回协程，结果为 (results, calls)；estimate(engine): 该批的估算耗时（秒）
+    返回 (results, calls, route)，route 为 {'engine': 产生结果的引擎, 'failover': 是否改发给备用引擎,
+    'hedged': 是否发出了对冲请求, 'hedge_won': 是否对冲请求先返回}
+    主引擎熔断且没有可用的备用引擎时先等待（可被取消），见模块说明
+    """
+    route = {'engine': engine, 'failover': False, 'hedged': False, 'hedge_won': False}
+    primary, token, backup = await _choose(engine, secondary, route)
+    if budget is not None:
+        budget.sent += 1
+
+    first = asyncio.ensure_future(_attempt(send, primary, token))
+    tasks = {first: primary}
+    try:
+        delay = None
+        if hedge_percentile is not None and budget is not None:
+            delay = get_health(primary.name).hedge_delay(hedge_percentile)
+            if delay is None and estimate is not None:
+                # 估算不出耗时（如模拟引擎的延迟为 0）时等样本足够后再对冲
+                delay = estimate(primary) * HEDGE_ESTIMATE_FACTOR or None
+        if delay is not None:
+            await asyncio.wait({first}, timeout=delay)
+        hedge_engine, hedge_token = None, None
+        if not first.done() and delay is not None:
+            # 对冲优先发给备用引擎，其次同一引擎；都在熔断中时不对冲
+            for candidate in (backup, primary):
+                if candidate is not None:
+                    hedge_token = get_health(candidate.name).acquire()
+                    if hedge_token is not None:
+                        hedge_engine = candidate
+                        break
+            if hedge_engine is not None and not budget.allow():
+                get_health(hedge_engine.name).abandon(hedge_token)
+                hedge_engine = None
+        if hedge_engine is None:
+            results, calls = await first
+            return results, calls, route
+
+        # 超过对冲延迟仍未返回：再发一份，先返回可用结果的一方获胜
+        second = asyncio.ensure_future(_attempt(send, hedge_engine, hedge_token))
+        tasks[second] = hedge_engine
+        route['hedged'] = True
+        pending = {first, second}
+        calls = 0
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            outcomes = [(task,) + task.result() for task in done]
+            calls += sum(c for _, _, c in outcomes)
+            winner = next((o for o in outcomes if batch_ok(o[1])), None)
+            if winner is None and not pending:
+                winner = outcomes[-1]
+            if winner is not None:
+                # 被取消的一方按一次请求计
+                route.update(engine=tasks[winner[0]], hedge_won=winner[0] is second)
+                return winner[1], calls + len(pending), route
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
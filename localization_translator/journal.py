@@ -0,0 +1,77 @@
+"""
+翻译日志（write-ahead journal）：边翻译边把已完成的 cell 追加写入磁盘。
+
+进程崩溃、被杀或断网后重新运行时，translate_json 先回放日志，已完成的 cell 不再重新请求。
+表格成功写回后日志即被删除。每条记录是一行 JSON：{"i": 行号, "l": 语言列, "s": 源文哈希, "t": 译文}
+"""
+import hashlib
+import json
+import os
+
+
+def source_hash(text):
+    return hashlib.sha1((text or '').encode('utf-8')).hexdigest()[:16]
+
+
+def default_journal_path(filepath):
+    return filepath + '.journal'
+
+
+class Journal:
+    def __init__(self, path):
+        self.path = path
+        self._f = None
+        self._by_row = None
+
+    def replay(self):
+        """读出所有完整的记录；最后一行可能因崩溃只写了一半，直接忽略"""
+        entries = []
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and {'i', 'l', 's', 't'} <= entry.keys():
+                    entries.append(entry)
+        return entries
+
+    def replay_rows(self, start, end):
+        """返回行号在 [start, end) 内的记录；首次调用时读一遍日志并按行号建索引，分块处理时不重复读文件"""
+        if self._by_row is None:
+            self._by_row = {}
+            for entry in self.replay():
+                if isinstance(entry['i'], int):
+                    self._by_row.setdefault(entry['i'], []).append(entry)
+        if end - start < len(self._by_row):
+            return [e for i in range(start, end) for e in self._by_row.get(i, ())]
+        return [e for i, entries in self._by_row.items() if start <= i < end for e in entries]
+
+    def append(self, records):
+        """追加 [(行号, 语言列, 源文, 译文)] 并刷到磁盘"""
+        if not records:
+            return
+        if self._f is None:
+            self._f = open(self.path, 'a', encoding='utf-8')
+        for i, lang, src_text, trans in records:
+            self._f.write(json.dumps({'i': i, 'l': lang, 's': source_hash(src_text), 't': trans},
+                                     ensure_ascii=False) + '\n')
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
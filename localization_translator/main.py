@@ -1,4 +1,9 @@
-from gui import run_app
+import sys
 
 if __name__ == '__main__':
+    # 带参数时走命令行模式（见 cli.py），否则启动 GUI
+    if len(sys.argv) > 1:
+        from cli import main
+        sys.exit(main())
+    from gui import run_app
     run_app()
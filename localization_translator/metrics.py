@@ -0,0 +1,197 @@
+"""
+运行指标：按引擎统计请求延迟直方图（p50/p95/p99）、请求数、发送的字符数/token 数、翻译记忆命中、重试与限流次数、
+按类型分类的错误数，以及各阶段（解析、规划、查缓存、翻译、写回）耗时。
+
+进程内共用一个收集器 METRICS：限速器在每次请求后记录，translate_json / translate_csv 记录阶段耗时和缓存命中。
+运行开始前 reset()，运行中可随时 snapshot()（GUI 的指标窗口每秒刷新一次），结束后 dump() 成 JSON。
+profiled() 可用 cProfile 分析翻译循环：调用线程，以及（异步路径下）aio.py 常驻事件循环所在的线程；
+线程池中同步调用的引擎（如 Google）不计入。
+"""
+import cProfile
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from utils import open_atomic
+
+# 延迟直方图：第 k 个桶的上界为 HIST_BASE_MS * HIST_FACTOR ** k 毫秒，相对误差约 10%
+HIST_BASE_MS = 1.0
+HIST_FACTOR = 1.1
+
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图，内存与请求数无关"""
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        ms = seconds * 1000.0
+        k = 0 if ms <= HIST_BASE_MS else int(math.ceil(math.log(ms / HIST_BASE_MS, HIST_FACTOR)))
+        self.buckets[k] = self.buckets.get(k, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """第 q（0-100）百分位的延迟（秒），取所在桶的上界，不超过最大值"""
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(self.count * q / 100.0)))
+        seen = 0
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if seen >= rank:
+                return min(self.max, HIST_BASE_MS * HIST_FACTOR ** k / 1000.0)
+        return self.max
+
+    def summary(self):
+        def ms(v):
+            return round(v * 1000.0, 1) if v is not None else None
+        return {'count': self.count, 'mean_ms': ms(self.total / self.count) if self.count else None,
+                'p50_ms': ms(self.percentile(50)), 'p95_ms': ms(self.percentile(95)),
+                'p99_ms': ms(self.percentile(99)), 'max_ms': ms(self.max) if self.count else None}
+
+
+def _new_engine_metrics():
+    return {'latency': LatencyHistogram(), 'calls': 0, 'chars': 0, 'units': 0, 'errors': {},
+            'retries': 0, 'throttled': 0, 'cache_hits': 0, 'cache_misses': 0}
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.engines = {}
+            self.phases = {}
+
+    def _engine(self, engine):
+        metrics = self.engines.get(engine)
+        if metrics is None:
+            metrics = self.engines[engine] = _new_engine_metrics()
+        return metrics
+
+    def record_request(self, engine, seconds, chars=0, units=0, error=None):
+        """一次实际发出的 API 请求：耗时、字符数、配额单位数（字符或 token）；error 为失败时的错误类型名"""
+        with self._lock:
+            m = self._engine(engine)
+            m['latency'].add(seconds)
+            m['calls'] += 1
+            m['chars'] += chars
+            m['units'] += units
+            if error:
+                m['errors'][error] = m['errors'].get(error, 0) + 1
+
+    def record_error(self, engine, error):
+        """请求本身成功、但结果不可用的错误（如返回的 JSON 解析失败、条目缺失）"""
+        with self._lock:
+            errors = self._engine(engine)['errors']
+            errors[error] = errors.get(error, 0) + 1
+
+    def record_retry(self, engine, throttled=False):
+        with self._lock:
+            m = self._engine(engine)
+            m['retries'] += 1
+            if throttled:
+                m['throttled'] += 1
+
+    def record_cache(self, engine, hits, misses):
+        with self._lock:
+            m = self._engine(engine)
+            m['cache_hits'] += hits
+            m['cache_misses'] += misses
+
+    def add_phase(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        """当前指标的可 JSON 序列化副本"""
+        with self._lock:
+            elapsed = time.time() - self.started
+            engines = {}
+            for name, m in self.engines.items():
+                entry = {k: v for k, v in m.items() if k not in ('latency', 'errors')}
+                entry['errors'] = dict(m['errors'])
+                entry['latency'] = m['latency'].summary()
+                entry['chars_per_s'] = round(m['chars'] / elapsed, 1) if elapsed > 0 else None
+                engines[name] = entry
+            return {'elapsed': round(elapsed, 3), 'engines': engines,
+                    'phases': {k: round(v, 3) for k, v in self.phases.items()}}
+
+    def dump(self, path):
+        with open_atomic(path, encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+
+# 进程内共用的收集器
+METRICS = Metrics()
+
+
+def get_metrics():
+    return METRICS
+
+
+def format_metrics(snapshot):
+    """把 snapshot() 的结果整理成给人看的多行文本"""
+    lines = [f'运行 {snapshot["elapsed"]:.1f} 秒']
+    for name, m in snapshot['engines'].items():
+        lat = m['latency']
+        lines.append(f'[{name}] 请求 {m["calls"]} 次，字符 {m["chars"]}（{m["chars_per_s"] or 0}/秒），配额单位 {m["units"]}')
+        if lat['count']:
+            lines.append(f'  延迟 p50 {lat["p50_ms"]}ms / p95 {lat["p95_ms"]}ms / p99 {lat["p99_ms"]}ms / 最大 {lat["max_ms"]}ms')
+        lines.append(f'  翻译记忆命中 {m["cache_hits"]}，未命中 {m["cache_misses"]}；重试 {m["retries"]}，被限流 {m["throttled"]}')
+        if m['errors']:
+            lines.append('  错误：' + '，'.join(f'{k} {v}' for k, v in sorted(m['errors'].items(), key=lambda kv: -kv[1])))
+    if snapshot['phases']:
+        lines.append('阶段耗时：' + '，'.join(f'{k} {v:.2f}s' for k, v in snapshot['phases'].items()))
+    return '\n'.join(lines)
+
+
+@contextmanager
+def profiled(path, event_loop=False):
+    """
+    path 不为空时用 cProfile 分析 with 块内的代码，结束后把统计写到 path（可用 pstats / snakeviz 查看）。
+    event_loop 为真时同时分析 aio.py 的常驻事件循环线程（异步路径的请求、解析和对冲都在那里执行），两边的统计合并写出
+    """
+    if not path:
+        yield
+        return
+    import pstats
+    profiler = cProfile.Profile()
+    loop_profiler = None
+    if event_loop:
+        # cProfile 只分析调用 enable 的线程，所以要在事件循环线程中开启和关闭
+        import aio
+        loop_profiler = cProfile.Profile()
+        aio.run(_call(loop_profiler.enable))
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        stats = pstats.Stats(profiler)
+        if loop_profiler is not None:
+            aio.run(_call(loop_profiler.disable))
+            stats.add(loop_profiler)
+        stats.dump_stats(path)
+
+
+async def _call(fn):
+    fn()
@@ -0,0 +1,61 @@
+"""
+占位符归一化：翻译前把源文中的数字、格式占位符（{0} / {name} / %s / %1$d）、富文本标签
+（<color=#FF0000>、</b>、[b]）和转义序列（\\n）依次换成 {0}、{1}…，翻译后再按各 cell 自己的原文还原。
+
+    masked, tokens = mask('获得<color=red>100</color>金币')   # '获得{0}{1}{2}金币', ('<color=red>', '100', '</color>')
+    unmask('Got {0}{1}{2} gold', tokens)                      # 'Got <color=red>100</color> gold'
+
+这样“获得{0}金币”和“获得100金币”、只差颜色标签的两句归一化后是同一条，去重、翻译记忆都按归一化后的文本，
+只请求一次；占位符也不会被翻译引擎改写。check_markers 检查译文是否原样保留了全部 {n}，不符的译文按失败处理。
+"""
+import re
+
+# 参与归一化的片段，按先后顺序匹配
+_TOKEN_RE = re.compile(
+    r'</?[A-Za-z][^<>\n]{0,80}>'                                          # 富文本标签 <color=#FF0000> </b> <sprite=1>
+    r'|\[/?(?:b|i|u|s|color|size|url|sup|sub)(?:=[^\[\]\n]{0,40})?\]'      # BBCode [b] [color=red]
+    r'|\{[^{}\n]{0,40}\}'                                                 # {0} {name} {0:N2}
+    r'|%(?:\d+\$)?[-+ #0]*\d*(?:\.\d+)?[sdifuxXeEgGc@]'                   # printf 风格 %s %d %.2f %1$s
+    r'|\\[nrt]'                                                           # 文本中的转义序列 \n
+    r'|\d+(?:[.,]\d+)*'                                                   # 数字 100 / 3.5 / 1,000
+)
+# 归一化后的占位符
+_MARKER_RE = re.compile(r'\{(\d+)\}')
+
+
+def mask(text):
+    """返回 (归一化后的文本, 被替换的原片段元组)；没有可替换的片段时原样返回 (text, ())"""
+    tokens = []
+
+    def repl(m):
+        tokens.append(m.group(0))
+        return '{%d}' % (len(tokens) - 1)
+
+    masked = _TOKEN_RE.sub(repl, text)
+    return masked, tuple(tokens)
+
+
+def unmask(text, tokens):
+    """把 text 中的 {n} 换回 tokens[n]；tokens 为空或编号越界的原样保留"""
+    if not tokens:
+        return text
+
+    def repl(m):
+        n = int(m.group(1))
+        return tokens[n] if n < len(tokens) else m.group(0)
+
+    return _MARKER_RE.sub(repl, text)
+
+
+def check_markers(source, translation):
+    """译文中的 {n} 与源文是否一一对应（顺序可以不同）；不对应时返回错误信息，否则返回 None"""
+    if '{' not in source and '{' not in translation:
+        return None
+    expected = sorted(_MARKER_RE.findall(source))
+    actual = sorted(_MARKER_RE.findall(translation))
+    if expected == actual:
+        return None
+    missing = sorted(set(expected) - set(actual), key=int)
+    if missing:
+        return '译文缺少占位符 ' + ' '.join('{%s}' % n for n in missing)
+    return '译文中的占位符与原文不一致'
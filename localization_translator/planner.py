@@ -0,0 +1,287 @@
+"""
+试运行规划：不发送任何请求，扫描表格估算一次翻译要消耗的请求数、字符数、token 数、费用和耗时。
+
+与 translate_json 使用同一套规则：detect_columns 识别列、回放翻译日志、增量模式对比源文索引、
+只重试失败项模式读取失败清单、plan_jobs 归一化占位符并去重、查翻译记忆（只读，不刷新最近使用时间），
+长文本拆成段后逐段再查一次（见 segment.py）。只估算选定的引擎，不拼请求：由待请求的条数和总大小按引擎声明的
+批次上限算出请求数，再由引擎的 estimate_requests / estimate_latency / estimate_cost 估算计费单位、耗时和费用。
+CSV 与 translate_csv 一样按块处理，去重也只在块内进行。每块每个语言的任务超过 PLAN_SAMPLE_JOBS 个时只等间隔
+抽样查翻译记忆、拆段和计算大小，再按比例放大（plan['sampled'] 为真）；待翻译数和去重后的条数始终是精确值。
+
+    plan = plan_file('多语言表.csv', 'Google', concurrency=4)
+    print(format_plan(plan, 'Google'))
+"""
+import math
+import os
+import time
+from collections import Counter
+from itertools import chain
+from operator import itemgetter
+
+from engines import get_engine
+from failures import FailureLog, default_failures_path
+from journal import Journal, default_journal_path
+from metrics import METRICS
+from segment import SEGMENT_MIN_CHARS, split, renumber
+from source_index import SourceIndex, default_index_path, detect_key_column
+from table import table_fields
+from translator import detect_columns, plan_jobs, _replay_journal, CSV_CHUNK_ROWS
+from utils import read_json_table, LocalizationCsvReader
+
+# 本次会话中某引擎已有至少这么多次请求的实测延迟时，用实测平均值代替引擎声明的 typical_latency
+OBSERVED_LATENCY_MIN_CALLS = 5
+# 每块每个目标语言最多抽样这么多个任务查翻译记忆、拆段和计算大小，超过时按比例放大
+PLAN_SAMPLE_JOBS = 1000
+
+
+def _new_engine_plan(engine):
+    return {'engine': engine.name, 'size_unit': engine.size_unit, 'pending': 0, 'unique': 0, 'cache_hits': 0,
+            'requested': 0, 'by_lang': {}, 'calls': 0, 'chars': 0, 'input_units': 0, 'output_units': 0,
+            'cost': 0.0 if engine.estimate_cost(0, 0) is not None else None, 'serial_s': 0.0}
+
+
+def new_plan():
+    return {'rows': 0, 'cells': 0, 'langs': [], 'pending': 0, 'pending_by_lang': {}, 'resumed': 0,
+            'changed_rows': 0, 'sampled': False, 'engines': {}}
+
+
+def _observed_latency(engine):
+    m = METRICS.snapshot()['engines'].get(engine.name)
+    if m and m['latency']['count'] >= OBSERVED_LATENCY_MIN_CALLS:
+        return m['latency']['mean_ms'] / 1000.0
+    return None
+
+
+def plan_table(data, engine, use_cache=True, cache_path=None, incremental=False, source_index=None,
+               journal=None, failures=None, retry_failed=False, row_offset=0, plan=None, normalize=True,
+               segment=True):
+    """
+    估算用 engine（引擎名或 Engine 对象）翻译 data（table.Table 或 list[dict]）的工作量，结果累加到 plan
+    （None 则新建）并返回。
+    source_index / journal / failures / normalize / segment: 与 translate_json 的同名参数相同，只读取不修改
+    注意：会把翻译日志中可恢复的译文写进 data（与 translate_json 一致），调用方应传入自己读入的副本
+    """
+    plan = new_plan() if plan is None else plan
+    engine = get_engine(engine)
+    total = len(data)
+    keys = table_fields(data)
+    source_col, context_col, _, lang_cols = detect_columns(keys)
+    plan['rows'] += total
+    if not total or not lang_cols:
+        return plan
+    plan['cells'] += total * len(lang_cols)
+    for lang in lang_cols:
+        if lang not in plan['langs']:
+            plan['langs'].append(lang)
+
+    stale = set()
+    if source_index is not None:
+        changed, _ = source_index.diff(data, source_col, context_col, detect_key_column(keys), row_offset)
+        stale = {i for i, _, _, _ in changed}
+        plan['changed_rows'] += len(stale)
+    force = {i: set(lang_cols) for i in stale} if incremental else {}
+    if journal is not None:
+        plan['resumed'] += _replay_journal(data, journal, row_offset, source_col, lang_cols, force)
+    only = None
+    if retry_failed:
+        only = {}
+        if failures is not None:
+            only = failures.rows(row_offset, row_offset + total, lambda i: str(data[i].get(source_col, '') or ''))
+
+    jobs, pending_count = plan_jobs(data, engine, source_col, context_col, lang_cols, force, only, normalize)
+    plan['pending'] += pending_count
+    by_lang = Counter(map(itemgetter(1), chain.from_iterable(job[2] for target_jobs in jobs.values()
+                                                             for job in target_jobs)))
+    for lang, count in by_lang.items():
+        plan['pending_by_lang'][lang] = plan['pending_by_lang'].get(lang, 0) + count
+    entry = plan['engines'].setdefault(engine.name, _new_engine_plan(engine))
+    entry['pending'] += pending_count
+
+    tm = None
+    if use_cache:
+        from translation_memory import TranslationMemory, DEFAULT_TM_PATH
+        tm_path = cache_path or os.environ.get('TRANSFUSE_TM_PATH') or DEFAULT_TM_PATH
+        # 还没有翻译记忆数据库时不创建
+        if os.path.exists(tm_path):
+            tm = TranslationMemory(tm_path)
+    try:
+        for target_code, target_jobs in jobs.items():
+            if _estimate_target(entry, engine, target_code, target_jobs, tm, segment):
+                plan['sampled'] = True
+    finally:
+        if tm is not None:
+            tm.close()
+    return plan
+
+
+def _estimate_target(entry, engine, target_code, target_jobs, tm, segment=True):
+    """估算一个目标语言的任务，累加到 entry；返回是否抽样"""
+    if not target_jobs:
+        return False
+    entry['unique'] += len(target_jobs)
+    step = -(-len(target_jobs) // PLAN_SAMPLE_JOBS)
+    sample = target_jobs[::step]
+    # 条数、大小按任务数放大，cell 数按 cell 数放大
+    scale = len(target_jobs) / len(sample)
+    cell_scale = sum(len(job[2]) for job in target_jobs) / sum(len(job[2]) for job in sample) if step > 1 else 1
+
+    if tm is not None:
+        cached = tm.get_many(engine.name, [(job[0], target_code, job[1]) for job in sample], touch=False)
+    else:
+        cached = [None] * len(sample)
+    hits = 0
+    # 未命中的任务：长文本与 run_jobs 一样拆成段（各段重新编号占位符），短文本整条发送
+    missed = []
+    for job, trans in zip(sample, cached):
+        if trans:
+            hits += len(job[2])
+            continue
+        pieces = None
+        if segment and len(job[0]) > SEGMENT_MIN_CHARS:
+            segs, _ = split(job[0])
+            if len(segs) > 1:
+                pieces = [renumber(seg)[0] for seg in segs]
+        missed.append((job, pieces))
+    seg_hits = set()
+    if tm is not None:
+        seg_keys = list({(text, target_code, job[1]) for job, pieces in missed if pieces for text in pieces})
+        if seg_keys:
+            cached = tm.get_many(engine.name, seg_keys, touch=False)
+            seg_hits = {(text, context) for (text, _, context), trans in zip(seg_keys, cached) if trans}
+
+    by_lang = Counter()
+    items = size = text_size = chars = 0
+    # 同一段在多个任务中出现、或与短任务同文时只发送一次
+    sent = set()
+    for job, pieces in missed:
+        if pieces is not None:
+            pieces = [text for text in pieces if (text, job[1]) not in seg_hits]
+            if not pieces:
+                # 各段都已在翻译记忆中，按命中计
+                hits += len(job[2])
+                continue
+        by_lang.update(map(itemgetter(1), job[2]))
+        for text in pieces or (job[0],):
+            if (text, job[1]) in sent:
+                continue
+            sent.add((text, job[1]))
+            items += 1
+            size += engine.size_of(text, job[1])
+            text_size += engine.size_of(text)
+            chars += len(text)
+
+    entry['cache_hits'] += round(hits * cell_scale)
+    for lang, count in by_lang.items():
+        count = round(count * cell_scale)
+        entry['requested'] += count
+        entry['by_lang'][lang] = entry['by_lang'].get(lang, 0) + count
+    if not items:
+        return step > 1
+    items, size, text_size = items * scale, size * scale, text_size * scale
+    # 按大小切批时每批平均空出约半条的大小（放不下的一条留给下一批）
+    capacity = max(engine.max_batch_size - size / items / 2, 1)
+    calls = max(math.ceil(items / engine.max_batch_items), math.ceil(size / capacity), 1)
+    input_units, output_units = engine.estimate_requests(calls, items, size, text_size, target_code)
+    input_units, output_units = round(input_units), round(output_units)
+    entry['calls'] += calls
+    entry['chars'] += round(chars * scale)
+    entry['input_units'] += input_units
+    entry['output_units'] += output_units
+    if entry['cost'] is not None:
+        entry['cost'] += engine.estimate_cost(input_units, output_units)
+    observed = _observed_latency(engine)
+    if observed is None:
+        observed = engine.estimate_latency(input_units / calls, output_units / calls)
+    entry['serial_s'] += calls * observed
+    return step > 1
+
+
+def estimate_wall_time(entry, concurrency=None):
+    """
+    按并发数估算一个引擎的翻译耗时（秒）：请求总耗时除以并发数，且不少于引擎配额（每秒请求数、
+    每分钟字符/token 数）允许的最短时间。不计失败重试和限流退避
+    """
+    engine = get_engine(entry['engine'])
+    concurrency = max(1, int(concurrency or engine.default_concurrency))
+    wall = entry['serial_s'] / concurrency
+    limits = engine.rate_limits
+    rps = limits.get('requests_per_second') or (limits.get('requests_per_minute') or 0) / 60.0
+    if rps:
+        wall = max(wall, entry['calls'] / rps)
+    upm = limits.get('chars_per_minute') or limits.get('tokens_per_minute')
+    if upm:
+        units = entry['input_units'] + (entry['output_units'] if engine.size_unit == 'tokens' else 0)
+        wall = max(wall, units / upm * 60.0)
+    return wall
+
+
+def plan_file(filepath, engine, concurrency=None, use_cache=True, cache_path=None, incremental=False,
+              retry_failed=False, chunk_rows=CSV_CHUNK_ROWS, normalize=True, segment=True):
+    """
+    估算用 engine 翻译 filepath（CSV 或 JSON）的工作量，不修改任何文件。返回的 dict：
+      rows / cells / langs / pending（待翻译 cell 数）/ pending_by_lang / resumed（可从翻译日志恢复）/
+      changed_rows（源文有改动的行）/ sampled（是否抽样估算）/ elapsed（规划耗时）/ engines：
+        {引擎名: {pending, unique（去重后）, cache_hits, requested（仍需请求的 cell 数）, by_lang, calls, chars,
+                  size_unit, input_units, output_units, cost（美元，价格未知为 None）, serial_s, wall_s}}
+    concurrency: 估算 wall_s 用的并发数，None 按引擎的 default_concurrency
+    """
+    start = time.time()
+    source_index = SourceIndex(default_index_path(filepath))
+    journal = Journal(default_journal_path(filepath))
+    failures = FailureLog(default_failures_path(filepath)) if retry_failed else None
+    options = dict(engine=engine, use_cache=use_cache, cache_path=cache_path, incremental=incremental,
+                   source_index=source_index, journal=journal, failures=failures, retry_failed=retry_failed,
+                   normalize=normalize, segment=segment)
+    plan = new_plan()
+    if filepath.lower().endswith('.json'):
+        plan_table(read_json_table(filepath), plan=plan, **options)
+    else:
+        with LocalizationCsvReader(filepath) as reader:
+            row_offset = 0
+            for chunk in reader.iter_tables(chunk_rows):
+                plan_table(chunk, row_offset=row_offset, plan=plan, **options)
+                row_offset += len(chunk)
+    for entry in plan['engines'].values():
+        entry['wall_s'] = estimate_wall_time(entry, concurrency)
+    plan['elapsed'] = time.time() - start
+    return plan
+
+
+def _format_seconds(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f'{seconds}秒'
+    if seconds < 3600:
+        return f'{seconds // 60}分{seconds % 60}秒'
+    return f'{seconds // 3600}小时{seconds % 3600 // 60}分'
+
+
+def format_plan(plan, engine=None, concurrency=None):
+    """
+    把 plan_file 的结果整理成给人看的多行文本。engine 不为空时详细列出该引擎，其余引擎（合并的多份规划）各一行；
+    concurrency 不为空时按该并发数重新估算耗时
+    """
+    if not plan['cells']:
+        return '没有需要翻译的语言列'
+    lines = [f'共{plan["rows"]}行 × {len(plan["langs"])}语种 = {plan["cells"]}项，待翻译{plan["pending"]}项']
+    if plan['resumed']:
+        lines[0] += f'（可从中断处恢复{plan["resumed"]}项）'
+    if plan['changed_rows']:
+        lines[0] += f'（源文改动{plan["changed_rows"]}行）'
+    if plan['pending_by_lang']:
+        lines.append('按语种：' + '，'.join(f'{lang} {plan["pending_by_lang"].get(lang, 0)}'
+                                          for lang in plan['langs']))
+    for name, entry in plan['engines'].items():
+        wall = estimate_wall_time(entry, concurrency) if concurrency else entry.get('wall_s', 0.0)
+        unit = '字符' if entry['size_unit'] == 'chars' else 'token'
+        cost = f'约${entry["cost"]:.2f}' if entry['cost'] is not None else '费用未知'
+        if engine is not None and name != engine:
+            lines.append(f'[{name}] {entry["calls"]}次请求，{cost}，约{_format_seconds(wall)}')
+            continue
+        lines.append(f'[{name}] 去重后{entry["unique"]}条，翻译记忆命中{entry["cache_hits"]}项，'
+                     f'需请求{entry["requested"]}项 / {entry["calls"]}次请求')
+        lines.append(f'  发送{entry["chars"]}字符，输入约{entry["input_units"]}{unit}，'
+                     f'输出约{entry["output_units"]}{unit}，{cost}，预计耗时{_format_seconds(wall)}')
+    if plan['sampled']:
+        lines.append('（任务较多，翻译记忆命中数、请求数和费用为抽样估算）')
+    return '\n'.join(lines)
@@ -0,0 +1,147 @@
+"""
+进度汇总：翻译循环只累加计数，按固定间隔（默认 0.1 秒，即 10 Hz）向 progress_callback 发出一次累计快照。
+
+回调次数与翻译速度无关，GUI 事件循环不会被每个 cell 的回调淹没；进度文字也只在真正发出时才格式化。
+剩余时间按已完成的 cell 数和已发送的字符数两种速率分别估算后取平均（最近 ETA_WINDOW 秒的滑动窗口）。
+"""
+import threading
+import time
+from collections import deque
+
+# 默认发出间隔（秒）
+PROGRESS_INTERVAL = 0.1
+# 估算速率用的滑动窗口（秒）
+ETA_WINDOW = 10.0
+
+
+def _accepts_eta(callback):
+    # 旧的回调只接受 (percent, info, row_time, done, total)，不传 eta
+    import inspect
+    try:
+        params = inspect.signature(callback).parameters.values()
+    except (TypeError, ValueError):
+        return False
+    return any(p.name == 'eta' or p.kind == p.VAR_KEYWORD for p in params)
+
+
+class ProgressAggregator:
+    """
+    callback: progress_callback(percent, info, row_time, done, total, eta=None)；eta 为预计剩余秒数，
+              未知时为 None（回调不接受 eta 参数时不传）。row_time 固定为 None，保留位置兼容旧回调
+    total: 整张表的 cell 数（行数 × 语言列数）
+    interval: 两次发出之间的最小间隔（秒）
+
+    translate_json 在规划后调用 plan()，每写回一批调用 advance()；阶段性提示（准备、重试、取消）用 message()
+    立即发出；整表结束时 finish()。分块处理的 CSV 所有块共用一个实例，进度和 ETA 都按整表计算。
+    """
+    def __init__(self, callback, total=0, interval=PROGRESS_INTERVAL):
+        self.callback = callback
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        # 已规划部分中需要请求的 cell 数 / 字符数，以及其中已完成的
+        self.planned = 0
+        self.pending = 0
+        self.pending_chars = 0
+        self.pending_done = 0
+        self.chars_done = 0
+        self._info = None
+        self._last_emit = 0.0
+        self._samples = deque()
+        self._lock = threading.Lock()
+        self._with_eta = _accepts_eta(callback)
+
+    def plan(self, cells, pending, chars):
+        """
+        登记一批规划好的 cell：cells 为这部分的 cell 总数，pending 为其中需要请求的数量，chars 为要发送的字符数。
+        不需要请求的（已有译文、日志恢复、翻译记忆命中）直接计为完成
+        """
+        with self._lock:
+            self.planned += cells
+            self.pending += pending
+            self.pending_chars += chars
+            self.done += cells - pending
+            self._sample(time.monotonic())
+
+    def advance(self, cells, chars=0, info=None):
+        """完成 cells 个需要请求的 cell，发送了 chars 个字符；info 为进度文字或返回文字的无参函数（发出时才调用）"""
+        with self._lock:
+            self.done += cells
+            self.pending_done += cells
+            self.chars_done += chars
+            if info is not None:
+                self._info = info
+            now = time.monotonic()
+            if now - self._last_emit < self.interval:
+                return
+            self._last_emit = now
+            self._sample(now)
+            snapshot = self._snapshot(now)
+        self._emit(*snapshot)
+
+    def message(self, info):
+        """立即发出一条阶段性提示"""
+        with self._lock:
+            now = time.monotonic()
+            self._last_emit = now
+            self._info = None
+            snapshot = self._snapshot(now)
+        self._emit(snapshot[0], info, snapshot[2])
+
+    def finish(self, info='翻译已完成（或已取消）'):
+        with self._lock:
+            self._info = None
+        self._emit(100.0, info, 0.0)
+
+    @property
+    def percent(self):
+        return (self.done / self.total) * 100.0 if self.total else 0.0
+
+    def _sample(self, now):
+        self._samples.append((now, self.pending_done, self.chars_done))
+        while len(self._samples) > 2 and now - self._samples[0][0] > ETA_WINDOW:
+            self._samples.popleft()
+
+    def _snapshot(self, now):
+        info = self._info
+        return min(self.percent, 100.0), info, self._eta(now)
+
+    def _eta(self, now):
+        if len(self._samples) < 2:
+            return None
+        t0, cells0, chars0 = self._samples[0]
+        elapsed = now - t0
+        if elapsed <= 0:
+            return None
+        # 尚未规划的部分（后面的 CSV 块）按已规划部分的比例估算要请求的 cell 和字符
+        unplanned = max(0, self.total - self.planned)
+        ratio = self.pending / self.planned if self.planned else 1.0
+        per_cell = self.pending_chars / self.pending if self.pending else 0.0
+        remain_cells = max(0, self.pending - self.pending_done) + unplanned * ratio
+        remain_chars = max(0, self.pending_chars - self.chars_done) + unplanned * ratio * per_cell
+        estimates = []
+        cell_rate = (self.pending_done - cells0) / elapsed
+        if cell_rate > 0:
+            estimates.append(remain_cells / cell_rate)
+        char_rate = (self.chars_done - chars0) / elapsed
+        if char_rate > 0 and per_cell > 0:
+            estimates.append(remain_chars / char_rate)
+        if not estimates:
+            return None
+        return sum(estimates) / len(estimates)
+
+    def _emit(self, percent, info, eta):
+        if not self.callback:
+            return
+        if callable(info):
+            try:
+                info = info()
+            except Exception:
+                info = None
+        try:
+            if self._with_eta:
+                self.callback(percent, info, None, self.done, self.total, eta=eta)
+            else:
+                self.callback(percent, info, None, self.done, self.total)
+        except Exception:
+            pass
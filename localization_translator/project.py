@@ -0,0 +1,312 @@
+"""
+多表项目模式：一次翻译一个目录（或项目清单中列出的）所有本地化表格。
+
+所有表格的待翻译 cell 合并成一个全局任务集，按 (源文, 目标语言代码, 上下文) 跨文件去重，
+同一字符串在多个表格中出现也只请求一次，译文再分发回各个文件。每个文件仍各自使用
+表格旁的翻译日志、源文索引和失败清单，与单表翻译（translate_json / translate_csv）完全兼容。
+
+自上次成功运行后内容没有变化、也没有遗留日志或失败清单的文件按内容哈希跳过，不读入；
+各文件的哈希、读入和写回彼此独立，在线程池中并行。哈希记录在项目目录下的 PROJECT_STATE_NAME。
+
+项目清单是一个以 MANIFEST_SUFFIX 结尾的 JSON 文件：{"tables": ["ui/*.csv", "quest.json", ...]}，
+路径相对清单所在目录，可用通配符。
+"""
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from engines import get_engine
+from failures import FailureLog, default_failures_path
+from journal import Journal, default_journal_path
+from metrics import METRICS
+from progress import ProgressAggregator
+from source_index import SourceIndex, default_index_path
+from translator import TableScan, apply_memory, run_jobs, open_memory, _new_stats, _merge_stats
+from utils import open_atomic, read_json_table, write_json, LocalizationCsvReader, LocalizationCsvWriter
+from utils import MANIFEST_SUFFIX, PROJECT_STATE_NAME, SIDECAR_SUFFIXES
+
+# 并行读写文件的线程数
+PROJECT_IO_WORKERS = 4
+
+
+def resolve_project(path):
+    """
+    path 为目录（其中所有 *.csv / *.json，不递归）或项目清单。
+    返回 (项目根目录, 表格路径列表)，路径为绝对路径、去重并保持顺序
+    """
+    path = os.path.abspath(path)
+    if os.path.isdir(path):
+        root = path
+        matches = sorted(glob.glob(os.path.join(root, '*.csv')) + glob.glob(os.path.join(root, '*.json')))
+    else:
+        root = os.path.dirname(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        matches = []
+        for pattern in manifest.get('tables', []):
+            matches.extend(sorted(glob.glob(os.path.join(root, pattern), recursive=True)))
+    tables = [os.path.abspath(p) for p in matches
+              if p.lower().endswith(('.csv', '.json')) and not p.endswith(SIDECAR_SUFFIXES)]
+    return root, list(dict.fromkeys(tables))
+
+
+def file_hash(path):
+    """文件内容的 SHA-1（分块读取，hashlib 计算时释放 GIL，可在线程池中并行）"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ProjectState:
+    """项目目录下的 PROJECT_STATE_NAME：{相对路径: 上次完整处理后的内容哈希}"""
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, PROJECT_STATE_NAME)
+        self.files = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.files = json.load(f).get('files', {})
+            except (ValueError, OSError, AttributeError):
+                self.files = {}
+
+    def _key(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def unchanged(self, path, content_hash):
+        """内容与上次完整处理后相同、且没有遗留翻译日志或失败清单"""
+        if self.files.get(self._key(path)) != content_hash:
+            return False
+        return not (os.path.exists(default_journal_path(path)) or os.path.exists(default_failures_path(path)))
+
+    def record(self, path, content_hash):
+        self.files[self._key(path)] = content_hash
+
+    def save(self):
+        with open_atomic(self.path, encoding='utf-8') as f:
+            json.dump({'version': 1, 'files': self.files}, f, ensure_ascii=False, indent=2)
+
+
+class ProjectTable:
+    """项目中的一个表格：读入的 Table、写回所需的格式信息，以及它的日志、源文索引、失败清单和扫描结果"""
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.is_json = path.lower().endswith('.json')
+        self.first_row = None
+        self.fields = None
+        self.table = None
+        self.scan = None
+        self.stats = _new_stats()
+
+    def load(self):
+        t0 = time.time()
+        if self.is_json:
+            self.table = read_json_table(self.path)
+        else:
+            with LocalizationCsvReader(self.path) as reader:
+                self.first_row, self.fields = reader.first_row, reader.fields
+                self.table = next(reader.iter_tables(None), None)
+            if self.table is None:
+                from table import Table
+                self.table = Table(self.fields)
+        self.stats['rows'] = len(self.table)
+        self.stats['timings']['parse'] = time.time() - t0
+        self.journal = Journal(default_journal_path(self.path))
+        self.source_index = SourceIndex(default_index_path(self.path))
+        self.failures = FailureLog(default_failures_path(self.path))
+        return self
+
+    @property
+    def dirty(self):
+        # 有任务或从日志恢复了译文时才需要写回
+        return bool(self.scan and (self.scan.pending or self.scan.resumed))
+
+    def write(self):
+        """写回表格（原子替换），再保存源文索引和失败清单、删除日志；返回写回后的内容哈希"""
+        t0 = time.time()
+        if self.dirty:
+            if self.is_json:
+                write_json(self.table, self.path)
+            else:
+                writer = LocalizationCsvWriter(self.path, self.fields, self.first_row)
+                try:
+                    writer.write_table(self.table)
+                except BaseException:
+                    writer.discard()
+                    raise
+                writer.commit()
+        self.journal.remove()
+        self.source_index.save()
+        self.failures.save()
+        self.stats['timings']['write'] = time.time() - t0
+        return file_hash(self.path)
+
+
+def _split_cells(cells):
+    # 全局任务的 cells 为 (文件序号, 行号, 语言列)，按文件拆成 {文件序号: [(行号, 语言列)]}
+    by_file = {}
+    for f, i, lang in cells:
+        by_file.setdefault(f, []).append((i, lang))
+    return by_file
+
+
+def merge_jobs(tables):
+    """
+    把各表格 TableScan 的任务按 (源文, 目标语言代码, 上下文) 跨文件合并。
+    返回 {目标语言代码: [[源文, 上下文, [(文件序号, 行号, 语言列), ...]], ...]}，按首次出现顺序排列
+    """
+    jobs = {}
+    index = {}
+    for f, pt in enumerate(tables):
+        for target_code, target_jobs in pt.scan.jobs.items():
+            merged = jobs.setdefault(target_code, [])
+            for src_text, context, cells in target_jobs:
+                key = (src_text, target_code, context)
+                job = index.get(key)
+                if job is None:
+                    job = [src_text, context, []]
+                    index[key] = job
+                    merged.append(job)
+                job[2].extend((f, i, lang) for i, lang in cells)
+    return jobs
+
+
+def translate_project(path, engine, progress_callback=None, cancel_checker=None, concurrency=None,
+                      use_cache=True, cache_path=None, incremental=False, retry_failed=False,
+                      io_workers=PROJECT_IO_WORKERS, rescan=False, profile_path=None, normalize=True,
+                      use_async=True, secondary_engine=None, hedge_percentile=None, segment=True):
+    """
+    翻译项目目录或项目清单 path 中的所有表格（参数含义同 translate_json）。
+    rescan: 不按内容哈希跳过未改动的文件
+    io_workers: 并行哈希、读入和写回文件的线程数
+    返回汇总统计：translate_json 的各项累计（unique / dedup_saved 按跨文件合并后的任务计），另有
+    files（表格数）/ skipped（按内容哈希跳过的文件数）/ cross_file_saved（跨文件去重额外省下的请求任务数）/
+    per_file（{路径: 该文件的统计}）
+    """
+    engine = get_engine(engine)
+    root, paths = resolve_project(path)
+    state = ProjectState(root)
+    totals = _new_stats()
+    totals.update(files=len(paths), skipped=0, cross_file_saved=0, per_file={})
+    progress = ProgressAggregator(progress_callback) if progress_callback else None
+    io_workers = max(1, int(io_workers or 1))
+
+    with ThreadPoolExecutor(max_workers=io_workers) as pool:
+        # 按内容哈希跳过未改动的文件
+        t0 = time.time()
+        hashes = dict(zip(paths, pool.map(file_hash, paths)))
+        todo = [p for p in paths if rescan or not state.unchanged(p, hashes[p])]
+        totals['skipped'] = len(paths) - len(todo)
+        if progress is not None:
+            progress.message(f'项目共{len(paths)}个表格，其中{totals["skipped"]}个未改动，跳过')
+
+        # 并行读入
+        tables = list(pool.map(lambda p: ProjectTable(p).load(), todo))
+        METRICS.add_phase('parse', time.time() - t0)
+
+        # 各表格分别扫描，再跨文件合并任务
+        with METRICS.phase('plan'):
+            for pt in tables:
+                pt.scan = TableScan(pt.table, engine, 0, pt.source_index, pt.journal, pt.failures,
+                                    incremental, retry_failed, normalize)
+                pt.stats.update(cells=pt.scan.cells, changed_rows=pt.scan.changed_rows, resumed=pt.scan.resumed,
+                                pending=pt.scan.pending, unique=pt.scan.unique,
+                                dedup_saved=pt.scan.pending - pt.scan.unique)
+            jobs = merge_jobs(tables)
+        unique_count = sum(len(v) for v in jobs.values())
+        pending_count = sum(pt.scan.pending for pt in tables)
+        totals['cross_file_saved'] = sum(pt.scan.unique for pt in tables) - unique_count
+
+        def dispatch(job, trans, counter):
+            # 把一个全局任务的译文分发回各文件
+            for f, cells in _split_cells(job[2]).items():
+                pt = tables[f]
+                pt.scan.fan_out(cells, trans)
+                pt.stats[counter] += len(cells)
+                if counter == 'translated':
+                    pt.journal.append(pt.scan.journal_records(cells, trans))
+
+        tm = open_memory(use_cache and unique_count, cache_path)
+        if tm is not None:
+            apply_memory(tm, engine, jobs, lambda job, trans: dispatch(job, trans, 'cache_hits'))
+
+        cells_total = sum(pt.scan.cells for pt in tables)
+        if progress is not None:
+            progress.total = cells_total
+            progress.plan(cells_total, sum(len(job[2]) for v in jobs.values() for job in v),
+                          sum(len(job[0]) for v in jobs.values() for job in v))
+            info = (f'准备翻译：{len(tables)}个表格共{cells_total}项，其中待翻译{pending_count}项，'
+                    f'跨文件去重后{unique_count}项')
+            if totals['cross_file_saved']:
+                info += f'（跨文件节省{totals["cross_file_saved"]}次请求）'
+            hits = sum(pt.stats['cache_hits'] for pt in tables)
+            if hits:
+                info += f'（翻译记忆命中{hits}项）'
+            progress.message(info)
+
+        def on_translated(target_code, done):
+            for job, trans in done:
+                dispatch(job, trans, 'translated')
+
+        def on_failed(job, err):
+            for f, cells in _split_cells(job[2]).items():
+                tables[f].scan.fail(cells, err, tables[f].failures)
+                tables[f].stats['failed'] += len(cells)
+
+        def describe(job):
+            f, i, lang = job[2][0]
+            pt = tables[f]
+            return pt.scan.describe([(i, lang)], label=f'{pt.name} ')
+
+        # calls / retries 等是全局的，直接计入 totals
+        run_stats = {'calls': 0, 'translated': 0, 'requeued': 0, 'failed': 0, 'retries': 0, 'throttled': 0,
+                     'hedged': 0, 'hedge_won': 0, 'failover': 0, 'segments': 0, 'segment_hits': 0}
+        t0 = time.time()
+        try:
+            cancelled = run_jobs(engine, jobs, on_translated, on_failed, run_stats, tm=tm, progress=progress,
+                                 describe=describe, cancel_checker=cancel_checker, concurrency=concurrency,
+                                 profile_path=profile_path, use_async=use_async, secondary=secondary_engine,
+                                 hedge_percentile=hedge_percentile, segment=segment)
+        finally:
+            if tm is not None:
+                tm.close()
+            for pt in tables:
+                pt.journal.close()
+        translate_time = time.time() - t0
+        if cancelled and progress is not None:
+            progress.message('已取消')
+
+        # 收尾并行写回；取消时已翻译的部分照常写回，但不记录哈希，下次仍会处理
+        t0 = time.time()
+        for pt in tables:
+            pt.scan.finish(pt.failures, pt.source_index)
+        new_hashes = list(pool.map(lambda pt: pt.write(), tables))
+        METRICS.add_phase('write', time.time() - t0)
+
+    for pt, content_hash in zip(tables, new_hashes):
+        if not cancelled:
+            state.record(pt.path, content_hash)
+        totals['per_file'][pt.path] = pt.stats
+        per_file = {k: v for k, v in pt.stats.items() if k != 'cancelled'}
+        _merge_stats(totals, per_file)
+    for p in paths:
+        if p not in totals['per_file'] and not cancelled:
+            state.record(p, hashes[p])
+    state.save()
+    # unique / dedup_saved 按跨文件合并后的任务数计
+    totals['unique'] = unique_count
+    totals['dedup_saved'] = totals['pending'] - unique_count
+    for k in ('calls', 'requeued', 'retries', 'throttled', 'hedged', 'hedge_won', 'failover', 'segments',
+              'segment_hits'):
+        totals[k] += run_stats[k]
+    totals['timings']['translate'] = translate_time
+    totals['cancelled'] = cancelled
+    if progress is not None:
+        progress.finish()
+    return totals
@@ -0,0 +1,279 @@
+"""
+按引擎限速：令牌桶（每秒请求数 + 每分钟字符/token 数）加上对 429 / 5xx / Retry-After 的自适应退避。
+
+每个引擎一个 RateLimiter，由所有工作线程共享。每次 API 请求前按请求数和大小从两个令牌桶取令牌；
+请求被限流（429、Google 的 rateLimitExceeded）时，所有线程一起暂停到 Retry-After 指定的时间（没有则指数退避），
+同时把速率减半；之后每次成功请求慢慢恢复速率（AIMD），使吞吐停留在配额能承受的最高水平。
+5xx 和网络错误只对当前请求退避重试，不影响速率。重试次数用完或错误不可重试时把异常抛给调用方。
+异步路径（aio.py）用 call_async / acquire_async，与线程共用同一套令牌桶和退避状态。
+"""
+import random
+import threading
+import time
+
+from metrics import METRICS
+
+# 单个请求最多尝试的次数（含第一次）
+RETRY_MAX_ATTEMPTS = 5
+# 指数退避的基数与上限（秒）
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+# 被限流后速率乘以 THROTTLE_DECREASE，每次成功请求恢复 RECOVER_STEP，最低降到 MIN_SCALE
+THROTTLE_DECREASE = 0.5
+RECOVER_STEP = 0.02
+MIN_SCALE = 0.05
+
+# 限流错误消息中的特征（Google v2 对超配额返回 403 + 这些 reason）
+_THROTTLE_MARKERS = ('ratelimitexceeded', 'userratelimitexceeded', 'too many requests', 'rate limit')
+# 配额耗尽（账单/额度问题）重试无用
+_PERMANENT_MARKERS = ('insufficient_quota', 'dailylimitexceeded', 'billing')
+
+
+class TokenBucket:
+    """
+    令牌桶。rate: 每秒补充的令牌数，None 为不限；capacity: 桶容量（允许的突发量）
+    单次取用超过容量时，等到桶满后一次取走（余额变负，之后的请求相应等待），保证超大请求也能发出。
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else (max(1.0, rate) if rate else 0)
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+
+    def _refill(self, now, scale):
+        if self.rate:
+            self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate * scale)
+        self._stamp = now
+
+    def wait_time(self, n, now, scale=1.0):
+        """取 n 个令牌还需等待的秒数（不取走）"""
+        if not self.rate:
+            return 0.0
+        self._refill(now, scale)
+        need = min(n, self.capacity) - self._tokens
+        return max(0.0, need / (self.rate * scale))
+
+    def take(self, n):
+        if self.rate:
+            self._tokens -= n
+
+
+class RateLimiter:
+    """
+    requests_per_second: 每秒请求数上限，None 为不限
+    units_per_minute: 每分钟字符数（Google）或 token 数（OpenAI）上限，None 为不限
+    max_attempts: 单个请求最多尝试次数
+    name: 引擎名；不为空时每次请求的延迟、大小、错误和重试都记录到 metrics.METRICS
+
+    统计：calls 实际发出的请求数，retries 重试次数，throttled 被限流次数
+    """
+    def __init__(self, requests_per_second=None, units_per_minute=None, max_attempts=RETRY_MAX_ATTEMPTS,
+                 name=None):
+        self.name = name
+        self.requests_per_second = requests_per_second
+        self.units_per_minute = units_per_minute
+        self.max_attempts = max(1, int(max_attempts))
+        self._requests = TokenBucket(requests_per_second)
+        # 大小配额允许 10 秒的突发量
+        self._units = TokenBucket(units_per_minute / 60.0 if units_per_minute else None,
+                                  units_per_minute / 6.0 if units_per_minute else None)
+        self._lock = threading.Lock()
+        self._scale = 1.0
+        self._paused_until = 0.0
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+
+    @classmethod
+    def from_limits(cls, rate_limits, **kwargs):
+        """由引擎声明的 rate_limits 创建：requests_per_second/requests_per_minute、chars/tokens_per_minute"""
+        rate_limits = rate_limits or {}
+        rps = rate_limits.get('requests_per_second')
+        if rps is None and rate_limits.get('requests_per_minute'):
+            rps = rate_limits['requests_per_minute'] / 60.0
+        upm = rate_limits.get('chars_per_minute') or rate_limits.get('tokens_per_minute')
+        return cls(rps, upm, **kwargs)
+
+    @property
+    def scale(self):
+        """当前速率相对声明配额的比例（被限流后降低，成功后逐步恢复）"""
+        return self._scale
+
+    def _try_acquire(self, units):
+        # 能发出请求时取走令牌并返回 0，否则返回需要等待的秒数
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self._paused_until - now,
+                       self._requests.wait_time(1, now, self._scale),
+                       self._units.wait_time(units, now, self._scale))
+            if wait <= 0:
+                self._requests.take(1)
+                self._units.take(units)
+                self.calls += 1
+                return 0
+            return wait
+
+    def acquire(self, units=0):
+        """阻塞到可以发出一个大小为 units 的请求"""
+        while True:
+            wait = self._try_acquire(units)
+            if not wait:
+                return
+            time.sleep(min(wait, 1.0))
+
+    async def acquire_async(self, units=0):
+        """acquire 的协程版本，等待期间不占用线程，可被取消"""
+        import asyncio
+        while True:
+            wait = self._try_acquire(units)
+            if not wait:
+                return
+            await asyncio.sleep(min(wait, 1.0))
+
+    def on_success(self):
+        if self._scale < 1.0:
+            with self._lock:
+                self._scale = min(1.0, self._scale + RECOVER_STEP)
+
+    def on_throttle(self, delay):
+        # 所有共享这个限速器的线程一起暂停，并把速率减半
+        with self._lock:
+            self.throttled += 1
+            self._scale = max(MIN_SCALE, self._scale * THROTTLE_DECREASE)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    def call(self, fn, units=0, chars=None):
+        """
+        在限速下调用 fn()，可重试的错误按 Retry-After 或指数退避重试，返回 fn 的结果。
+        不可重试的错误或重试次数用完时抛出最后一次的异常。chars: 请求发送的字符数（仅用于指标，默认等于 units）
+        """
+        attempt = 0
+        chars = units if chars is None else chars
+        while True:
+            self.acquire(units)
+            start = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                attempt += 1
+                delay = self._on_error(e, attempt, time.perf_counter() - start, chars, units)
+                if delay is None:
+                    raise
+                if delay:
+                    time.sleep(delay)
+                continue
+            self._on_done(time.perf_counter() - start, chars, units)
+            return result
+
+    async def call_async(self, fn, units=0, chars=None, timeout=None):
+        """
+        call 的协程版本：fn() 返回协程（每次尝试调用一次）。timeout 为单次尝试的超时（秒），
+        超时按临时错误退避重试。任务被取消时在途的请求随之中止，不计入重试
+        """
+        import asyncio
+        attempt = 0
+        chars = units if chars is None else chars
+        while True:
+            await self.acquire_async(units)
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(fn(), timeout) if timeout else await fn()
+            except Exception as e:
+                attempt += 1
+                delay = self._on_error(e, attempt, time.perf_counter() - start, chars, units)
+                if delay is None:
+                    raise
+                if delay:
+                    await asyncio.sleep(delay)
+                continue
+            self._on_done(time.perf_counter() - start, chars, units)
+            return result
+
+    def _on_done(self, seconds, chars, units):
+        if self.name:
+            METRICS.record_request(self.name, seconds, chars, units)
+        self.on_success()
+
+    def _on_error(self, e, attempt, seconds, chars, units):
+        # 记录第 attempt 次失败；返回重试前本请求要等待的秒数（限流时已让所有线程一起暂停，返回 0），不可重试时返回 None
+        if self.name:
+            METRICS.record_request(self.name, seconds, chars, units, type(e).__name__)
+        kind = classify_error(e)
+        if kind is None or attempt >= self.max_attempts:
+            return None
+        delay = retry_after(e)
+        if delay is None:
+            delay = backoff_delay(attempt)
+        with self._lock:
+            self.retries += 1
+        if self.name:
+            METRICS.record_retry(self.name, kind == 'throttle')
+        if kind == 'throttle':
+            self.on_throttle(delay)
+            return 0
+        return delay
+
+
+def backoff_delay(attempt):
+    """第 attempt 次失败后的等待时间：指数增长加随机抖动（full jitter）"""
+    cap = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** (attempt - 1)))
+    return random.uniform(cap / 2, cap)
+
+
+def status_code(e):
+    """从 openai / google-api-core / requests 的异常中取 HTTP 状态码"""
+    for attr in ('status_code', 'code', 'status'):
+        value = getattr(e, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(e, 'response', None)
+    value = getattr(response, 'status_code', None)
+    return value if isinstance(value, int) else None
+
+
+def retry_after(e):
+    """读取异常响应头中的 Retry-After（秒数或 HTTP 日期）/ retry-after-ms，没有则返回 None"""
+    seconds = getattr(e, 'retry_after', None)
+    if isinstance(seconds, (int, float)):
+        return max(0.0, float(seconds))
+    headers = getattr(getattr(e, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        value = headers.get('retry-after-ms')
+        if value:
+            return max(0.0, float(value) / 1000.0)
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            # email.utils 导入较慢，只在遇到 HTTP 日期格式时才加载
+            from email.utils import parsedate_to_datetime
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def classify_error(e):
+    """
+    判断错误能否重试：'throttle' 被限流（降速并全体暂停），'transient' 临时错误（只对本请求退避），
+    None 不可重试（参数错误、鉴权失败、额度耗尽等）
+    """
+    message = str(e).lower()
+    if any(m in message for m in _PERMANENT_MARKERS):
+        return None
+    code = status_code(e)
+    if code == 429 or (code == 403 and any(m in message for m in _THROTTLE_MARKERS)):
+        return 'throttle'
+    if code is not None:
+        return 'transient' if code >= 500 or code == 408 else None
+    if isinstance(e, (ConnectionError, TimeoutError)):
+        return 'transient'
+    name = type(e).__name__
+    # TimeoutError：Python 3.11 之前 asyncio.wait_for 超时抛出的 asyncio.TimeoutError 不是内置 TimeoutError 的子类
+    if name in ('APIConnectionError', 'APITimeoutError', 'ConnectionError', 'ConnectTimeout', 'ReadTimeout',
+                'Timeout', 'TimeoutError', 'ServiceUnavailable', 'TooManyRequests'):
+        return 'throttle' if name == 'TooManyRequests' else 'transient'
+    return None
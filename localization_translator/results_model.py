@@ -0,0 +1,368 @@
+"""
+界面的翻译结果表：QAbstractTableModel 直接读取 translator 在内存中的表格（table.Table），不复制数据。
+
+    model = ResultsModel(path=path)
+    view.setModel(model)
+    translate_csv(path, engine, result_callback=model.feed)   # 在工作线程中
+
+- feed 在翻译线程中调用（translate_json 的 result_callback），只在锁内登记表格、各 cell 的状态
+  （待翻译 / 失败，按行存列位掩码）和改动范围，不碰任何 Qt 对象；
+- 界面线程每 RESULTS_REFRESH_MS 毫秒 flush 一次：新到的行只增加可取的行数，改动的 cell 合并成一个矩形
+  发出一次 dataChanged，视图只重绘其中可见的部分，翻译再快界面也不会被信号淹没；
+- 行按需取：视图滚动到底部时 fetchMore 每次多取 RESULTS_FETCH_ROWS 行，10 万行的表格打开时也只建很少的行；
+- set_filter 只显示含失败或待翻译 cell 的行，筛选后的行列表最多每 RESULTS_FILTER_REFRESH_MS 毫秒重算一次，
+  只对增减的行发出插入 / 删除信号，选中的行和滚动位置不受影响。
+
+内存有界：CSV 分块翻译时模型只持有最近的块（合计不超过 RESULTS_WINDOW_ROWS 行，正在翻译的块总是保留），各行的
+状态只记在位掩码中。视图要显示窗口外的行时由后台线程从 path 读入（utils.LocalizationCsvBlocks：第一次扫描记下
+每 RESULTS_RELOAD_ROWS 行的字节位置，之后直接定位读取），读到之前显示 RESULTS_LOADING_TEXT，最多缓存
+RESULTS_RELOAD_BLOCKS 块。翻译进行中 path 仍是原文件，窗口外的行显示写回前的内容（状态颜色是最新的）；
+finish 后丢弃已读入的块，之后从写回的文件重新读取。
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor
+
+from table import table_fields
+
+# 视图每次向模型多取的行数
+RESULTS_FETCH_ROWS = 2000
+# 合并刷新的间隔（毫秒）
+RESULTS_REFRESH_MS = 200
+# 筛选模式下重算显示行的最短间隔（毫秒）
+RESULTS_FILTER_REFRESH_MS = 1000
+# 内存中最多持有的翻译中的块的行数（最新的一块总是保留）
+RESULTS_WINDOW_ROWS = 50000
+# 窗口外的行每次从文件读入的行数，及最多缓存的块数
+RESULTS_RELOAD_ROWS = 5000
+RESULTS_RELOAD_BLOCKS = 8
+# 窗口外的行读入之前显示的文字
+RESULTS_LOADING_TEXT = '…'
+
+# 筛选：全部行 / 含失败 cell 的行 / 含待翻译 cell 的行
+FILTER_ALL = 'all'
+FILTER_FAILED = 'failed'
+FILTER_PENDING = 'pending'
+
+_FAILED_COLOR = QColor(255, 205, 205)
+_PENDING_COLOR = QColor(255, 243, 200)
+
+
+class ResultsModel(QAbstractTableModel):
+    """path: 翻译的 CSV 文件，窗口外的行从这里重新读入；None 时窗口外的行显示为空"""
+    # (读入序号, 块号, Table 或 None)：后台线程读完一块，在界面线程中处理
+    _block_loaded = pyqtSignal(int, int, object)
+
+    def __init__(self, parent=None, path=None):
+        super().__init__(parent)
+        self._path = path
+        self._lock = threading.Lock()
+        # 以下由 feed（翻译线程）在锁内修改
+        self._segments = []          # [(row_offset, data)]，按 row_offset 递增，只含窗口内的块
+        self._offsets = []
+        self._held = 0               # 窗口内的行数
+        self._fields = []            # 各表字段的并集，顺序即列顺序
+        self._col_of = {}
+        self._total = 0
+        self._pending = {}           # 全局行号 -> 待翻译 cell 的列位掩码
+        self._failed = {}            # 全局行号 -> 失败 cell 的列位掩码
+        self._dirty = None           # 改动范围 [首行, 末行, 首列, 末列]
+        # 以下只在界面线程中使用
+        self._columns = 0
+        self._notes_col = None
+        self._available = 0
+        self._fetched = 0
+        self._filter = FILTER_ALL
+        self._rows = None            # 筛选模式下显示的全局行号（递增）
+        self._filter_stamp = 0.0
+        self._reloaded = {}          # 块号 -> 从文件读入的 Table（超出文件末尾为 None），最近用过的在后
+        self._loading = set()        # 已交给后台线程、还没读完的块号
+        self._reload_generation = 0  # finish 后加一，丢弃之前发出的读取的结果
+        self._blocks = None          # utils.LocalizationCsvBlocks，只在后台线程中使用
+        self._executor = None
+        self._block_loaded.connect(self._on_block_loaded)
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start(RESULTS_REFRESH_MS)
+
+    # ---- 翻译线程 ----
+
+    def feed(self, event, data, row_offset, cells):
+        """translate_json 的 result_callback；可在任意线程中调用"""
+        with self._lock:
+            if event == 'pending':
+                self._add_segment(data, row_offset)
+            if not cells:
+                return
+            col_of = self._col_of
+            pending, failed = self._pending, self._failed
+            rows = []
+            cols = set()
+            for i, lang in cells:
+                row = row_offset + i
+                bit = 1 << col_of[lang]
+                rows.append(row)
+                cols.add(col_of[lang])
+                if event == 'pending':
+                    pending[row] = pending.get(row, 0) | bit
+                    continue
+                mask = pending.get(row, 0) & ~bit
+                if mask:
+                    pending[row] = mask
+                else:
+                    pending.pop(row, None)
+                mask = failed.get(row, 0)
+                mask = mask | bit if event == 'failed' else mask & ~bit
+                if mask:
+                    failed[row] = mask
+                else:
+                    failed.pop(row, None)
+            self._touch(min(rows), max(rows), min(cols), max(cols))
+
+    def _add_segment(self, data, row_offset):
+        if any(seg is data for _, seg in self._segments):
+            return
+        k = bisect_right(self._offsets, row_offset)
+        self._segments.insert(k, (row_offset, data))
+        self._offsets.insert(k, row_offset)
+        self._held += len(data)
+        # 超出窗口时丢掉最早的块（已写出，需要时从文件重新读入）
+        while self._held > RESULTS_WINDOW_ROWS and len(self._segments) > 1:
+            k = 0 if self._segments[0][1] is not data else 1
+            _, old = self._segments.pop(k)
+            del self._offsets[k]
+            self._held -= len(old)
+        for name in table_fields(data):
+            if name not in self._col_of:
+                self._col_of[name] = len(self._fields)
+                self._fields.append(name)
+        self._total = max(self._total, row_offset + len(data))
+
+    def _touch(self, r0, r1, c0, c1):
+        d = self._dirty
+        self._dirty = [r0, r1, c0, c1] if d is None else [min(d[0], r0), max(d[1], r1), min(d[2], c0), max(d[3], c1)]
+
+    # ---- 界面线程 ----
+
+    def flush(self):
+        """把翻译线程登记的改动发给视图（定时器调用，翻译结束后也可直接调用）"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, None
+            columns = len(self._fields)
+            total = self._total
+        if columns > self._columns:
+            from translator import detect_columns
+            self.beginInsertColumns(QModelIndex(), self._columns, columns - 1)
+            self._columns = columns
+            self._notes_col = detect_columns(self._fields[:columns])[2]
+            self.endInsertColumns()
+        if self._filter != FILTER_ALL:
+            now = time.monotonic()
+            if dirty is not None and now - self._filter_stamp >= RESULTS_FILTER_REFRESH_MS / 1000.0:
+                self._refilter()
+                return
+            if dirty is not None and self._rows:
+                # 筛选行列表未重算时只刷新改动范围内仍显示的行
+                first = bisect_left(self._rows, dirty[0])
+                last = min(bisect_right(self._rows, dirty[1]), self._fetched) - 1
+                if first <= last:
+                    self.dataChanged.emit(self.index(first, dirty[2]), self.index(last, dirty[3]))
+            return
+        if total > self._available:
+            self._available = total
+            if self._fetched < RESULTS_FETCH_ROWS:
+                self.fetchMore(QModelIndex())
+        if dirty is not None and dirty[0] < self._fetched:
+            self.dataChanged.emit(self.index(dirty[0], dirty[2]),
+                                  self.index(min(dirty[1], self._fetched - 1), dirty[3]))
+
+    def finish(self):
+        """翻译结束：发出最后的改动并停止定时刷新；窗口外的行之后从写回的文件重新读入"""
+        self._timer.stop()
+        self._filter_stamp = 0.0
+        self._reloaded = {}
+        self._loading = set()
+        self._reload_generation += 1
+        self.flush()
+
+    def set_filter(self, mode):
+        """FILTER_ALL / FILTER_FAILED / FILTER_PENDING"""
+        if mode == self._filter:
+            return
+        self._filter = mode
+        self._refilter(reset=True)
+
+    def _refilter(self, reset=False):
+        with self._lock:
+            if self._filter == FILTER_FAILED:
+                rows = sorted(self._failed)
+            elif self._filter == FILTER_PENDING:
+                rows = sorted(self._pending)
+            else:
+                rows = None
+            total = self._total
+        self._filter_stamp = time.monotonic()
+        available = total if rows is None else len(rows)
+        # 保留已取的行数，刷新后视图不会跳回只有一页
+        fetched = min(available, max(self._fetched, RESULTS_FETCH_ROWS))
+        if reset or rows is None or self._rows is None:
+            self.beginResetModel()
+            self._rows = rows
+            self._available = available
+            self._fetched = fetched
+            self.endResetModel()
+            return
+        self._update_rows(rows[:fetched])
+        self._rows = rows
+        self._available = available
+
+    def _update_rows(self, new):
+        # 把显示的行（self._rows[:self._fetched]）变成 new（都递增），只对增减的行发出删除 / 插入信号；
+        # 期间可取的行数等于已显示的行数，视图不会在中途 fetchMore
+        keep = set(new)
+        current = self._rows[:self._fetched]
+        self._available = self._fetched
+        removed = [k for k, row in enumerate(current) if row not in keep]
+        # 从后往前删除连续的区间，前面的行号不受影响
+        while removed:
+            last = removed.pop()
+            first = last
+            while removed and removed[-1] == first - 1:
+                first = removed.pop()
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del current[first:last + 1]
+            self._rows, self._fetched = current, len(current)
+            self._available = self._fetched
+            self.endRemoveRows()
+        # 剩下的行是 new 的子序列，按顺序插入缺少的连续区间
+        k = 0
+        while k < len(new):
+            if k < len(current) and current[k] == new[k]:
+                k += 1
+                continue
+            end = bisect_left(new, current[k], k) if k < len(current) else len(new)
+            self.beginInsertRows(QModelIndex(), k, end - 1)
+            current[k:k] = new[k:end]
+            self._rows, self._fetched = current, len(current)
+            self._available = self._fetched
+            self.endInsertRows()
+            k = end
+
+    def counts(self):
+        """(含失败 cell 的行数, 含待翻译 cell 的行数)"""
+        with self._lock:
+            return len(self._failed), len(self._pending)
+
+    def global_row(self, row):
+        """视图中的第 row 行对应的整表行号"""
+        return row if self._rows is None else self._rows[row]
+
+    def _cell(self, row):
+        # 返回 (data, 该表中的行号)；没有表格覆盖这一行时 data 为 None，正在从文件读入时为 RESULTS_LOADING_TEXT
+        with self._lock:
+            k = bisect_right(self._offsets, row) - 1
+            if k >= 0:
+                row_offset, data = self._segments[k]
+                if row - row_offset < len(data):
+                    return data, row - row_offset
+            if row >= self._total or self._path is None:
+                return None, 0
+        block = row // RESULTS_RELOAD_ROWS
+        if block in self._reloaded:
+            data = self._reloaded.pop(block)
+            self._reloaded[block] = data
+            i = row - block * RESULTS_RELOAD_ROWS
+            return (data, i) if data is not None and i < len(data) else (None, 0)
+        if block not in self._loading:
+            self._loading.add(block)
+            if self._executor is None:
+                # 一个线程依次读取，LocalizationCsvBlocks 只在这个线程中使用
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='transfuse-results')
+            self._executor.submit(self._load_block, self._reload_generation, block)
+        return RESULTS_LOADING_TEXT, 0
+
+    def _load_block(self, generation, block):
+        # 后台线程：读入第 block 块，交回界面线程
+        from utils import LocalizationCsvBlocks
+        try:
+            if self._blocks is None:
+                self._blocks = LocalizationCsvBlocks(self._path, RESULTS_RELOAD_ROWS)
+            data = self._blocks.read(block)
+        except Exception:
+            # 文件不存在、正被替换或格式不对时这一块显示为空
+            data = None
+        try:
+            self._block_loaded.emit(generation, block, data)
+        except RuntimeError:
+            # 模型已被删除
+            pass
+
+    def _on_block_loaded(self, generation, block, data):
+        if generation != self._reload_generation:
+            return
+        self._loading.discard(block)
+        self._reloaded[block] = data
+        while len(self._reloaded) > RESULTS_RELOAD_BLOCKS:
+            del self._reloaded[next(iter(self._reloaded))]
+        # 刷新这一块中已显示的行
+        first, last = block * RESULTS_RELOAD_ROWS, (block + 1) * RESULTS_RELOAD_ROWS - 1
+        if self._rows is not None:
+            first, last = bisect_left(self._rows, first), bisect_right(self._rows, last) - 1
+        last = min(last, self._fetched - 1)
+        if first <= last and self._columns:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, self._columns - 1))
+
+    # ---- QAbstractTableModel ----
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._fetched
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._columns
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self._fetched < self._available
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        count = min(RESULTS_FETCH_ROWS, self._available - self._fetched)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._fetched, self._fetched + count - 1)
+        self._fetched += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.global_row(index.row())
+        col = index.column()
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            data, i = self._cell(row)
+            if data is None or data is RESULTS_LOADING_TEXT:
+                return data if role == Qt.DisplayRole else None
+            field = self._fields[col]
+            if role == Qt.ToolTipRole and self._notes_col and self._failed.get(row, 0) & (1 << col):
+                # 失败的 cell 提示 Notes 列中记下的错误
+                field = self._notes_col
+            value = data[i].get(field)
+            return '' if value is None else str(value)
+        if role == Qt.BackgroundRole:
+            bit = 1 << col
+            if self._failed.get(row, 0) & bit:
+                return _FAILED_COLOR
+            if self._pending.get(row, 0) & bit:
+                return _PENDING_COLOR
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._fields[section] if section < len(self._fields) else None
+        return str(self.global_row(section) + 1)
@@ -0,0 +1,187 @@
+"""
+长文本分段：多段落的剧情对白、物品描述按换行和句末标点拆成若干段，各段作为独立的任务去重、查翻译记忆、
+打包并发翻译，译文再按原顺序拼回。改动其中一句时只有这一句需要重新请求，其余各段直接命中翻译记忆。
+
+    segs, seps = split('第一句。第二句！\\n第二段。')   # ['第一句。', '第二句！', '第二段。'], ['', '', '\\n', '']
+    join(['One.', 'Two!', 'Para two.'], seps)          # 'One. Two!\\nPara two.'
+
+分隔符（换行和句末的空白）原样保留、不交给翻译引擎；中文句子之间没有空白，拼接时两侧都不是中日韩文字的
+（如英文译文）补一个空格。各段中归一化后的占位符 {n} 重新从 {0} 编号（renumber），前文多一个数字或标签时
+后面各段的任务文本不变，仍能命中翻译记忆；拼接前再换回原来的编号。
+"""
+import re
+
+from normalize import _MARKER_RE
+
+# 超过此长度（字符）的任务才拆分，短文本整条翻译
+SEGMENT_MIN_CHARS = 120
+
+# 段与段之间的分隔：换行（连同两侧的空白）；中文句末标点（可带后引号、括号）之后，不管有没有空白；
+# 西文句末标点之后的空白
+_BREAK_RE = re.compile(
+    r'[ \t　]*(?:\r?\n[ \t　]*)+'
+    r'|(?:(?<=[。！？；])|(?<=[。！？；][”’」』）》"\')]))(?![”’」』）》"\')。！？；!?.…])[ \t　]*'
+    r'|(?:(?<=[.!?])|(?<=[.!?][”’"\')]))[ \t　]+'
+)
+
+
+def split(text):
+    """
+    把 text 拆成 (段列表, 分隔列表)，len(seps) == len(segs) + 1，且
+    text == seps[0] + segs[0] + seps[1] + ... + segs[-1] + seps[-1]；段的首尾空白归入分隔
+    """
+    segs, seps = [], []
+    sep = ''
+    pos = 0
+    for m in _BREAK_RE.finditer(text):
+        if m.end() == 0 or m.start() == len(text):
+            continue
+        sep = _add_piece(segs, seps, sep, text[pos:m.start()]) + m.group(0)
+        pos = m.end()
+    sep = _add_piece(segs, seps, sep, text[pos:])
+    seps.append(sep)
+    return segs, seps
+
+
+def _add_piece(segs, seps, sep, piece):
+    # 非空白的片段作为一段（首尾空白并入前后的分隔），返回之后的分隔
+    body = piece.strip()
+    if not body:
+        return sep + piece
+    start = piece.index(body)
+    segs.append(body)
+    seps.append(sep + piece[:start])
+    return piece[start + len(body):]
+
+
+def _is_cjk(ch):
+    return '⺀' <= ch <= '鿿' or '가' <= ch <= '힯' or '＀' <= ch <= '￯'
+
+
+def join(translations, seps):
+    """按分隔把各段译文拼回；分隔为空且两侧都不是中日韩文字时补一个空格"""
+    parts = [seps[0]]
+    prev = ''
+    for k, trans in enumerate(translations):
+        if k and not seps[k] and prev and trans and not _is_cjk(prev[-1]) and not _is_cjk(trans[0]):
+            parts.append(' ')
+        parts.append(trans)
+        parts.append(seps[k + 1])
+        prev = trans
+    return ''.join(parts)
+
+
+def renumber(text):
+    """把段中的 {n} 按出现顺序重新编号为 {0}、{1}…，返回 (新文本, 原编号元组)"""
+    numbers = []
+    index = {}
+
+    def repl(m):
+        n = m.group(1)
+        if n not in index:
+            index[n] = len(numbers)
+            numbers.append(n)
+        return '{%d}' % index[n]
+
+    return _MARKER_RE.sub(repl, text), tuple(numbers)
+
+
+def restore_numbers(text, numbers):
+    """renumber 的逆操作：把 {k} 换回原编号 numbers[k]"""
+    if not numbers:
+        return text
+
+    def repl(m):
+        k = int(m.group(1))
+        return '{%s}' % numbers[k] if k < len(numbers) else m.group(0)
+
+    return _MARKER_RE.sub(repl, text)
+
+
+class _Parent:
+    # 一个被拆分的任务：各段的原编号、已到的译文和还差的段数
+    __slots__ = ('job', 'seps', 'numbers', 'translations', 'remaining')
+
+    def __init__(self, job, seps, count):
+        self.job = job
+        self.seps = seps
+        self.numbers = [()] * count
+        self.translations = [None] * count
+        self.remaining = count
+
+
+class SegmentPlan:
+    """
+    把 jobs（{目标语言代码: [[源文, 上下文, cells], ...]}）中超过 min_chars 的任务拆成段任务，供 run_jobs 发送。
+    段任务按 (段文本, 目标语言代码, 上下文) 去重，也与同文本的短任务合并；段任务的 cells 借用第一个所属任务的
+    cells（只用于进度文字）。
+
+    jobs: 拆分后的任务，短任务原样保留
+    split: 被拆分的任务数；count: 段任务数（去重后，不含与短任务合并的）
+    assemble 把翻译好的任务换成可以写回的任务（短任务原样，长任务在最后一段到达时拼好），failed 把失败的
+    段任务换成所属的任务。
+    """
+    def __init__(self, jobs, min_chars=SEGMENT_MIN_CHARS):
+        self.jobs = {}
+        self.split = 0
+        self.count = 0
+        # id(任务) -> [(_Parent, 段序号)]；只有段任务（或与段合并的短任务）有
+        self._parents = {}
+        # 未拆分的短任务的 id
+        self._plain = set()
+        for target_code, target_jobs in jobs.items():
+            out = self.jobs[target_code] = []
+            index = {}
+            long_jobs = []
+            for job in target_jobs:
+                if len(job[0]) > min_chars:
+                    segs, seps = split(job[0])
+                    if len(segs) > 1:
+                        long_jobs.append((job, segs, seps))
+                        continue
+                index[(job[0], job[1])] = job
+                self._plain.add(id(job))
+                out.append(job)
+            for job, segs, seps in long_jobs:
+                self.split += 1
+                parent = _Parent(job, seps, len(segs))
+                for k, seg in enumerate(segs):
+                    text, parent.numbers[k] = renumber(seg)
+                    seg_job = index.get((text, job[1]))
+                    if seg_job is None:
+                        seg_job = index[(text, job[1])] = [text, job[1], job[2]]
+                        out.append(seg_job)
+                        self.count += 1
+                    self._parents.setdefault(id(seg_job), []).append((parent, k))
+
+    def segment_jobs(self):
+        """只含段任务的 {目标语言代码: [段任务]}（查翻译记忆用；短任务调用方已查过）"""
+        return {target_code: [job for job in target_jobs if id(job) not in self._plain]
+                for target_code, target_jobs in self.jobs.items()}
+
+    def assemble(self, done):
+        """done: 翻译好的 [(任务, 译文)]；返回可以写回的 [(任务, 译文)]"""
+        ready = []
+        for job, trans in done:
+            if id(job) in self._plain:
+                ready.append((job, trans))
+            for parent, k in self._parents.get(id(job), ()):
+                if parent.translations[k] is None:
+                    parent.translations[k] = restore_numbers(trans, parent.numbers[k])
+                    parent.remaining -= 1
+                    if not parent.remaining:
+                        ready.append((parent.job, join(parent.translations, parent.seps)))
+        return ready
+
+    def failed(self, deferred):
+        """deferred: 失败的 [(目标语言代码, 任务, 错误)]；返回所属任务的同样列表，每个任务只出现一次"""
+        out = []
+        seen = set()
+        for target_code, job, err in deferred:
+            owners = [job] if id(job) in self._plain else []
+            owners += [parent.job for parent, _ in self._parents.get(id(job), ()) if parent.remaining]
+            for owner in owners:
+                if id(owner) not in seen:
+                    seen.add(id(owner))
+                    out.append((target_code, owner, err))
+        return out
@@ -0,0 +1,101 @@
+"""
+源文索引：记录每一行上次翻译时的源文（及上下文）哈希，保存在表格旁的 filepath + '.srchash.json'。
+
+策划改动中文源文后，已有译文不再为空也不等于源文，按普通跳过规则会被保留下来；
+增量模式下 translate_json 对比索引找出源文/上下文有改动的行，只重新翻译这些行。
+"""
+import hashlib
+import json
+import os
+
+from table import column_values
+from utils import open_atomic
+
+# 识别为行键的字段名（小写比较）
+KEY_COLUMN_NAMES = {'key', 'id', 'keyid', 'key_id', 'textkey', 'textid', '键'}
+
+
+def default_index_path(filepath):
+    return filepath + '.srchash.json'
+
+
+def detect_key_column(keys):
+    for k in keys:
+        if k and k.strip().lower() in KEY_COLUMN_NAMES:
+            return k
+    return None
+
+
+def row_hash(src_text, context):
+    return hashlib.sha1(f'{src_text}\x1f{context}'.encode('utf-8')).hexdigest()[:16]
+
+
+class SourceIndex:
+    """
+    path: 索引文件路径；文件不存在时为空索引（所有行都视为新行，不会被强制重译）
+
+    每行保存 {"h": 源文+上下文哈希, "s": 源文}，源文用于在差异报告中显示“旧 → 新”。
+    """
+    def __init__(self, path):
+        self.path = path
+        self.rows = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.rows = json.load(f).get('rows', {})
+            except (ValueError, OSError, AttributeError):
+                self.rows = {}
+        self._dirty = False
+
+    @staticmethod
+    def row_key(row, index, key_col):
+        key = row.get(key_col) if key_col else None
+        return f'key:{key}' if key else f'row:{index}'
+
+    def diff(self, data, source_col, context_col, key_col, row_offset=0):
+        """
+        对比 data 与索引，返回 (changed, current)：
+          changed: [(行号, 行键, 旧源文, 新源文)]，源文或上下文与上次翻译时不同的行
+          current: {行号: (行键, 哈希, 源文)}，用于翻译完成后更新索引
+        索引中没有记录的行视为新行，不算改动（按普通规则翻译空白 cell）。
+        """
+        changed = []
+        current = {}
+        sources = column_values(data, source_col)
+        contexts = column_values(data, context_col) if context_col else None
+        keys = column_values(data, key_col) if key_col else None
+        for i, src in enumerate(sources):
+            src_text = str(src or '')
+            context = str(contexts[i] or '') if contexts is not None else ''
+            key = f'key:{keys[i]}' if keys is not None and keys[i] else f'row:{row_offset + i}'
+            h = row_hash(src_text, context)
+            current[i] = (key, h, src_text)
+            old = self.rows.get(key)
+            if old and old.get('h') != h and src_text.strip():
+                changed.append((i, key, old.get('s', ''), src_text))
+        return changed, current
+
+    def update(self, key, h, src_text):
+        old = self.rows.get(key)
+        if not old or old.get('h') != h:
+            self.rows[key] = {'h': h, 's': src_text}
+            self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        with open_atomic(self.path, encoding='utf-8') as f:
+            json.dump({'version': 1, 'rows': self.rows}, f, ensure_ascii=False)
+        self._dirty = False
+
+
+def format_changes(changed, limit=20):
+    """把 diff 的结果整理成给人看的差异报告"""
+    if not changed:
+        return '没有检测到源文改动'
+    lines = [f'检测到 {len(changed)} 行源文/上下文有改动，将重新翻译：']
+    for _, key, old_src, new_src in changed[:limit]:
+        lines.append(f'  {key}：{old_src} → {new_src}')
+    if len(changed) > limit:
+        lines.append(f'  ……另有 {len(changed) - limit} 行')
+    return '\n'.join(lines)
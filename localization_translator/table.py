@@ -0,0 +1,233 @@
+"""
+列式表格：每个字段一个 list，代替 list[dict]（每行一个 dict、字段名重复存储）。
+
+读入时相同的单元格字符串（上下文、标签、重复的源文等）在同一张表内共用一个对象；
+按语言列的扫描只需遍历一个 list。row = table[i] 返回轻量的行视图（__slots__，不复制数据），
+支持 row.get / row[k] / row[k] = v / keys() / items()，原先按 dict 操作行的代码可以直接使用。
+
+JSON 中有的行可能缺少某些键，这些位置存为 MISSING（布尔值为假、str 为 ''），写回 JSON 时仍然省略；
+各行的键统一按字段首次出现的顺序写出。
+"""
+
+from operator import itemgetter
+
+
+class _Missing:
+    __slots__ = ()
+
+    def __bool__(self):
+        return False
+
+    def __str__(self):
+        return ''
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+
+class Row:
+    """第 i 行的视图；读写都直接作用在表格的列上"""
+    __slots__ = ('_table', '_i')
+
+    def __init__(self, table, i):
+        self._table = table
+        self._i = i
+
+    def get(self, key, default=None):
+        column = self._table.columns.get(key)
+        if column is None:
+            return default
+        value = column[self._i]
+        return default if value is MISSING else value
+
+    def __getitem__(self, key):
+        column = self._table.columns.get(key)
+        if column is None or column[self._i] is MISSING:
+            raise KeyError(key)
+        return column[self._i]
+
+    def __setitem__(self, key, value):
+        self._table.set(self._i, key, value)
+
+    def __contains__(self, key):
+        column = self._table.columns.get(key)
+        return column is not None and column[self._i] is not MISSING
+
+    def keys(self):
+        i = self._i
+        columns = self._table.columns
+        return [f for f in self._table.fields if columns[f][i] is not MISSING]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        i = self._i
+        columns = self._table.columns
+        return [(f, columns[f][i]) for f in self._table.fields if columns[f][i] is not MISSING]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return f'Row({self.to_dict()!r})'
+
+
+class Table:
+    """
+    fields: 字段名列表（顺序即输出顺序）
+    columns: {字段名: list}，各列等长
+    """
+    __slots__ = ('fields', 'columns', '_n')
+
+    def __init__(self, fields=()):
+        self.fields = []
+        self.columns = {}
+        self._n = 0
+        for name in fields:
+            self.add_field(name)
+
+    @classmethod
+    def from_rows(cls, rows, intern=True):
+        """由 list[dict] 建表；字段按首次出现顺序合并，某行缺少的键记为 MISSING"""
+        rows = rows if isinstance(rows, list) else list(rows)
+        if rows and isinstance(rows[0], dict):
+            keys = rows[0].keys()
+            if keys and all(row.keys() == keys for row in rows):
+                # 常见情况：每行的键相同，整列一次取出（C 层转置），不逐行逐键追加
+                fields = list(keys)
+                getter = itemgetter(*fields)
+                records = map(getter, rows) if len(fields) > 1 else ((getter(row),) for row in rows)
+                return cls.from_columns(fields, list(zip(*records)), intern=intern)
+        table = cls()
+        pool = {}
+        columns = table.columns
+        n = 0
+        for row in rows:
+            for key, value in row.items():
+                column = columns.get(key)
+                if column is None:
+                    column = table.add_field(key)
+                if intern and isinstance(value, str):
+                    value = pool.setdefault(value, value)
+                column.append(value)
+            n += 1
+            # 本行缺少的字段补 MISSING，保持各列等长
+            for column in columns.values():
+                if len(column) < n:
+                    column.append(MISSING)
+            table._n = n
+        return table
+
+    @classmethod
+    def from_columns(cls, fields, columns, intern=True):
+        """
+        由与 fields 一一对应的整列（各列等长的序列）建表，不逐行处理。
+        intern: 相同字符串共用一个对象（长期驻留内存的表格用；一次性的格式转换可以关掉）
+        """
+        table = cls()
+        table.fields = list(fields)
+        pool = {}
+        setdefault = pool.setdefault
+        for name, column in zip(table.fields, columns):
+            if intern:
+                column = [setdefault(v, v) if v.__class__ is str else v for v in column]
+            table.columns[name] = column if isinstance(column, list) else list(column)
+        table._n = len(columns[0]) if columns else 0
+        return table
+
+    @classmethod
+    def from_records(cls, fields, records):
+        """由与 fields 对齐的值序列（如 CSV 行）建表"""
+        table = cls(fields)
+        table.extend_records(records)
+        return table
+
+    def extend_records(self, records, pool=None):
+        pool = {} if pool is None else pool
+        columns = [self.columns[f] for f in self.fields]
+        n = self._n
+        for record in records:
+            for column, value in zip(columns, record):
+                if isinstance(value, str):
+                    value = pool.setdefault(value, value)
+                column.append(value)
+            n += 1
+        self._n = n
+
+    def add_field(self, name, fill=MISSING):
+        """增加一列，已有的行填 fill；返回该列"""
+        column = self.columns.get(name)
+        if column is None:
+            column = [fill] * self._n
+            self.fields.append(name)
+            self.columns[name] = column
+        return column
+
+    def column(self, name):
+        """字段 name 的整列（可原地修改）；不存在时返回 None"""
+        return self.columns.get(name)
+
+    def set(self, i, name, value):
+        column = self.columns.get(name)
+        if column is None:
+            column = self.add_field(name)
+        column[i] = value
+
+    def keys(self):
+        return list(self.fields)
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [Row(self, k) for k in range(*i.indices(self._n))]
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        return Row(self, i)
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield Row(self, i)
+
+    def iter_records(self):
+        """按 fields 顺序逐行产出值元组（MISSING 原样保留）"""
+        if not self.fields:
+            return iter([()] * self._n)
+        return zip(*(self.columns[f] for f in self.fields))
+
+    def iter_dicts(self):
+        """逐行产出 dict（省略 MISSING 的键），用于写 JSON"""
+        fields = self.fields
+        for record in self.iter_records():
+            yield {f: v for f, v in zip(fields, record) if v is not MISSING}
+
+    def to_dicts(self):
+        return list(self.iter_dicts())
+
+
+def column_values(data, name):
+    """
+    取 data 中字段 name 的一整列：Table 直接返回列（缺少该字段时为全 None），list[dict] 逐行取值生成新 list。
+    返回值只用于读取；MISSING 与 None 一样为假值
+    """
+    if isinstance(data, Table):
+        column = data.columns.get(name)
+        return column if column is not None else [None] * len(data)
+    return [row.get(name) for row in data]
+
+
+def table_fields(data):
+    """data 的字段名：Table 为 fields，list[dict] 为第一行的键"""
+    if isinstance(data, Table):
+        return list(data.fields)
+    return list(data[0].keys()) if data else []
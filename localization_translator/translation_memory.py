@@ -0,0 +1,165 @@
+"""
+翻译记忆（Translation Memory）：跨运行、跨表格共享的本地 SQLite 缓存。
+
+以 (引擎, 源文, 目标语言代码, 上下文哈希) 为键保存译文；translate_json 在调用翻译引擎前先查询，
+翻译成功后写入。总大小超过上限时按最近使用时间淘汰旧条目。
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# 默认数据库位置，可通过环境变量 TRANSFUSE_TM_PATH 指定
+DEFAULT_TM_PATH = os.path.join(os.path.expanduser('~'), '.transfuse', 'translation_memory.sqlite3')
+# 默认容量上限（按源文 + 译文的 UTF-8 字节数估算）
+DEFAULT_TM_MAX_BYTES = 256 * 1024 * 1024
+
+# 单次 IN 查询的键数量（SQLite 默认变量上限为 999）
+_LOOKUP_CHUNK = 500
+
+
+def context_hash(context):
+    """上下文哈希；无上下文时为空字符串"""
+    if not context:
+        return ''
+    return hashlib.sha1(context.encode('utf-8')).hexdigest()
+
+
+def make_key(engine, text, target_code, context=''):
+    raw = '\x1f'.join((engine, target_code or '', context_hash(context), text))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class TranslationMemory:
+    """
+    SQLite 翻译记忆。
+
+    path: 数据库文件路径，None 则使用 TRANSFUSE_TM_PATH 或 DEFAULT_TM_PATH
+    max_bytes: 容量上限，超过后按 last_used 淘汰最久未使用的条目，直到降到上限的 90%
+    """
+    def __init__(self, path=None, max_bytes=DEFAULT_TM_MAX_BYTES):
+        self.path = path or os.environ.get('TRANSFUSE_TM_PATH') or DEFAULT_TM_PATH
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        # 多个进程（命令行并行模式）可能同时写入，等锁而不是立即报错
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS tm ('
+            ' key TEXT PRIMARY KEY,'
+            ' engine TEXT NOT NULL,'
+            ' target TEXT NOT NULL,'
+            ' source_text TEXT NOT NULL,'
+            ' translation TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS tm_last_used ON tm(last_used)')
+        self._conn.commit()
+        self._total_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM tm').fetchone()[0]
+
+    def get(self, engine, text, target_code, context=''):
+        """查询单条，未命中返回 None"""
+        return self.get_many(engine, [(text, target_code, context)])[0]
+
+    def get_many(self, engine, items, touch=True):
+        """
+        批量查询。items: [(源文, 目标语言代码, 上下文)]
+        返回与 items 等长的列表，命中为译文，未命中为 None
+        touch: 是否刷新命中条目的最近使用时间；只做估算（planner）时传 False，不影响淘汰顺序
+        """
+        keys = [make_key(engine, text, target_code, context) for text, target_code, context in items]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[start:start + _LOOKUP_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                for key, translation in self._conn.execute(
+                        f'SELECT key, translation FROM tm WHERE key IN ({placeholders})', chunk):
+                    found[key] = translation
+            if found and touch:
+                now = time.time()
+                self._conn.executemany('UPDATE tm SET last_used=? WHERE key=?', [(now, k) for k in found])
+                self._conn.commit()
+        results = [found.get(k) for k in keys]
+        hit = sum(1 for r in results if r is not None)
+        self.hits += hit
+        self.misses += len(results) - hit
+        return results
+
+    def put(self, engine, text, target_code, translation, context=''):
+        self.put_many(engine, [(text, target_code, context, translation)])
+
+    def put_many(self, engine, items):
+        """批量写入。items: [(源文, 目标语言代码, 上下文, 译文)]"""
+        rows = []
+        now = time.time()
+        for text, target_code, context, translation in items:
+            if not translation:
+                continue
+            size = len(text.encode('utf-8')) + len(translation.encode('utf-8'))
+            rows.append((make_key(engine, text, target_code, context), engine, target_code or '',
+                         text, translation, size, now))
+        if not rows:
+            return
+        with self._lock:
+            keys = [r[0] for r in rows]
+            # 覆盖已有条目时先扣掉旧大小，保持 _total_bytes 准确
+            for start in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[start:start + _LOOKUP_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                old = self._conn.execute(
+                    f'SELECT COALESCE(SUM(size), 0) FROM tm WHERE key IN ({placeholders})', chunk).fetchone()[0]
+                self._total_bytes -= old
+            self._conn.executemany('INSERT OR REPLACE INTO tm VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self._total_bytes += sum(r[5] for r in rows)
+            if self.max_bytes and self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # 按最近使用时间从旧到新删除，直到降到上限的 90%
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            victims = self._conn.execute('SELECT key, size FROM tm ORDER BY last_used LIMIT 1000').fetchall()
+            if not victims:
+                self._total_bytes = 0
+                break
+            removed = []
+            for key, size in victims:
+                removed.append((key,))
+                self._total_bytes -= size
+                if self._total_bytes <= target:
+                    break
+            self._conn.executemany('DELETE FROM tm WHERE key=?', removed)
+
+    def entries(self, engine, target_code):
+        """某引擎、某目标语言代码的全部 (源文, 译文)，供 fuzzy.FuzzyIndex 建索引"""
+        with self._lock:
+            return self._conn.execute('SELECT source_text, translation FROM tm WHERE engine=? AND target=?',
+                                      (engine, target_code or '')).fetchall()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM tm').fetchone()[0]
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM tm')
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
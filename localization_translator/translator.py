@@ -1,10 +1,16 @@
 # translator.py (关键部分：translate_json / translate_csv + 辅助翻译函数)
-import os
 import time
-import openai
-from google.cloud import translate_v2 as google_translate
-import pandas as pd
-from utils import read_csv, write_csv, write_json  # 假设 utils 有这些函数
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils import write_json, read_json_table, LocalizationCsvReader, LocalizationCsvWriter, count_localization_rows
+from journal import Journal, default_journal_path, source_hash
+from source_index import SourceIndex, default_index_path, detect_key_column
+from failures import FailureLog, default_failures_path
+from progress import ProgressAggregator
+from table import Table, column_values, table_fields
+from normalize import mask, unmask, check_markers
+from metrics import METRICS, profiled
+from engines import get_engine
 
 # 语言代码映射（可根据需要补充）
 LANG_MAP = {
@@ -14,77 +20,53 @@ LANG_MAP = {
     '越南语': 'vi', '波兰语': 'pl', '土耳其语': 'tr'
 }
 
-# Google client 缓存
-_g_client = None
+def _resolve_target(target):
+    # 若 target 看起来是中文文字（非 code），尝试映射
+    return LANG_MAP.get(target, target)
+
+# 以下函数保留给直接调用单个引擎的旧代码；实现都在 engines.py 中，共享各引擎的长期客户端
 def get_google_client():
-    global _g_client
-    if _g_client is None:
-        _g_client = google_translate.Client()
-    return _g_client
+    return get_engine('Google').client()
 
 def google_translate_text(text, target, source=None):
-    if not text:
-        return '', None
-    # 若 target 看起来是中文文字（非 code），尝试映射
-    if target in LANG_MAP:
-        target_code = LANG_MAP[target]
-    else:
-        target_code = target
-    if source and target_code and source.lower() == target_code.lower():
-        return text, None
-    client = get_google_client()
-    try:
-        result = client.translate(text, target_language=target_code, source_language=source)
-        return result['translatedText'], None
-    except Exception as e:
-        return None, str(e)
+    return get_engine('Google').translate_text(text, _resolve_target(target), source)
+
+def google_translate_batch(texts, target, source=None):
+    """一次 API 调用翻译多条文本，返回与 texts 等长的 [(译文, 错误)] 列表"""
+    return get_engine('Google').translate_batch(texts, _resolve_target(target), source)[0]
 
 def openai_translate_text(text, target, source=None, context=None):
-    if not text:
-        return '', None
-    # map target if needed
-    if target in LANG_MAP:
-        target_code = LANG_MAP[target]
-    else:
-        target_code = target
-    prompt = f"将以下内容从{source or '原文'}翻译为{target_code}。\n上下文：{context or ''}\n原文：{text}\n翻译："
-    try:
-        api_key = os.getenv('OPENAI_API_KEY')
-        client = openai.OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=2048
-        )
-        # 兼容旧/new 返回结构
-        content = None
-        try:
-            content = response.choices[0].message.content.strip()
-        except Exception:
-            # fallback if different shape
-            content = str(response)
-        return content, None
-    except Exception as e:
-        return None, str(e)
+    return get_engine('OpenAI').translate_text(text, _resolve_target(target), source, context)
 
+def openai_translate_batch(texts, target, source=None, contexts=None):
+    """打包翻译多条文本，返回 (results, calls)，见 engines.OpenAIEngine.translate_batch"""
+    return get_engine('OpenAI').translate_batch(texts, _resolve_target(target), source, contexts)
 
-def translate_json(data, engine, filepath, progress_callback=None, cancel_checker=None):
+def mock_translate_batch(texts, target, source=None):
+    """模拟一次批量翻译请求，返回与 texts 等长的 [(译文, 错误)]"""
+    return get_engine('Mock').translate_batch(texts, _resolve_target(target), source)[0]
+
+def _make_batches(items, max_strings, max_size, size_of=len):
+    """按条数和总大小（字符数或估算 token 数，由 size_of 计算）把 items 切成若干批；单条超大的独占一批"""
+    batch = []
+    batch_size = 0
+    for it in items:
+        n = size_of(it)
+        if batch and (len(batch) >= max_strings or batch_size + n > max_size):
+            yield batch
+            batch = []
+            batch_size = 0
+        batch.append(it)
+        batch_size += n
+    if batch:
+        yield batch
+
+
+def detect_columns(keys):
     """
-    data: list[dict]
-    engine: 'Google' or 'OpenAI'
-    filepath: 用于写回（write_json）
-    progress_callback: function(percent: float, info: str|None=None, row_time: float|None=None, done: int|None=None, total: int|None=None)
-    cancel_checker: callable() -> bool, 返回 True 则中止翻译（协作式）
+    根据字段名识别 源文/上下文/备注/行键 列，其余列视为目标语言列。
+    返回 (source_col, context_col, notes_col, lang_cols)；行键列见 source_index.detect_key_column
     """
-    total = len(data)
-    if total == 0:
-        # 仍然写个空文件
-        write_json(data, filepath)
-        return
-
-    keys = list(data[0].keys())
-    # 检测列
     source_col = None
     for k in keys:
         if k and (k.lower().startswith('source') or k == '源语言' or k == 'SourceZH'):
@@ -101,143 +83,862 @@ def translate_json(data, engine, filepath, progress_callback=None, cancel_checke
             notes_col = k
             break
 
-    # 目标语言列（排除已识别的列）
-    exclude = {source_col, context_col, notes_col, 'Tag', 'Plural'}
+    # 目标语言列（排除已识别的列；Key/ID 列不是语言，也不能被重译）
+    exclude = {source_col, context_col, notes_col, detect_key_column(keys), 'Tag', 'Plural'}
     lang_cols = [k for k in keys if k not in exclude and k is not None]
-    total_langs = len(lang_cols)
-    if total_langs == 0:
-        write_json(data, filepath)
+    return source_col, context_col, notes_col, lang_cols
+
+
+def _need_translate(existing, src_text):
+    # 如果该 cell 有已存在翻译且非空且不等于源文，则视为已完成（跳过调用）
+    return (existing is None) or (str(existing).strip() == '') or (str(existing).strip() == src_text)
+
+
+def _append_note(row, notes_col, lang, err):
+    # 记录失败信息到 notes 列（不覆盖已有备注）
+    if notes_col:
+        old_note = str(row.get(notes_col, '')) if row.get(notes_col) else ''
+        row[notes_col] = (old_note + '; ' if old_note else '') + f"翻译失败({lang}): {err}"
+
+
+def _clear_note(row, notes_col, lang):
+    # 该 cell 翻译成功后去掉之前记下的失败信息，保留其他备注
+    note = row.get(notes_col) if notes_col else None
+    if not note or '翻译失败(' not in str(note):
         return
+    parts = [p for p in str(note).split('; ') if not p.startswith(f'翻译失败({lang})')]
+    row[notes_col] = '; '.join(parts) or None
 
-    total_tasks = total * total_langs
-    task_done = 0
 
-    # 让 GUI 先知道总数（可选）
-    if progress_callback:
-        try:
-            progress_callback(0.0, f'准备翻译：{total}行 × {total_langs}语种 = {total_tasks}项', None, 0, total_tasks)
-        except Exception:
-            pass
-
-    for i, row in enumerate(data):
-        if cancel_checker and cancel_checker():
-            # 提示取消
-            if progress_callback:
-                try:
-                    progress_callback((task_done / total_tasks) * 100.0, '已取消', None, task_done, total_tasks)
-                except Exception:
-                    pass
-            break
+def _engine_context(engine, context):
+    # 只有声明 supports_context 的引擎（如 OpenAI）会用到上下文；其他引擎的译文与上下文无关，缓存/分组时忽略
+    return context if get_engine(engine).supports_context else ''
+
 
-        row_start = time.time()
+def plan_jobs(data, engine, source_col, context_col, lang_cols, force=None, only=None, normalize=True):
+    """
+    规划翻译任务：扫描所有待翻译的 cell，按 (源文, 目标语言代码, 上下文) 去重。
+    force: {行号: 语言列集合}，这些 cell 即使已有译文也重新翻译（增量模式下源文有改动的行）
+    only: {行号: 语言列集合}，不为 None 时只考虑这些 cell（只重试失败项模式）
+    normalize: 源文先经 normalize.mask 归一化（数字、占位符、标签换成 {n}），只差这些片段的源文合并成一个任务；
+               任务的源文为归一化后的文本，写回时由 TableScan 按各 cell 的原文还原
+
+    同一源文在多行出现、或多个语言列映射到同一语言代码（如两个西班牙语列）时只保留一个任务，
+    翻译结果再分发到所有对应的 cell。上下文只在引擎会用到时（supports_context）参与分组。
+    返回 (jobs, pending_count)：
+      jobs: {目标语言代码: [[源文, 上下文, [(行号, 语言列), ...]], ...]}，按首次出现顺序排列
+      pending_count: 去重前待翻译的 cell 数
+    """
+    jobs = {}
+    index = {}
+    pending_count = 0
+    # 按列扫描：每个字段只取一次整列，不再逐行查 dict
+    sources = column_values(data, source_col)
+    contexts = column_values(data, context_col) if context_col and get_engine(engine).supports_context else None
+    targets = []
+    for lang in lang_cols:
+        target_code = _resolve_target(lang)
+        jobs.setdefault(target_code, [])
+        targets.append((lang, target_code, column_values(data, lang)))
+    rows = sorted(only) if only is not None else range(len(data))
+    for i in rows:
+        src_text = str(sources[i] or '')
+        if not src_text.strip():
+            continue
+        context = str(contexts[i] or '') if contexts is not None else ''
+        forced = force.get(i, ()) if force else ()
+        allowed = only[i] if only is not None else None
+        # 归一化只对有待翻译 cell 的行做，每行一次
+        job_text = None
+        for lang, target_code, values in targets:
+            if allowed is not None and lang not in allowed:
+                continue
+            # 即 _need_translate(existing, src_text) 为假且未被强制重译时跳过；内联以免每个 cell 一次函数调用
+            existing = values[i]
+            if existing is not None and lang not in forced:
+                existing = str(existing).strip()
+                if existing and existing != src_text:
+                    continue
+            pending_count += 1
+            if job_text is None:
+                job_text = mask(src_text)[0] if normalize else src_text
+            key = (job_text, target_code, context)
+            job = index.get(key)
+            if job is None:
+                job = [job_text, context, []]
+                index[key] = job
+                jobs[target_code].append(job)
+            job[2].append((i, lang))
+    return jobs, pending_count
+
+
+def _replay_journal(data, journal, row_offset, source_col, lang_cols, force):
+    """
+    把翻译日志中行号落在 data 内、源文未改动的记录写回 data（已有有效译文且未被强制重译的 cell 不覆盖），
+    写回的 cell 从 force 中去掉；返回恢复的 cell 数
+    """
+    resumed = 0
+    for entry in journal.replay_rows(row_offset, row_offset + len(data)):
+        i, lang = entry['i'] - row_offset, entry['l']
+        if lang not in lang_cols:
+            continue
+        row = data[i]
         src_text = str(row.get(source_col, '') or '')
-        context = str(row.get(context_col, '') or '') if context_col else ''
-        for lang_idx, lang in enumerate(lang_cols):
-            # 每个目标语言都视为一个子任务，无论是否实际调用翻译（保持进度一致）
-            # 如果该 cell 有已存在翻译且非空且不等于源文，则视为已完成（跳过调用）
-            existing = row.get(lang, None)
-            need_translate = (existing is None) or (str(existing).strip() == '') or (str(existing).strip() == src_text)
-            trans = None
-            err = None
-
-            if need_translate and src_text.strip():
-                # 检查取消
+        if entry['s'] != source_hash(src_text):
+            continue
+        if _need_translate(row.get(lang, None), src_text) or lang in force.get(i, ()):
+            row[lang] = entry['t']
+            force.get(i, set()).discard(lang)
+            resumed += 1
+    return resumed
+
+
+def _translate_batch(engine, target_code, batch):
+    """
+    翻译一批任务 [源文, 上下文, cells]，可在工作线程中调用。engine 为 engines.Engine 对象
+    返回 (results, calls)：results 为等长的 [(译文, 错误)]，calls 为实际发出的 API 请求数
+    """
+    contexts = [job[1] for job in batch] if engine.supports_context else None
+    results, calls = engine.translate_batch([job[0] for job in batch], target_code, 'zh-CN', contexts)
+    return _checked_results(batch, results), calls
+
+
+async def _translate_batch_async(engine, target_code, batch):
+    """_translate_batch 的协程版本，在 aio.py 的事件循环中运行"""
+    contexts = [job[1] for job in batch] if engine.supports_context else None
+    results, calls = await engine.translate_batch_async([job[0] for job in batch], target_code, 'zh-CN', contexts)
+    return _checked_results(batch, results), calls
+
+
+async def _translate_split_async(engine, target_code, batch):
+    # 批次按主引擎的上限切分，改发给上限更小的备用引擎时再按它的上限切开并发发送
+    parts = list(_make_batches(batch, engine.max_batch_items, engine.max_batch_size,
+                               size_of=lambda job: engine.size_of(job[0], job[1])))
+    if len(parts) == 1:
+        return await _translate_batch_async(engine, target_code, batch)
+    import asyncio
+    outcomes = await asyncio.gather(*(_translate_batch_async(engine, target_code, part) for part in parts))
+    return [r for results, _ in outcomes for r in results], sum(calls for _, calls in outcomes)
+
+
+async def _route_batch_async(engine, target_code, batch, secondary, hedge_percentile, budget):
+    """按引擎健康状况选择引擎（必要时改发给 secondary）并按需对冲，见 health.send_batch"""
+    from health import send_batch
+
+    def estimate(eng):
+        contexts = [job[1] for job in batch] if eng.supports_context else None
+        return eng.estimate_latency(*eng.estimate_request([job[0] for job in batch], target_code, 'zh-CN', contexts))
+
+    return await send_batch(lambda eng: _translate_split_async(eng, target_code, batch), engine, secondary,
+                            hedge_percentile, budget, estimate)
+
+
+def _checked_results(batch, results):
+    # 丢了或改坏占位符的译文不写回，按失败处理（进入重试队列）
+    checked = []
+    for job, (trans, err) in zip(batch, results):
+        if trans:
+            bad = check_markers(job[0], trans)
+            if bad:
+                trans, err = None, bad
+        checked.append((trans, err))
+    return checked
+
+
+# 失败任务在整轮结束后重试的轮数，以及第 n 轮之前等待的秒数（DEFERRED_RETRY_DELAY * n）
+DEFERRED_RETRY_ROUNDS = 2
+DEFERRED_RETRY_DELAY = 2.0
+
+
+def _new_stats(rows=0):
+    # timings：各阶段耗时（秒）——parse 解析表格、translate 规划与翻译、write 写回文件
+    # hedged / hedge_won / failover：对冲的批次数、对冲请求先返回的批次数、改发给备用引擎的批次数
+    # segments / segment_hits：长文本拆出的段任务数、其中翻译记忆命中的段数
+    return {'rows': rows, 'cells': 0, 'changed_rows': 0, 'pending': 0, 'unique': 0, 'dedup_saved': 0,
+            'cache_hits': 0, 'resumed': 0, 'calls': 0, 'retries': 0, 'throttled': 0, 'requeued': 0, 'translated': 0,
+            'failed': 0, 'hedged': 0, 'hedge_won': 0, 'failover': 0, 'segments': 0, 'segment_hits': 0,
+            'cancelled': False,
+            'timings': {'parse': 0.0, 'translate': 0.0, 'write': 0.0}}
+
+
+def _merge_stats(totals, stats):
+    # 把一块（或一个文件）的统计累加进 totals
+    for k, v in stats.items():
+        if k == 'cancelled':
+            totals[k] = totals[k] or v
+        elif k == 'timings':
+            for phase, seconds in v.items():
+                totals[k][phase] = totals[k].get(phase, 0.0) + seconds
+        else:
+            totals[k] += v
+    return totals
+
+
+class TableScan:
+    """
+    一张表（或 CSV 的一块）的翻译状态：扫描出的待翻译任务，以及把译文、失败写回表格的方法。
+    translate_json 与 project.translate_project（多表去重）共用。
+
+    构造时依次：detect_columns 识别列、对比源文索引找出改动行、回放翻译日志、读取失败清单（只重试失败项模式），
+    最后 plan_jobs 去重；jobs 中的 cells 为 (行号, 语言列)，行号相对 data[0]。
+    source_index / journal / failures 只读取，写回后的更新由 finish() 完成。
+    normalize 时任务的源文和译文都是归一化后的文本，fan_out / journal_records 按各行原文还原占位符。
+    """
+    def __init__(self, data, engine, row_offset=0, source_index=None, journal=None, failures=None,
+                 incremental=False, retry_failed=False, normalize=True):
+        self.data = data
+        self.row_offset = row_offset
+        self.total = len(data)
+        self.incremental = incremental
+        self.normalize = normalize
+        # 行号 -> 该行原文中被归一化替换掉的片段
+        self._tokens = {}
+        keys = table_fields(data)
+        self.source_col, self.context_col, self.notes_col, self.lang_cols = detect_columns(keys)
+        self.lang_pos = {lang: idx for idx, lang in enumerate(self.lang_cols)}
+        self.cells = self.total * len(self.lang_cols)
+        self.stale = set()
+        self.current = None
+        self.changed_rows = 0
+        self.resumed = 0
+        self.jobs = {}
+        self.pending = 0
+        # 每行还有多少个 cell 没有翻译成功；降到 0 的行才更新源文索引
+        self.outstanding = {}
+        if not self.cells:
+            return
+
+        # 对比源文索引，找出源文/上下文有改动的行；增量模式下这些行的所有语言都要重译
+        if source_index is not None:
+            changed, self.current = source_index.diff(data, self.source_col, self.context_col,
+                                                      detect_key_column(keys), row_offset)
+            self.stale = {i for i, _, _, _ in changed}
+            self.changed_rows = len(self.stale)
+        force = {i: set(self.lang_cols) for i in self.stale} if incremental else {}
+
+        # 回放上次中断时留下的翻译日志（源文已改动的行不回放）
+        if journal is not None:
+            self.resumed = _replay_journal(data, journal, row_offset, self.source_col, self.lang_pos, force)
+
+        # 只重试失败项模式下只规划失败清单中的 cell
+        only = None
+        if retry_failed:
+            only = {}
+            if failures is not None:
+                only = failures.rows(row_offset, row_offset + self.total, self.source_text)
+
+        self.jobs, self.pending = plan_jobs(data, engine, self.source_col, self.context_col, self.lang_cols,
+                                            force, only, normalize)
+        for target_jobs in self.jobs.values():
+            for job in target_jobs:
+                for i, _ in job[2]:
+                    self.outstanding[i] = self.outstanding.get(i, 0) + 1
+
+        if isinstance(data, Table):
+            self._set_cell = data.set
+        else:
+            def set_cell(i, lang, value):
+                data[i][lang] = value
+            self._set_cell = set_cell
+        self._notes = column_values(data, self.notes_col) if self.notes_col else None
+
+    @property
+    def unique(self):
+        return sum(len(v) for v in self.jobs.values())
+
+    def source_text(self, i):
+        return str(self.data[i].get(self.source_col, '') or '')
+
+    def cell_translation(self, i, trans):
+        """任务译文还原成第 i 行的译文：把 {n} 换回该行原文中对应的数字、占位符和标签"""
+        if not self.normalize:
+            return trans
+        tokens = self._tokens.get(i)
+        if tokens is None:
+            tokens = self._tokens[i] = mask(self.source_text(i))[1]
+        return unmask(trans, tokens) if tokens else trans
+
+    def fan_out(self, cells, trans):
+        """把一个任务的译文写回它对应的所有 cell，并去掉这些 cell 之前记下的失败备注"""
+        for i, lang in cells:
+            self._set_cell(i, lang, self.cell_translation(i, trans))
+            self.outstanding[i] -= 1
+            if self._notes is not None and self._notes[i]:
+                _clear_note(self.data[i], self.notes_col, lang)
+
+    def fail(self, cells, err, failures=None):
+        """重试用完仍失败：写 Notes 和失败清单"""
+        for i, lang in cells:
+            _append_note(self.data[i], self.notes_col, lang, err)
+            if failures is not None:
+                failures.add(self.row_offset + i, lang, self.source_text(i), err)
+
+    def journal_records(self, cells, trans):
+        return [(self.row_offset + i, lang, self.source_text(i), self.cell_translation(i, trans))
+                for i, lang in cells]
+
+    def describe(self, cells, label=''):
+        """进度文字：label 为文件名等前缀"""
+        i, lang = cells[0]
+        src_text = self.source_text(i)
+        short_src = src_text if len(src_text) <= 20 else src_text[:17] + '...'
+        text = (f'正在翻译 {label}{self.row_offset+i+1}/{self.row_offset+self.total}：\"{short_src}\" -> {lang} '
+                f'({self.lang_pos[lang]+1}/{len(self.lang_cols)})')
+        if len(cells) > 1:
+            text += f' 等{len(cells)}处'
+        return text
+
+    def finish(self, failures=None, source_index=None):
+        """
+        写回前的收尾：失败清单去掉已翻译成功（或已被手工填上）的 cell；已全部翻译成功的行在源文索引中
+        记录当前哈希（未重译的改动行保留旧哈希，下次增量运行仍会发现）
+        """
+        if failures is not None:
+            for entry in failures.entries(self.row_offset, self.row_offset + self.total):
+                i, lang = entry['i'] - self.row_offset, entry['l']
+                if lang not in self.lang_pos or not _need_translate(self.data[i].get(lang), self.source_text(i)):
+                    failures.discard(entry['i'], lang)
+        if source_index is not None and self.current is not None:
+            for i, (key, h, src_text) in self.current.items():
+                if self.outstanding.get(i, 0) == 0 and (i not in self.stale or self.incremental):
+                    source_index.update(key, h, src_text)
+
+
+def apply_memory(tm, engine, jobs, on_hit):
+    """
+    查翻译记忆：jobs 中命中的任务交给 on_hit(job, 译文) 并从 jobs 中移除（原地修改）。
+    返回命中的任务数；同时记录到 metrics.METRICS
+    """
+    hit_jobs = 0
+    lookups = 0
+    cache_start = time.perf_counter()
+    for target_code, target_jobs in jobs.items():
+        if not target_jobs:
+            continue
+        lookups += len(target_jobs)
+        cached = tm.get_many(engine.name, [(job[0], target_code, job[1]) for job in target_jobs])
+        remain = []
+        for job, trans in zip(target_jobs, cached):
+            if trans:
+                on_hit(job, trans)
+                hit_jobs += 1
+            else:
+                remain.append(job)
+        jobs[target_code] = remain
+    METRICS.record_cache(engine.name, hit_jobs, lookups - hit_jobs)
+    METRICS.add_phase('cache', time.perf_counter() - cache_start)
+    return hit_jobs
+
+
+def run_jobs(engine, jobs, on_translated, on_failed, stats, tm=None, progress=None, describe=None,
+             cancel_checker=None, concurrency=None, profile_path=None, use_async=True, secondary=None,
+             hedge_percentile=None, segment=True):
+    """
+    发送 jobs（{目标语言代码: [[源文, 上下文, cells], ...]}）中的所有任务，返回是否被取消。
+
+    每批的条数和大小由引擎声明的 max_batch_items / max_batch_size（字符或估算 token）决定，一批交给引擎的
+    translate_batch（Google 一批一次 API 调用，OpenAI 打包成一个 JSON 提示词）。各批次可由线程池并发执行，
+    但总是按提交顺序在调用线程中写回。每个请求都经过引擎的限速器（ratelimit.RateLimiter），限流和临时错误先
+    当场退避重试；仍失败的任务放进重试队列，整轮结束后再分批重试 DEFERRED_RETRY_ROUNDS 轮。
+
+    use_async 为真（默认）时请求经引擎的 translate_batch_async 在 aio.py 的常驻事件循环中发送，调用线程每
+    aio.CANCEL_POLL_INTERVAL 秒检查一次取消：取消时在途的请求立即中止，已返回的批次照常写回，不等待慢请求。
+    为假时用线程池并发调用 translate_batch，取消后要等在途请求返回。
+
+    异步路径下每批的耗时和成败记到 health.EngineHealth：主引擎熔断期间批次改发给 secondary（备用引擎名或
+    对象），没有可用的备用引擎时等到冷却结束再试探发送；hedge_percentile（如 95）不为空时，超过该引擎整批耗时该百分位仍未返回的批次再发一份
+    （给备用引擎，没有则同一引擎），先返回的为准。备用引擎的译文以备用引擎的名字写入翻译记忆。
+
+    segment 为真（默认）时超过 segment.SEGMENT_MIN_CHARS 的长文本先按换行和句末标点拆成段（见 segment.py），
+    各段去重、查翻译记忆后与其他任务一起打包发送，译文按段写入翻译记忆，任务的各段都翻译好后拼回再交给
+    on_translated；任何一段最终失败时整个任务按失败处理。jobs 原样保留。
+
+    on_translated(target_code, done): 每批完成后调用，done 为该批翻译成功的 [(任务, 译文)]
+    on_failed(job, err): 重试用完（或取消时仍在重试队列中）的任务
+    describe(job): 返回该任务的进度文字，只在进度汇总器真正发出时才调用
+    stats: 累加 calls / translated / requeued / failed / retries / throttled / hedged / hedge_won / failover /
+           segments（长文本拆出的段任务数） / segment_hits（翻译记忆命中的段数）（cells 按 len(job[2]) 计）
+    tm: 翻译记忆，翻译成功的结果写入其中
+    """
+    # 本轮失败、等待重试的任务 [(target_code, job, 错误)]
+    deferred = []
+
+    def iter_batches(jobs):
+        # 按目标语言代码（即 lang_cols 首次出现顺序）产出 (target_code, batch)，顺序即写回顺序
+        for target_code, target_jobs in jobs.items():
+            batches = _make_batches(target_jobs, engine.max_batch_items, engine.max_batch_size,
+                                    size_of=lambda job: engine.size_of(job[0], job[1]))
+            for batch in batches:
+                yield target_code, batch
+
+    def apply_batch(target_code, batch, outcome):
+        results, calls = outcome[0], outcome[1]
+        # 异步路径另有路由信息：产生结果的引擎、是否故障转移 / 对冲
+        route = outcome[2] if len(outcome) > 2 else None
+        source = engine
+        if route is not None:
+            source = route['engine']
+            for key in ('failover', 'hedged', 'hedge_won'):
+                stats[key] += route[key]
+        stats['calls'] += calls
+        learned = []
+        done = []
+        chars = 0
+        for job, (trans, err) in zip(batch, results):
+            if trans:
+                done.append((job, trans))
+                learned.append((job[0], target_code, job[1], trans))
+            else:
+                deferred.append((target_code, job, err))
+            chars += len(job[0])
+        if segments is not None:
+            done = segments.assemble(done)
+        cells = sum(len(job[2]) for job, _ in done)
+        stats['translated'] += cells
+        if done:
+            on_translated(target_code, done)
+        if tm is not None and learned:
+            tm.put_many(source.name, learned)
+        if progress is not None:
+            last = batch[-1]
+            progress.advance(cells, chars, (lambda: describe(last)) if describe else None)
+
+    if concurrency is None:
+        concurrency = engine.default_concurrency
+    concurrency = max(1, int(concurrency))
+    if secondary is not None:
+        secondary = get_engine(secondary)
+        if secondary is engine:
+            secondary = None
+    # 对冲额度按整次 run_jobs（含重试轮）计
+    budget = None
+    if use_async and hedge_percentile is not None:
+        from health import HedgeBudget
+        budget = HedgeBudget()
+
+    def run_batches(batches):
+        # 发送并写回所有批次，返回是否被取消
+        if concurrency == 1:
+            for target_code, batch in batches:
                 if cancel_checker and cancel_checker():
+                    return True
+                apply_batch(target_code, batch, _translate_batch(engine, target_code, batch))
+            return False
+        # 最多 concurrency 个请求同时在途；结果按提交顺序写回，保证输出与顺序执行一致
+        stopped = False
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                while len(in_flight) < concurrency and not stopped:
+                    if cancel_checker and cancel_checker():
+                        stopped = True
+                        break
+                    nxt = next(batches, None)
+                    if nxt is None:
+                        break
+                    target_code, batch = nxt
+                    in_flight.append((target_code, batch, executor.submit(_translate_batch, engine, target_code, batch)))
+                if not in_flight:
                     break
-                if engine == 'Google':
-                    trans, err = google_translate_text(src_text, lang, 'zh-CN')
-                else:
-                    trans, err = openai_translate_text(src_text, lang, 'zh-CN', context)
-                if trans:
-                    row[lang] = trans
-                else:
-                    # 记录失败信息到 notes 列（不覆盖已有备注）
-                    if notes_col:
-                        old_note = str(row.get(notes_col, '')) if row.get(notes_col) else ''
-                        row[notes_col] = (old_note + '; ' if old_note else '') + f"翻译失败({lang}): {err}"
-            # 即便跳过翻译，也视为完成子任务
-            task_done += 1
-
-            # 细粒度回调：每做完一个语种就回调（不带 row_time）
-            if progress_callback:
-                short_src = src_text if len(src_text) <= 20 else src_text[:17] + '...'
-                info_text = f'正在翻译 {i+1}/{total}：\"{short_src}\" -> {lang} ({lang_idx+1}/{total_langs})'
-                try:
-                    percent = (task_done / total_tasks) * 100.0
-                except Exception:
-                    percent = 0.0
-                try:
-                    progress_callback(percent, info_text, None, task_done, total_tasks)
-                except Exception:
-                    pass
-
-            # 取消再次检查，尽快退出
-            if cancel_checker and cancel_checker():
+                target_code, batch, future = in_flight.popleft()
+                # 已在途的请求即使取消也照常写回（与顺序执行时“当前 cell 完成后再停止”一致）
+                apply_batch(target_code, batch, future.result())
+        return stopped
+
+    def run_batches_async(batches):
+        # 与 run_batches 相同地按提交顺序写回；等待时检查取消，取消则中止所有在途请求
+        import aio
+        stopped = False
+        in_flight = deque()
+        while True:
+            while len(in_flight) < concurrency and not stopped:
+                if cancel_checker and cancel_checker():
+                    stopped = True
+                    break
+                nxt = next(batches, None)
+                if nxt is None:
+                    break
+                target_code, batch = nxt
+                in_flight.append((target_code, batch, aio.submit(
+                    _route_batch_async(engine, target_code, batch, secondary, hedge_percentile, budget))))
+            if not in_flight:
                 break
+            target_code, batch, future = in_flight[0]
+            if aio.wait(future, cancel_checker):
+                in_flight.popleft()
+                apply_batch(target_code, batch, future.result())
+                continue
+            # 已取消：先中止还没返回的请求，再写回已经返回的批次（其余任务保持待翻译，下次运行时再请求）
+            stopped = True
+            for _, _, pending in in_flight:
+                pending.cancel()
+            for target_code, batch, done in in_flight:
+                if done.done() and not done.cancelled():
+                    apply_batch(target_code, batch, done.result())
+            in_flight.clear()
+        return stopped
 
-        # 行级回调，带上该行耗时信息（用于 GUI ETA）
-        row_time = time.time() - row_start
-        if progress_callback:
-            try:
-                percent = (task_done / total_tasks) * 100.0
-            except Exception:
-                percent = 0.0
-            try:
-                progress_callback(percent, None, row_time, task_done, total_tasks)
-            except Exception:
-                pass
-
-        # 如果在内层循环因取消跳出，则外层也退出
-        if cancel_checker and cancel_checker():
-            break
+    def wait_or_cancel(seconds):
+        # 重试前等待，期间可取消；返回是否被取消
+        deadline = time.time() + seconds
+        while time.time() < deadline:
+            if cancel_checker and cancel_checker():
+                return True
+            time.sleep(min(0.1, max(0.0, deadline - time.time())))
+        return False
+
+    # 长文本拆成段：各段先查翻译记忆，整条都命中的任务直接拼好写回
+    segments = None
+    if segment:
+        from segment import SegmentPlan
+        segments = SegmentPlan(jobs)
+        if not segments.split:
+            segments = None
+    if segments is not None:
+        jobs = segments.jobs
+        stats['segments'] += segments.count
+        if tm is not None and segments.count:
+            seg_jobs = segments.segment_jobs()
+            target_of = {id(job): target_code for target_code, v in seg_jobs.items() for job in v}
+            hits = {target_code: [] for target_code in jobs}
+            stats['segment_hits'] += apply_memory(
+                tm, engine, seg_jobs, lambda job, trans: hits[target_of[id(job)]].append((job, trans)))
+            for target_code, target_hits in hits.items():
+                if not target_hits:
+                    continue
+                hit_ids = {id(job) for job, _ in target_hits}
+                jobs[target_code] = [job for job in jobs[target_code] if id(job) not in hit_ids]
+                done = segments.assemble(target_hits)
+                if done:
+                    cells = sum(len(job[2]) for job, _ in done)
+                    stats['translated'] += cells
+                    on_translated(target_code, done)
+                    if progress is not None:
+                        progress.advance(cells, sum(len(job[0]) for job, _ in done))
 
-    # 写回文件（覆盖原 filepath）
-    write_json(data, filepath)
+    limiters = [e.limiter() for e in (engine, secondary) if e is not None]
+    retries_before = sum(limiter.retries for limiter in limiters)
+    throttled_before = sum(limiter.throttled for limiter in limiters)
+    requests_start = time.perf_counter()
+    send = run_batches_async if use_async else run_batches
+    try:
+        with profiled(profile_path, use_async):
+            cancelled = send(iter_batches(jobs))
+
+            # 整轮结束后把失败的任务重新分批重试，每轮之前等待更久
+            retry_round = 0
+            while deferred and not cancelled and retry_round < DEFERRED_RETRY_ROUNDS:
+                retry_round += 1
+                queued = list(deferred)
+                deferred.clear()
+                retry_jobs = {}
+                for target_code, job, _ in queued:
+                    retry_jobs.setdefault(target_code, []).append(job)
+                stats['requeued'] += sum(len(job[2]) for _, job, _ in queued)
+                if progress is not None:
+                    progress.message(f'第{retry_round}轮重试：{len(queued)}项失败任务')
+                if wait_or_cancel(DEFERRED_RETRY_DELAY * retry_round):
+                    deferred.extend(queued)
+                    cancelled = True
+                    break
+                cancelled = send(iter_batches(retry_jobs))
+
+        if segments is not None:
+            deferred[:] = segments.failed(deferred)
+        for _, job, err in deferred:
+            on_failed(job, err)
+            stats['failed'] += len(job[2])
+            if progress is not None:
+                progress.advance(len(job[2]))
+    finally:
+        METRICS.add_phase('requests', time.perf_counter() - requests_start)
+        stats['retries'] += sum(limiter.retries for limiter in limiters) - retries_before
+        stats['throttled'] += sum(limiter.throttled for limiter in limiters) - throttled_before
+    return cancelled
+
+
+def open_memory(use_cache, cache_path=None):
+    """use_cache 为真时打开翻译记忆（translation_memory.TranslationMemory），否则返回 None"""
+    if not use_cache:
+        return None
+    from translation_memory import TranslationMemory
+    return TranslationMemory(cache_path)
+
+
+def translate_json(data, engine, filepath, progress_callback=None, cancel_checker=None, concurrency=None,
+                   use_cache=True, cache_path=None, journal=None, row_offset=0, incremental=False,
+                   source_index=None, failures=None, retry_failed=False, progress=None, profile_path=None,
+                   normalize=True, use_async=True, result_callback=None, secondary_engine=None,
+                   hedge_percentile=None, segment=True):
+    """
+    data: table.Table（列式表格，推荐）或 list[dict]；译文和备注原地写回
+    engine: 引擎名（'Google'、'OpenAI'、'Mock' 等，见 engines.available_engines()）或 engines.Engine 对象
+    filepath: 用于写回（write_json，原子替换）；为 None 时不写文件，由调用方负责写回
+    progress_callback: function(percent: float, info: str|None=None, row_time: float|None=None, done: int|None=None,
+                       total: int|None=None, eta: float|None=None)；经 progress.ProgressAggregator 汇总后
+                       每秒最多回调约 10 次，eta 为预计剩余秒数（回调不接受 eta 参数时不传），row_time 恒为 None
+    cancel_checker: callable() -> bool, 返回 True 则中止翻译（协作式）
+    concurrency: 同时在途的请求数；None 使用引擎的 default_concurrency，1 为顺序执行
+    use_cache: 是否使用翻译记忆（translation_memory.TranslationMemory）；False 则全部重新请求
+    cache_path: 翻译记忆数据库路径，None 使用默认位置
+    journal: 翻译日志（journal.Journal），由调用方管理；None 时若有 filepath 则使用 filepath + '.journal'
+    row_offset: data[0] 在整张表中的行号（分块处理时用于翻译日志和进度文字）
+    incremental: 增量模式，源文或上下文与上次翻译时不同的行即使已有译文也重新翻译
+    source_index: 源文索引（source_index.SourceIndex），由调用方管理；None 时若有 filepath 则使用
+                  filepath + '.srchash.json'。行的所有待翻译 cell 都成功后才记录其新哈希
+    failures: 失败清单（failures.FailureLog），由调用方管理；None 时若有 filepath 则使用 filepath + '.failed.json'
+    retry_failed: 只重试失败项模式，只重新请求失败清单中的 cell，不扫描其他行
+    progress: 进度汇总（progress.ProgressAggregator），由调用方管理（分块处理时各块共用）；
+              为 None 时按 progress_callback 新建一个，并在结束时发出 100%
+    profile_path: 不为空时用 cProfile 分析翻译循环（发送与写回各批次，含失败重试的各轮），统计写到该文件；
+                  异步路径同时分析事件循环线程，线程池中同步调用的引擎不计入（见 metrics.profiled）
+    normalize: 占位符归一化（见 normalize.py）：数字、{0}/%s 占位符和富文本标签换成 {n} 后再去重、查翻译记忆和翻译，
+               写回时按各 cell 的原文还原；译文丢了占位符的按失败处理
+    use_async: 经异步路径发送请求（见 run_jobs）：取消时在途请求立即中止，已完成的译文随即写回文件
+    secondary_engine: 备用引擎（名字或 Engine 对象）：主引擎连续失败熔断期间改发给它，对冲时也优先发给它（见 health.py）
+    hedge_percentile: 对冲阈值百分位（如 95）：一批请求超过引擎整批耗时的该百分位仍未返回时再发一份，先返回的为准；
+                      None 不对冲。故障转移和对冲都只用于异步路径
+    segment: 长文本分段（见 segment.py）：多句的长文本按换行和句末标点拆成段，逐段去重、查翻译记忆并打包并发翻译，
+             再按原顺序拼回；改动一句只需重新请求这一句
+    result_callback: function(event, data, row_offset, cells)，在翻译线程中调用，cells 为 [(行号, 语言列)]
+                     （行号相对 data[0]）：规划后 'pending'（全部待翻译的 cell，同时告知 data 本身），之后每写回
+                     一批调用 'translated'、每个最终失败的任务调用 'failed'；界面的结果表（results_model.py）据此刷新
+    返回统计信息 dict：rows / cells / changed_rows / pending / unique / dedup_saved / cache_hits / resumed / calls /
+    retries / throttled（限速器的重试与被限流次数） / requeued（进入重试队列的 cell 数） / translated /
+    failed / hedged / hedge_won / failover / segments / segment_hits（见 run_jobs） / cancelled / timings（各阶段耗时）
+
+    先用 TableScan 扫描出所有待翻译的 cell 并去重，查过翻译记忆后交给 run_jobs 分批发送（批次、并发、
+    限速退避和重试队列见 run_jobs），最终失败的才记到 Notes 列和失败清单。
+    翻译成功的结果写入翻译记忆供以后的运行复用。
+    每批完成的 cell 追加到翻译日志并立即落盘；上次运行中断留下的日志会先回放，已完成的 cell 不再请求。
+    请求延迟、字符数、错误、重试、缓存命中和各阶段耗时记录到 metrics.METRICS（见 metrics.get_metrics）。
+    """
+    run_start = time.time()
+    engine = get_engine(engine)
+    total = len(data)
+    stats = _new_stats(total)
+    own_progress = progress is None and progress_callback is not None
+    if total == 0 or not detect_columns(table_fields(data))[3]:
+        # 仍然写个文件
+        if filepath:
+            write_json(data, filepath)
+        return stats
+
+    own_index = source_index is None and bool(filepath)
+    if own_index:
+        source_index = SourceIndex(default_index_path(filepath))
+    own_journal = journal is None and bool(filepath)
+    if own_journal:
+        journal = Journal(default_journal_path(filepath))
+    own_failures = failures is None and bool(filepath)
+    if own_failures:
+        failures = FailureLog(default_failures_path(filepath))
+
+    # 规划：去重后的任务按目标语言代码分组
+    with METRICS.phase('plan'):
+        scan = TableScan(data, engine, row_offset, source_index, journal, failures, incremental, retry_failed,
+                         normalize)
+    total_langs = len(scan.lang_cols)
+    total_tasks = scan.cells
+    unique_count = scan.unique
+    jobs = scan.jobs
+    stats['cells'] = total_tasks
+    stats['changed_rows'] = scan.changed_rows
+    stats['resumed'] = scan.resumed
+    stats['pending'] = scan.pending
+    stats['unique'] = unique_count
+    stats['dedup_saved'] = scan.pending - unique_count
+    if own_progress:
+        progress = ProgressAggregator(progress_callback, total_tasks)
+    if result_callback is not None:
+        result_callback('pending', data, row_offset, [cell for v in jobs.values() for job in v for cell in job[2]])
+
+    # 先查翻译记忆，命中的任务直接写回，不再发送
+    tm = open_memory(use_cache and unique_count, cache_path)
+
+    def on_hit(job, trans):
+        scan.fan_out(job[2], trans)
+        stats['cache_hits'] += len(job[2])
+        if result_callback is not None:
+            result_callback('translated', data, row_offset, job[2])
+
+    if tm is not None:
+        apply_memory(tm, engine, jobs, on_hit)
+
+    # 登记要请求的 cell 和字符数，让 GUI 先知道总数（可选）
+    if progress is not None:
+        progress.plan(total_tasks, sum(len(job[2]) for v in jobs.values() for job in v),
+                      sum(len(job[0]) for v in jobs.values() for job in v))
+        info = f'准备翻译：{total}行 × {total_langs}语种 = {total_tasks}项，其中待翻译{scan.pending}项'
+        if retry_failed:
+            info += '（只重试上次失败的项）'
+        if stats['resumed']:
+            info += f'（从中断处恢复{stats["resumed"]}项）'
+        if incremental and stats['changed_rows']:
+            info += f'（源文改动{stats["changed_rows"]}行，重新翻译）'
+        if stats['dedup_saved']:
+            info += f'，去重后{unique_count}项（节省{stats["dedup_saved"]}次请求）'
+        if stats['cache_hits']:
+            info += f'（翻译记忆命中{stats["cache_hits"]}项）'
+        progress.message(info)
+
+    def on_translated(target_code, done):
+        finished = []
+        for job, trans in done:
+            scan.fan_out(job[2], trans)
+            finished.extend(scan.journal_records(job[2], trans))
+        if journal is not None:
+            journal.append(finished)
+        if result_callback is not None:
+            result_callback('translated', data, row_offset, [cell for job, _ in done for cell in job[2]])
+
+    def on_failed(job, err):
+        scan.fail(job[2], err, failures)
+        if result_callback is not None:
+            result_callback('failed', data, row_offset, job[2])
+
+    try:
+        cancelled = run_jobs(engine, jobs, on_translated, on_failed, stats, tm=tm, progress=progress,
+                             describe=lambda job: scan.describe(job[2]),
+                             cancel_checker=cancel_checker, concurrency=concurrency, profile_path=profile_path,
+                             use_async=use_async, secondary=secondary_engine, hedge_percentile=hedge_percentile,
+                             segment=segment)
+    finally:
+        if tm is not None:
+            tm.close()
+        if own_journal:
+            journal.close()
+
+    stats['cancelled'] = cancelled
+    if cancelled:
+        # 提示取消
+        if progress is not None:
+            progress.message('已取消')
+
+    scan.finish(failures, source_index)
+
+    # 写回文件（原子替换原 filepath），写成功后日志就不再需要
+    write_start = time.time()
+    stats['timings']['translate'] = write_start - run_start
+    if filepath:
+        write_json(data, filepath)
+        stats['timings']['write'] = time.time() - write_start
+        METRICS.add_phase('write', stats['timings']['write'])
+        if own_journal:
+            journal.remove()
+        if own_index:
+            source_index.save()
+        if own_failures:
+            failures.save()
     # 最后确保回调到 100%
-    if progress_callback:
+    if own_progress:
+        progress.finish()
+    return stats
+
+
+# translate_csv 每次读入、翻译、写出的行数，内存占用与表格总行数无关；None 为整表一次处理
+CSV_CHUNK_ROWS = 20000
+
+
+def translate_csv(filepath, engine, progress_callback=None, cancel_checker=None, concurrency=None,
+                  use_cache=True, cache_path=None, chunk_rows=CSV_CHUNK_ROWS, incremental=False,
+                  retry_failed=False, profile_path=None, normalize=True, use_async=True, result_callback=None,
+                  secondary_engine=None, hedge_percentile=None, segment=True):
+    """
+    流式解析 CSV -> 分块（列式 Table）调用 translate_json -> 增量按列写回 CSV
+    注意：cancel_checker、concurrency、翻译记忆、incremental、retry_failed、normalize、use_async、result_callback、
+    secondary_engine、hedge_percentile 和 segment 参数直接透传给 translate_json（result_callback 的 data 为各块的 Table，row_offset 为块的起始行），
+    progress_callback 由各块共用的 ProgressAggregator 按整表汇总后回调；返回累计的统计信息
+    CSV 先写到临时文件，全部完成后再重命名替换原文件；翻译日志放在 filepath + '.journal'，写回成功后删除；
+    源文索引放在 filepath + '.srchash.json'、失败清单放在 filepath + '.failed.json'，各块共用，写回成功后保存。
+    取消后剩余的块不再翻译，但仍原样写回。
+    profile_path: 不为空时用 cProfile 分析整个分块循环（解析、翻译、写出），统计写到该文件（异步路径含事件循环线程）
+    """
+    totals = _new_stats()
+    journal = Journal(default_journal_path(filepath))
+    source_index = SourceIndex(default_index_path(filepath))
+    failures = FailureLog(default_failures_path(filepath))
+    total_rows = count_localization_rows(filepath) if progress_callback else 0
+
+    with LocalizationCsvReader(filepath) as reader, profiled(profile_path, use_async):
+        total_langs = len(detect_columns(reader.fields)[3])
+        # 各块共用一个进度汇总器，进度和剩余时间按整表计算
+        progress = ProgressAggregator(progress_callback, total_rows * total_langs) if progress_callback else None
+
+        writer = LocalizationCsvWriter(filepath, reader.fields, reader.first_row)
+        timings = totals['timings']
         try:
-            progress_callback(100.0, '翻译已完成（或已取消）', None, task_done, total_tasks)
-        except Exception:
-            pass
-
-
-def translate_csv(filepath, engine, progress_callback=None, cancel_checker=None):
-    """
-    解析 CSV -> 调用 translate_json -> 写回 CSV
-    注意：callback 和 cancel_checker 直接透传给 translate_json
-    """
-    import csv
-    df = pd.read_csv(filepath, header=None, encoding='utf-8')
-    raw_fields = list(df.iloc[1]) if len(df) > 1 else []
-    field_names = []
-    for idx, name in enumerate(raw_fields):
-        name = str(name).strip()
-        if name and name.lower() != 'nan' and not name.startswith('Unnamed'):
-            field_names.append((idx, name))
-    data = []
-    for i in range(2, len(df)):
-        row = df.iloc[i]
-        item = {}
-        for idx, name in field_names:
-            value = row[idx]
-            if pd.isna(value):
-                item[name] = None
-            else:
-                item[name] = str(value).strip()
-        if any(v not in [None, ""] for v in item.values()):
-            data.append(item)
-
-    # 将 CSV 转换后的 data 传入 translate_json（支持 progress_callback & cancel_checker）
-    translate_json(data, engine, filepath, progress_callback=progress_callback, cancel_checker=cancel_checker)
-
-    # 翻译完成后把 data 写回 CSV（保持原第一行 header if present）
-    df2 = pd.DataFrame(data)
-    columns = list(df2.columns)
-    field_row = columns
-    data_rows = df2.values.tolist()
-    orig_first_row = list(df.iloc[0]) if len(df) > 0 else ['' for _ in columns]
-    all_rows = [orig_first_row, field_row] + data_rows
-    with open(filepath, 'w', encoding='utf-8-sig', newline='') as f:
-        writer = csv.writer(f)
-        for row in all_rows:
-            writer.writerow(row)
+            row_offset = 0
+            cancelled = False
+            chunks = reader.iter_tables(chunk_rows)
+            while True:
+                t0 = time.time()
+                chunk = next(chunks, None)
+                timings['parse'] += time.time() - t0
+                if chunk is None:
+                    break
+                if not cancelled:
+                    # 将 CSV 转换后的 chunk 传入 translate_json（支持进度汇总 & cancel_checker）
+                    stats = translate_json(chunk, engine, None, progress=progress,
+                                           cancel_checker=cancel_checker, concurrency=concurrency,
+                                           use_cache=use_cache, cache_path=cache_path,
+                                           journal=journal, row_offset=row_offset,
+                                           incremental=incremental, source_index=source_index,
+                                           failures=failures, retry_failed=retry_failed, normalize=normalize,
+                                           use_async=use_async, result_callback=result_callback,
+                                           secondary_engine=secondary_engine, hedge_percentile=hedge_percentile,
+                                           segment=segment)
+                    _merge_stats(totals, stats)
+                    cancelled = stats['cancelled']
+                t0 = time.time()
+                writer.write_table(chunk)
+                timings['write'] += time.time() - t0
+                row_offset += len(chunk)
+        except BaseException:
+            writer.discard()
+            journal.close()
+            raise
+    # 读完关闭原文件后再替换（Windows 下无法替换仍被打开的文件）
+    t0 = time.time()
+    writer.commit()
+    timings['write'] += time.time() - t0
+    journal.remove()
+    source_index.save()
+    failures.save()
+    METRICS.add_phase('parse', timings['parse'])
+    METRICS.add_phase('write', timings['write'])
+
+    if progress is not None:
+        progress.finish()
+    return totals
+
+
+def preview_source_changes(filepath):
+    """
+    不发送任何请求，只对比源文索引，返回源文/上下文有改动的行 [(行号, 行键, 旧源文, 新源文)]。
+    CSV 按块流式读取；可配合 source_index.format_changes 生成差异报告。
+    """
+    source_index = SourceIndex(default_index_path(filepath))
+    if not source_index.rows:
+        return []
+    if filepath.lower().endswith('.json'):
+        chunks = [read_json_table(filepath)]
+        fields = chunks[0].fields
+        reader = None
+    else:
+        reader = LocalizationCsvReader(filepath)
+        fields = reader.fields
+        chunks = reader.iter_tables(CSV_CHUNK_ROWS)
+    try:
+        source_col, context_col, _, _ = detect_columns(fields)
+        key_col = detect_key_column(fields)
+        changed = []
+        row_offset = 0
+        for chunk in chunks:
+            chunk_changed, _ = source_index.diff(chunk, source_col, context_col, key_col, row_offset)
+            changed.extend((row_offset + i, key, old, new) for i, key, old, new in chunk_changed)
+            row_offset += len(chunk)
+        return changed
+    finally:
+        if reader is not None:
+            reader.close()
@@ -1,17 +1,432 @@
-import pandas as pd
-
+import codecs
+import csv
+import glob
 import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from itertools import compress, islice
+from json.encoder import encode_basestring
+
+from table import Table, MISSING
+
+# 项目清单文件名后缀、项目目录下记录各文件内容哈希的文件（见 project.py）
+MANIFEST_SUFFIX = '.transfuse.json'
+PROJECT_STATE_NAME = '.transfuse_project.json'
+# 工具自己写在表格旁的附属文件（源文索引、失败清单、参考译文）和项目文件，不作为输入的表格
+SIDECAR_SUFFIXES = ('.srchash.json', '.failed.json', '.suggest.json', MANIFEST_SUFFIX, PROJECT_STATE_NAME)
+
+# 上次运行被强行结束时留下的临时文件（.<文件名>.*.tmp），超过这么久没有修改的在下次写同一文件时删除
+STALE_TMP_SECONDS = 3600
 
 def read_csv(filepath):
+    # pandas 导入很慢，只在真正需要 DataFrame 时才加载；翻译和导出都走下面的流式读写，不需要 pandas
+    import pandas as pd
     return pd.read_csv(filepath, encoding='utf-8')
 
+class AtomicWriter:
+    """
+    写到 filepath 同目录下的临时文件，commit() 时用 os.replace 原子替换目标文件；
+    discard() 或异常时删除临时文件，原文件保持不变，不会留下写了一半的表格。
+    替换前把原文件的权限复制给临时文件，不会因 mkstemp 变成 0600；目标文件还不存在时临时文件以 0666 新建，
+    由系统按 umask 收紧，与普通新建的文件权限相同（不读取也不修改进程的 umask）；
+    打开时顺带删除以前被强行结束的运行留下的同名临时文件。
+    """
+    def __init__(self, filepath, encoding='utf-8', newline=None):
+        self.filepath = filepath
+        dirname = os.path.dirname(os.path.abspath(filepath))
+        prefix = '.' + os.path.basename(filepath) + '.'
+        _remove_stale_tmp(dirname, prefix)
+        if os.path.exists(filepath):
+            fd, self.tmp_path = tempfile.mkstemp(prefix=prefix, suffix='.tmp', dir=dirname)
+        else:
+            fd, self.tmp_path = _create_tmp(dirname, prefix)
+        self.file = os.fdopen(fd, 'w', encoding=encoding, newline=newline)
+
+    def commit(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        try:
+            shutil.copymode(self.filepath, self.tmp_path)
+        except FileNotFoundError:
+            pass
+        os.replace(self.tmp_path, self.filepath)
+
+    def discard(self):
+        if not self.file.closed:
+            self.file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+def _create_tmp(dirname, prefix):
+    # 与 mkstemp 一样独占地新建临时文件，但权限为 0666 & ~umask（即新文件的默认权限）
+    while True:
+        path = os.path.join(dirname, prefix + os.urandom(6).hex() + '.tmp')
+        try:
+            return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666), path
+        except FileExistsError:
+            continue
+
+def _remove_stale_tmp(dirname, prefix):
+    # 只删除 STALE_TMP_SECONDS 内没有修改过的，正在写的（如另一个进程流式写出的 CSV）不受影响
+    cutoff = time.time() - STALE_TMP_SECONDS
+    for path in glob.glob(os.path.join(glob.escape(dirname), glob.escape(prefix) + '*.tmp')):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+@contextmanager
+def open_atomic(filepath, encoding='utf-8', newline=None):
+    """AtomicWriter 的 with 写法：正常退出时提交，出现异常时丢弃"""
+    writer = AtomicWriter(filepath, encoding=encoding, newline=newline)
+    try:
+        yield writer.file
+        writer.commit()
+    except BaseException:
+        writer.discard()
+        raise
+
 def write_csv(df, filepath):
-    df.to_csv(filepath, index=False, encoding='utf-8-sig')
+    with open_atomic(filepath, encoding='utf-8-sig', newline='') as f:
+        df.to_csv(f, index=False)
 
 def read_json(filepath):
     with open(filepath, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def write_json(data, filepath):
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def read_json_table(filepath, intern=True):
+    """读入 JSON 数组为列式 Table；intern 为 True 时相同字符串共用一个对象"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return Table.from_rows(json.load(f), intern=intern)
+
+def write_json(data, filepath, compact=False):
+    """
+    data 为 list[dict] 或 Table；Table 按列编码写出（见 write_json_tables），不再整体转换成 list[dict]。
+    compact: 不缩进，每行数据一行、分隔符不带空格，文件约小一半
+    """
+    if isinstance(data, Table):
+        write_json_tables([data], filepath, compact)
+        return
+    with open_atomic(filepath, encoding='utf-8') as f:
+        if compact:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        else:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+# 按列编码 JSON 时每次拼接、写出的行数
+JSON_WRITE_BATCH_ROWS = 5000
+
+def _encode_json_value(value, compact):
+    # 字符串和 None 之外的值（数字、布尔、嵌套的 list/dict），与 json.dumps 整体输出时的写法一致
+    if compact:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    return json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n    ')
+
+def _encode_json_column(column, compact):
+    # 整列编码：字符串走 C 实现的 encode_basestring，MISSING 原样保留（该行省略这个键）
+    encode = encode_basestring
+    return [encode(v) if v.__class__ is str else 'null' if v is None else v if v is MISSING
+            else _encode_json_value(v, compact) for v in column]
+
+def write_json_tables(tables, filepath, compact=False):
+    """
+    把若干字段相同的 Table 依次写成一个 JSON 数组（原子替换 filepath）。
+    按列编码后用一个格式串拼出每行，避开 json.dumps(indent=...) 的纯 Python 编码器；
+    缩进输出与 json.dump(list[dict], indent=2, ensure_ascii=False) 逐字节相同。
+    compact 为 True 时每行数据占一行、分隔符不带空格
+    """
+    if compact:
+        open_, sep, colon, close, empty = '{', ',', ':', '}', '{}'
+    else:
+        open_, sep, colon, close, empty = '  {\n    ', ',\n    ', ': ', '\n  }', '  {}'
+    with open_atomic(filepath, encoding='utf-8') as f:
+        first = True
+        for table in tables:
+            keys = [encode_basestring(name) + colon for name in table.fields]
+            template = (open_ + sep.join(k.replace('%', '%%') + '%s' for k in keys) + close) if keys else empty
+            columns = [table.columns[name] for name in table.fields]
+            for start in range(0, len(table), JSON_WRITE_BATCH_ROWS):
+                encoded = [_encode_json_column(c[start:start + JSON_WRITE_BATCH_ROWS], compact) for c in columns]
+                records = zip(*encoded) if encoded else [()] * min(JSON_WRITE_BATCH_ROWS, len(table) - start)
+                if any(MISSING in c for c in encoded):
+                    # 有行缺少某些键：这些行逐个拼接，省略缺少的键
+                    lines = []
+                    for record in records:
+                        if MISSING in record:
+                            parts = [k + v for k, v in zip(keys, record) if v is not MISSING]
+                            lines.append(open_ + sep.join(parts) + close if parts else empty)
+                        else:
+                            lines.append(template % record)
+                else:
+                    lines = [template % record for record in records]
+                f.write(('[\n' if first else ',\n') + ',\n'.join(lines))
+                first = False
+        f.write('[]' if first else '\n]')
+
+
+# ---- 本地化表格 CSV 编解码 ----
+# 按块转换（CSV 导出 JSON 等）时每块的行数
+CSV_TABLE_CHUNK_ROWS = 20000
+
+# 格式：第 1 行为说明行（原样保留），第 2 行为字段名，第 3 行起为数据行。
+# 只保留有字段名的列；空单元格读作 None，其余去掉首尾空白；全空的数据行跳过。
+
+def _csv_columns(raw_rows, field_index):
+    """
+    把一批原始 CSV 行转置成列（只取有字段名的列），整列去掉首尾空白、空串转 None，再整列去掉全空的行；
+    结果与 iter_records 逐行处理相同
+    """
+    if not field_index:
+        return []
+    width = field_index[-1][0] + 1
+    if min(map(len, raw_rows)) < width:
+        raw_rows = [r if len(r) >= width else r + [''] * (width - len(r)) for r in raw_rows]
+    transposed = list(zip(*raw_rows))
+    columns = [[v.strip() or None for v in transposed[idx]] for idx, _ in field_index]
+    keep = list(map(any, zip(*columns)))
+    if not all(keep):
+        columns = [list(compress(column, keep)) for column in columns]
+    return columns
+
+
+def _field_index(raw_fields):
+    # 有字段名的列：[(列下标, 字段名)]
+    field_index = []
+    for idx, name in enumerate(raw_fields):
+        name = name.strip()
+        if name and name.lower() != 'nan' and not name.startswith('Unnamed'):
+            field_index.append((idx, name))
+    return field_index
+
+
+class LocalizationCsvReader:
+    """
+    流式读取本地化表格：打开时只解析前两行，数据行在迭代时逐行解析成 dict。
+
+    with LocalizationCsvReader(path) as reader:
+        reader.first_row   # 原始第 1 行（字符串列表）
+        reader.fields      # 字段名列表
+        for item in reader: ...
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        # utf-8-sig 同时兼容带 BOM 和不带 BOM 的文件
+        self._f = open(filepath, 'r', encoding='utf-8-sig', newline='')
+        self._rows = filter(None, csv.reader(self._f))
+        self.first_row = next(self._rows, [])
+        self._field_index = _field_index(next(self._rows, []))
+        self.fields = [name for _, name in self._field_index]
+
+    def __iter__(self):
+        fields = self.fields
+        for record in self.iter_records():
+            yield dict(zip(fields, record))
+
+    def iter_records(self):
+        """逐行产出与 fields 对齐的值列表（不建 dict）"""
+        field_index = self._field_index
+        for raw in self._rows:
+            n = len(raw)
+            record = []
+            has_value = False
+            for idx, _ in field_index:
+                value = raw[idx].strip() if idx < n else ''
+                if value:
+                    record.append(value)
+                    has_value = True
+                else:
+                    record.append(None)
+            if has_value:
+                yield record
+
+    def iter_chunks(self, chunk_rows):
+        """按 chunk_rows 行一块产出 list[dict]；chunk_rows 为 None 时整表一块"""
+        chunk = []
+        for item in self:
+            chunk.append(item)
+            if chunk_rows and len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def iter_tables(self, chunk_rows, intern=True):
+        """
+        每次读入 chunk_rows 个原始行，按列处理成 Table 产出（全空行已去掉，所以块可能略小）；
+        chunk_rows 为 None 时整表一块。intern 为 True 时块内相同字符串共用一个对象
+        """
+        while True:
+            raw = list(islice(self._rows, chunk_rows)) if chunk_rows else list(self._rows)
+            if not raw:
+                return
+            table = Table.from_columns(self.fields, _csv_columns(raw, self._field_index), intern=intern)
+            if len(table):
+                yield table
+            if not chunk_rows:
+                return
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _TrackedLines:
+    # 逐行解码二进制文件交给 csv.reader，pos 为已读到的字节位置（csv.reader 只在需要时取下一行，不会预读）
+    def __init__(self, f, pos):
+        self._f = f
+        self.pos = pos
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self._f.readline()
+        if not line:
+            raise StopIteration
+        self.pos += len(line)
+        return line.decode('utf-8')
+
+
+class LocalizationCsvBlocks:
+    """
+    按数据行号随机读取本地化表格：build() 顺序扫描一遍，记下每 block_rows 个数据行（全空行不计，行号与
+    LocalizationCsvReader 一致）开头的字节位置，之后 read(k) 直接定位到第 k 块，读入成 Table。
+    文件的大小或修改时间变化（如被写回的结果替换）后下次 read 自动重新扫描。不是线程安全的，应在同一线程中使用。
+    """
+    def __init__(self, filepath, block_rows):
+        self.filepath = filepath
+        self.block_rows = block_rows
+        self.fields = []
+        self._field_index = []
+        self._offsets = None
+        self._signature = None
+
+    def build(self):
+        """扫描文件，建立各块的字节位置；返回数据行数"""
+        st = os.stat(self.filepath)
+        offsets = []
+        count = 0
+        with open(self.filepath, 'rb') as f:
+            lines = _TrackedLines(f, 3 if f.read(3) == codecs.BOM_UTF8 else 0)
+            f.seek(lines.pos)
+            rows = filter(None, csv.reader(lines))
+            next(rows, None)
+            self._field_index = _field_index(next(rows, []))
+            self.fields = [name for _, name in self._field_index]
+            indexes = [idx for idx, _ in self._field_index]
+            start = lines.pos
+            for raw in rows:
+                n = len(raw)
+                if any(raw[idx].strip() for idx in indexes if idx < n):
+                    if count % self.block_rows == 0:
+                        offsets.append(start)
+                    count += 1
+                start = lines.pos
+        self._offsets = offsets
+        self._signature = (st.st_size, st.st_mtime_ns)
+        return count
+
+    def read(self, k):
+        """第 k 块（第 k * block_rows 行起最多 block_rows 个数据行）的 Table；超出文件末尾时返回 None"""
+        st = os.stat(self.filepath)
+        if self._offsets is None or self._signature != (st.st_size, st.st_mtime_ns):
+            self.build()
+        if k >= len(self._offsets):
+            return None
+        indexes = [idx for idx, _ in self._field_index]
+        raw_rows = []
+        kept = 0
+        with open(self.filepath, 'rb') as f:
+            f.seek(self._offsets[k])
+            for raw in filter(None, csv.reader(_TrackedLines(f, self._offsets[k]))):
+                raw_rows.append(raw)
+                n = len(raw)
+                if any(raw[idx].strip() for idx in indexes if idx < n):
+                    kept += 1
+                    if kept >= self.block_rows:
+                        break
+        return Table.from_columns(self.fields, _csv_columns(raw_rows, self._field_index), intern=False)
+
+
+def csv_to_json(csv_path, json_path, compact=False, chunk_rows=CSV_TABLE_CHUNK_ROWS):
+    """
+    本地化 CSV 转 JSON 数组（跳过说明行）：按块读成列式表格、按列编码写出，内存与表格大小无关。
+    返回数据行数
+    """
+    rows = [0]
+
+    def tables(reader):
+        for table in reader.iter_tables(chunk_rows, intern=False):
+            rows[0] += len(table)
+            yield table
+
+    with LocalizationCsvReader(csv_path) as reader:
+        write_json_tables(tables(reader), json_path, compact)
+    return rows[0]
+
+
+def json_to_csv(json_path, csv_path):
+    """
+    JSON 数组转本地化 CSV：字段按各行的键首次出现的顺序合并，只写字段名行和数据行（没有说明行）。
+    返回数据行数；JSON 中没有数据时不写文件，返回 0
+    """
+    data = read_json_table(json_path, intern=False)
+    if not len(data):
+        return 0
+    writer = LocalizationCsvWriter(csv_path, data.fields)
+    try:
+        writer.write_table(data)
+    except BaseException:
+        writer.discard()
+        raise
+    writer.commit()
+    return len(data)
+
+
+def count_localization_rows(filepath):
+    """只数数据行（不建 dict），用于流式处理前估算总进度"""
+    with LocalizationCsvReader(filepath) as reader:
+        return sum(1 for _ in reader.iter_records())
+
+
+class LocalizationCsvWriter:
+    """
+    增量写出本地化表格（utf-8-sig）：先写说明行（first_row 为 None 则不写）和字段名行，
+    再由 write_rows 逐批追加数据行；commit() 原子替换目标文件，discard() 放弃。
+    """
+    def __init__(self, filepath, fields, first_row=None):
+        self.fields = list(fields)
+        self._atomic = AtomicWriter(filepath, encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._atomic.file)
+        if first_row is not None:
+            self._writer.writerow(first_row)
+        self._writer.writerow(self.fields)
+
+    def write_rows(self, rows):
+        fields = self.fields
+        self._writer.writerows([row.get(name) for name in fields] for row in rows)
+
+    def write_table(self, table):
+        """按列写出 Table 的所有行；表中没有的字段写空，缺失值（MISSING）写空"""
+        columns = [table.column(name) or [None] * len(table) for name in self.fields]
+        # MISSING 只出现在来自 JSON 的表格中；先整列替换，再整体交给 csv.writer（C 实现）
+        columns = [[None if v is MISSING else v for v in c] if MISSING in c else c for c in columns]
+        self._writer.writerows(zip(*columns))
+
+    def commit(self):
+        self._atomic.commit()
+
+    def discard(self):
+        self._atomic.discard()